@@ -8,18 +8,21 @@ Visual-only processing pipeline for signal display.
 - Uses delayed playback (5 s) to smooth jitter.
 - Scales both signals with fixed calibration ranges to [-100, 100].
 - Does NOT compute HR or PWV (those come from ESP32 JSON).
+- Time comes from ComunicacionMax.now() (or the clock given to the
+  processor), so a VirtualClock can run a whole session without waiting.
 """
 
 from collections import deque
 import math
-import time
 
 import ComunicacionMax
 
 
 class SignalProcessor:
-    def __init__(self, fs=50):
+    def __init__(self, fs=50, clock=None):
         self.fs = fs
+        # Fuente de tiempo propia; None usa la de ComunicacionMax (set_clock), compartida con la recepción
+        self.clock = clock
         self.VIEW_SECONDS = 6.0
         self.CALIB_SECONDS = 10.0
         self.PLAYBACK_DELAY_SECONDS = 5.0
@@ -82,7 +85,7 @@ class SignalProcessor:
 
     def start_session(self):
         self.session_active = True
-        self.session_start_local = time.monotonic()
+        self.session_start_local = self._now()
         self.hr = None
         self.pwv = None
 
@@ -108,6 +111,9 @@ class SignalProcessor:
         self._last_playback_time = None
         self._holdover_used_points = 0
 
+    def _now(self):
+        return self.clock() if self.clock is not None else ComunicacionMax.now()
+
     def stop_session(self):
         self.session_active = False
 
@@ -313,7 +319,7 @@ class SignalProcessor:
         raw_d = pending.get("d", [])
         seq = int(pending.get("seq", snapshot.get("seq", 0)))
         self.data_seq = seq
-        now = time.monotonic()
+        now = self._now()
 
         if not raw_p or not raw_d:
             self._advance_playback(now)
@@ -367,6 +373,16 @@ class SignalProcessor:
         d = self._scale_with_minmax(list(self.distal_filtered), self.calib_min_d, self.calib_max_d)
         return t, p, d
 
+    def get_recording(self):
+        # Señal de la sesión que sigue en memoria (ventana mostrada + cola de reproducción), escalada como get_signals
+        if not self._calibration_ready:
+            return [], []
+        p = list(self.proximal_filtered) + list(self._input_prox)
+        d = list(self.distal_filtered) + list(self._input_dist)
+        n = min(len(p), len(d))
+        return (self._scale_with_minmax(p[:n], self.calib_min_p, self.calib_max_p),
+                self._scale_with_minmax(d[:n], self.calib_min_d, self.calib_max_d))
+
     def get_metrics(self):
         if self._playback_started:
             progress = 1.0
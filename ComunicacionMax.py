@@ -21,8 +21,6 @@ import threading
 import time
 from collections import deque
 
-import websocket
-
 
 # ==============================================================================
 # NETWORK CONFIG
@@ -44,9 +42,6 @@ WS_PING_TIMEOUT_SEC = 10
 WS_RECONNECT_DELAY_SEC = 1.0
 WS_CONNECT_TIMEOUT_SEC = 3.0
 
-# Evita quedar bloqueado mucho tiempo en una IP inalcanzable antes de pasar a la siguiente.
-websocket.setdefaulttimeout(WS_CONNECT_TIMEOUT_SEC)
-
 # Tiempo de muestreo esperado en el frontend (50 Hz visuales)
 SAMPLE_DT_SEC = 1.0 / 50.0
 SAMPLE_MIN_STEP_SEC = 0.010
@@ -83,6 +78,38 @@ _connection_thread = None
 _last_sample_time = None
 _sample_seq = 0
 _last_rx_monotonic = None
+_pending_dropped = 0  # Muestras descartadas por la cola pendiente llena (acumulado, no se reinicia)
+
+
+# ==============================================================================
+# CLOCK
+# ==============================================================================
+# Fuente de tiempo (segundos, monotónica) de la recepción y de BackEnd.SignalProcessor
+_clock = time.monotonic
+
+
+def set_clock(clock=None):
+    """Reemplaza la fuente de tiempo; None vuelve a time.monotonic."""
+    global _clock
+    _clock = time.monotonic if clock is None else clock
+
+
+def now():
+    return _clock()
+
+
+class VirtualClock:
+    """Reloj manual: solo avanza con advance(), para simular sesiones completas sin esperar."""
+
+    def __init__(self, start=1000.0):
+        self.time = float(start)
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, seconds):
+        self.time += seconds
+        return self.time
 
 
 def _to_bool(value, default=False):
@@ -158,6 +185,7 @@ def get_snapshot(include_stream=True):
             "pwv": remote_pwv,
             "seq": _sample_seq,
             "last_rx": _last_rx_monotonic,
+            "dropped": _pending_dropped,
         }
         if include_stream:
             snapshot["t"] = list(sample_time_raw)
@@ -235,7 +263,7 @@ def on_open(ws):
 
 def on_message(ws, message):
     global sensor1_connected, sensor2_connected, sensor1_ok, sensor2_ok
-    global remote_hr, remote_pwv, _last_sample_time, _sample_seq, _last_rx_monotonic
+    global remote_hr, remote_pwv, _last_sample_time, _sample_seq, _last_rx_monotonic, _pending_dropped
 
     try:
         data = json.loads(message)
@@ -244,7 +272,7 @@ def on_message(ws, message):
     except Exception:
         return
 
-    now = time.monotonic()
+    now = _clock()
 
     with _state_lock:
         _last_rx_monotonic = now
@@ -289,6 +317,9 @@ def on_message(ws, message):
             sample_time_raw.append(t_sample)
             proximal_data_raw.append(p_val)
             distal_data_raw.append(d_val)
+            if len(pending_proximal) >= PENDING_MAX_POINTS:
+                # La cola acotada pierde la muestra más vieja: nadie la consumió a tiempo
+                _pending_dropped += 1
             pending_proximal.append(p_val)
             pending_distal.append(d_val)
 
@@ -346,6 +377,7 @@ def on_close(ws, close_status_code, close_msg):
 # ==============================================================================
 def run_ws():
     global ws_app, active_ws_url
+    websocket = _websocket()
     url_index = 0
     while True:
         if not WS_URL_CANDIDATES:
@@ -376,6 +408,15 @@ def run_ws():
         time.sleep(WS_RECONNECT_DELAY_SEC)
 
 
+def _websocket():
+    # websocket-client se importa al conectar (MainScreen), no al abrir la aplicación
+    import websocket
+
+    # Evita quedar bloqueado mucho tiempo en una IP inalcanzable antes de pasar a la siguiente.
+    websocket.setdefaulttimeout(WS_CONNECT_TIMEOUT_SEC)
+    return websocket
+
+
 def start_connection():
     global _connection_thread
     if _connection_thread is not None and _connection_thread.is_alive():
@@ -0,0 +1,135 @@
+"""
+ESTADISTICAS.PY
+Population statistics over the measurement history (no Qt).
+
+- crPWV distribution (count, mean, quartiles) by age band and sex
+- Fraction of measurements outside the age-normal band, per band and sex
+- Empirical crPWV-vs-age regression, fitted with the same form as the
+  reference curve of the paper: crPWV = A * exp(B * edad)
+- Measurement counts per day
+
+Everything runs as vectorized NumPy group-bys (bincount over a group key,
+one lexsort for the quantiles) over the columnar copy kept by the history
+repository (Historial.HistoryColumns), so a full recompute takes a few
+milliseconds on tens of thousands of records.
+"""
+
+import numpy as np
+
+from Historial import (
+    CRPWV_AGE_COEF, CRPWV_CENTER, INVALID_EPOCH,
+    SEX_FEMALE, SEX_MALE, SEX_UNKNOWN, STATUS_ABNORMAL, STATUS_UNKNOWN,
+)
+
+
+# Bandas de edad: [0, 20), [20, 30), ..., [80, inf)
+AGE_BAND_EDGES = np.array([20, 30, 40, 50, 60, 70, 80], dtype=float)
+AGE_BAND_LABELS = ("<20", "20-29", "30-39", "40-49", "50-59", "60-69", "70-79", "80+")
+
+# Orden de las columnas de sexo en las tablas de resultados
+SEXES = (SEX_FEMALE, SEX_MALE, SEX_UNKNOWN)
+SEX_LABELS = ("Femenino", "Masculino", "Sin dato")
+
+SECONDS_PER_DAY = 86400
+
+
+def age_band_index(edad):
+    """Índice de banda (0..len(AGE_BAND_LABELS)-1) de cada edad; -1 si falta la edad."""
+    edad = np.asarray(edad, dtype=float)
+    band = np.searchsorted(AGE_BAND_EDGES, edad, side="right")
+    band[~np.isfinite(edad)] = -1
+    return band
+
+
+def pwv_by_age_band_and_sex(columns):
+    """
+    Tablas [banda, sexo] (en el orden de AGE_BAND_LABELS x SEXES):
+    count, mean, p25, median, p75 de crPWV, y outside_fraction (fuera de la
+    zona normal, sobre las mediciones clasificables).
+    """
+    n_bands, n_sexes = len(AGE_BAND_LABELS), len(SEXES)
+    band = age_band_index(columns["edad"])
+    sex_column = np.zeros(len(band), dtype=np.int64)
+    for i, code in enumerate(SEXES):
+        sex_column[columns["sexo"] == code] = i
+    pwv = columns["pwv"]
+    status = columns["status"]
+
+    valid = (band >= 0) & np.isfinite(pwv)
+    key = band[valid] * n_sexes + sex_column[valid]
+    values = pwv[valid]
+    size = n_bands * n_sexes
+
+    count = np.bincount(key, minlength=size)
+    total = np.bincount(key, weights=values, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+
+    classified = status[valid] != STATUS_UNKNOWN
+    outside = np.bincount(key, weights=(status[valid] == STATUS_ABNORMAL), minlength=size)
+    known = np.bincount(key, weights=classified, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        outside_fraction = outside / known
+
+    # Cuantiles: un solo ordenamiento por (grupo, crPWV) y cortes por grupo
+    order = np.lexsort((values, key))
+    sorted_values = values[order]
+    starts = np.searchsorted(key[order], np.arange(size + 1))
+    quartiles = np.full((size, 3), np.nan)
+    for g in np.flatnonzero(count):
+        quartiles[g] = np.percentile(sorted_values[starts[g]:starts[g + 1]], (25, 50, 75))
+
+    shape = (n_bands, n_sexes)
+    return {
+        "count": count.reshape(shape),
+        "mean": mean.reshape(shape),
+        "p25": quartiles[:, 0].reshape(shape),
+        "median": quartiles[:, 1].reshape(shape),
+        "p75": quartiles[:, 2].reshape(shape),
+        "outside_fraction": outside_fraction.reshape(shape),
+    }
+
+
+def age_regression(columns):
+    """
+    Ajuste crPWV = A * exp(B * edad) por mínimos cuadrados sobre log(crPWV).
+    Devuelve dict con a, b, r2 (en escala log), n, y los coeficientes del paper.
+    """
+    edad = columns["edad"]
+    pwv = columns["pwv"]
+    ok = np.isfinite(edad) & np.isfinite(pwv) & (pwv > 0)
+    result = {"paper_a": CRPWV_CENTER, "paper_b": CRPWV_AGE_COEF, "n": int(ok.sum()),
+              "a": np.nan, "b": np.nan, "r2": np.nan}
+    if result["n"] < 2 or np.ptp(edad[ok]) == 0:
+        return result
+    x = edad[ok]
+    y = np.log(pwv[ok])
+    b, log_a = np.polyfit(x, y, 1)
+    residual = y - (log_a + b * x)
+    spread = np.sum((y - y.mean()) ** 2)
+    result.update(a=float(np.exp(log_a)), b=float(b),
+                  r2=float(1.0 - np.sum(residual ** 2) / spread) if spread > 0 else np.nan)
+    return result
+
+
+def counts_per_day(columns):
+    """(inicio de cada día en epoch, cantidad de mediciones), días ordenados."""
+    epoch = columns["epoch"]
+    days = epoch[epoch != INVALID_EPOCH] // SECONDS_PER_DAY
+    days, counts = np.unique(days, return_counts=True)
+    return days * SECONDS_PER_DAY, counts
+
+
+def summarize(columns):
+    status = columns["status"]
+    known = status != STATUS_UNKNOWN
+    outside = int(np.count_nonzero(status == STATUS_ABNORMAL))
+    return {
+        "measurements": len(status),
+        "classified": int(np.count_nonzero(known)),
+        "outside": outside,
+        "outside_fraction": outside / max(1, int(np.count_nonzero(known))),
+        "by_band": pwv_by_age_band_and_sex(columns),
+        "regression": age_regression(columns),
+        "per_day": counts_per_day(columns),
+    }
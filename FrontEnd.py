@@ -6,31 +6,38 @@ Interfaz de usuario"""
 # =================================================================================================
 import sys
 import os
-import pyqtgraph as pg
+import multiprocessing
 import numpy as np
 import time
 import math
-import csv
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 from datetime import datetime
+from bisect import bisect_left
+from collections import OrderedDict
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
     QLabel, QLineEdit, QPushButton, QComboBox, QStatusBar, QMessageBox, QDialog, QDateEdit, QDialogButtonBox, 
-    QFileDialog, QTextEdit, QAbstractItemView)
-from PyQt6.QtCore import QTimer, Qt, QRegularExpression, QDate, QSize
-from PyQt6.QtGui import QPixmap, QRegularExpressionValidator, QFont, QIcon, QTextDocument, QIntValidator
-
-from pyqtgraph import FillBetweenItem
-
-from PyQt6.QtWidgets import QTableWidget, QTableWidgetItem
+    QFileDialog, QTextEdit, QAbstractItemView, QTableView, QHeaderView, QStyledItemDelegate, QStyle, QGridLayout,
+    QProgressDialog, QStackedWidget)
+from PyQt6.QtCore import (
+    QTimer, Qt, QRegularExpression, QDate, QSize, QEvent, QAbstractTableModel, QAbstractProxyModel, QModelIndex,
+    QRect, pyqtSignal)
+from PyQt6.QtGui import QPixmap, QRegularExpressionValidator, QFont, QIcon, QIntValidator, QColor
 
 # Importar el backend y la comunicación
 from BackEnd import processor
 import ComunicacionMax
-
-from PyQt6.QtPrintSupport import QPrinter
+from Mediciones import open_store, make_record, format_value, waveform_path, save_waveform
+from Historial import (
+    MeasurementRepository, date_epoch, format_fecha, intersect_rows, parse_epochs, INVALID_EPOCH,
+    crpwv_bounds_for_age, classify_crpwv, STATUS_NORMAL, STATUS_ABNORMAL, CRPWV_CENTER, CRPWV_AGE_COEF,
+)
+from Estadisticas import summarize, AGE_BAND_LABELS, SEX_LABELS, SECONDS_PER_DAY
+from FusionarMediciones import BackgroundMerge
+
+# pyqtgraph, ReportLab (Reportes) y websocket (ComunicacionMax) se importan recién cuando se
+# usan: la ventana de inicio aparece sin esperarlos (ver benchmarks/bench_startup.py)
+pg = None
 
 def resource_path(relative_path):
     """Obtiene la ruta correcta tanto en desarrollo como en ejecutable"""
@@ -39,6 +46,155 @@ def resource_path(relative_path):
     except Exception:
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
+
+
+# =================================================================================================
+# Backend de dibujo de los gráficos de señales
+# =================================================================================================
+# STIFFIO_RENDER_BACKEND elige cómo se dibujan graph1 / graph2 / pwv_graph en cada puesto:
+#   qpainter         -> raster por CPU (default)
+#   opengl           -> modo OpenGL de pyqtgraph con el driver de la placa de video
+#   opengl-software  -> OpenGL por rasterizador de software (Mesa llvmpipe / opengl32sw.dll)
+RENDER_BACKENDS = ("qpainter", "opengl", "opengl-software")
+RENDER_BACKEND = os.getenv("STIFFIO_RENDER_BACKEND", "qpainter").strip().lower()
+if RENDER_BACKEND not in RENDER_BACKENDS:
+    RENDER_BACKEND = "qpainter"
+
+
+def configure_render_backend(backend=None):
+    """Aplica el backend de dibujo. Debe llamarse antes de crear la QApplication."""
+    global RENDER_BACKEND
+    if backend is not None:
+        backend = backend.strip().lower()
+        RENDER_BACKEND = backend if backend in RENDER_BACKENDS else "qpainter"
+
+    if RENDER_BACKEND != "qpainter":
+        try:
+            from PyQt6 import QtOpenGLWidgets  # noqa: F401
+        except ImportError:
+            # Sin soporte OpenGL en esta instalación de Qt: seguimos con QPainter
+            RENDER_BACKEND = "qpainter"
+
+    if RENDER_BACKEND == "opengl-software":
+        os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")  # Mesa -> llvmpipe
+        os.environ.setdefault("QT_OPENGL", "software")  # Windows -> opengl32sw.dll
+        QApplication.setAttribute(Qt.ApplicationAttribute.AA_UseSoftwareOpenGL)
+
+    # Si pyqtgraph todavía no se importó, load_pyqtgraph aplica las opciones al importarlo
+    if pg is not None or "pyqtgraph" in sys.modules:
+        load_pyqtgraph()
+        _apply_render_options()
+    return RENDER_BACKEND
+
+
+def _apply_render_options():
+    use_gl = RENDER_BACKEND != "qpainter"
+    pg.setConfigOptions(useOpenGL=use_gl, enableExperimental=use_gl)
+
+
+def load_pyqtgraph():
+    """Importa pyqtgraph la primera vez que se crea una pantalla con gráficos."""
+    global pg
+    if pg is None:
+        import pyqtgraph
+        pg = pyqtgraph
+        _apply_render_options()
+    return pg
+
+
+# =================================================================================================
+# Base de mediciones
+# =================================================================================================
+# STIFFIO_MEDICIONES: ruta de la base. Por defecto SQLite local; para una carpeta compartida
+# entre estaciones usar un archivo de diario (p. ej. \\servidor\stiffio\mediciones_pwv.jsonl)
+MEASUREMENTS_PATH = os.getenv("STIFFIO_MEDICIONES", "").strip()
+
+_measurement_store = None
+
+
+def measurement_store():
+    """Base de mediciones. La primera vez importa el mediciones_pwv.csv histórico."""
+    global _measurement_store
+    if _measurement_store is None:
+        _measurement_store = open_store(MEASUREMENTS_PATH or resource_path("mediciones_pwv.db"))
+        _measurement_store.import_legacy_csv_once(resource_path("mediciones_pwv.csv"))
+    return _measurement_store
+
+
+_measurement_repository = None
+
+
+def measurement_repository():
+    """Historial en memoria compartido por todas las pantallas (se lee una sola vez)."""
+    global _measurement_repository
+    if _measurement_repository is None:
+        _measurement_repository = MeasurementRepository(measurement_store())
+    return _measurement_repository
+
+
+# =================================================================================================
+# Ventana de la aplicación
+# =================================================================================================
+class AppWindow(QMainWindow):
+    """
+    Única ventana de la aplicación. Cada pantalla se crea la primera vez que se visita y queda
+    en un QStackedWidget; al volver a ella se llama a su on_enter(...) para reiniciar su estado
+    (y a on_leave() de la que se deja), en lugar de crear y cerrar ventanas en cada navegación.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Stiffio")
+        self.setGeometry(100, 100, 1400, 800)
+        self.setStyleSheet("background-color: black; color: white;")
+        self.stack = QStackedWidget()
+        self.setCentralWidget(self.stack)
+        self._screens = {}  # clase de pantalla -> instancia
+
+    def screen(self, screen_class):
+        screen = self._screens.get(screen_class)
+        if screen is None:
+            screen = screen_class()
+            self._screens[screen_class] = screen
+            self.stack.addWidget(screen)
+        return screen
+
+    def show_screen(self, screen_class, *args):
+        current = self.stack.currentWidget()
+        screen = self.screen(screen_class)
+        if current is not None and current is not screen and hasattr(current, "on_leave"):
+            current.on_leave()
+        if hasattr(screen, "on_enter"):
+            screen.on_enter(*args)
+        self.stack.setCurrentWidget(screen)
+        self.setWindowTitle(screen.windowTitle() or "Stiffio")
+        return screen
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        # Las pantallas son widgets hijos: el cambio de minimizada / restaurada llega solo acá
+        if event.type() == QEvent.Type.WindowStateChange:
+            screen = self.stack.currentWidget()
+            if hasattr(screen, "window_state_changed"):
+                screen.window_state_changed()
+
+    def closeEvent(self, event):
+        for screen in self._screens.values():
+            screen.close()
+        super().closeEvent(event)
+
+
+_app_window = None
+
+
+def app_window():
+    """Ventana de la aplicación (se crea la primera vez)."""
+    global _app_window
+    if _app_window is None:
+        _app_window = AppWindow()
+    return _app_window
+
+
 # =================================================================================================
 # Ventana de Inicio
 # =================================================================================================
@@ -116,31 +272,10 @@ class WelcomeScreen(QWidget):
 
     # Funcionalidad -------------------------------------------------------------------------------
     def open_patient_data_window(self):
-        self.patient_data_window = PatientDataScreen()
-
-        # Mantener tamaño y posición de la ventana actual
-        self.patient_data_window.resize(self.size())
-        self.patient_data_window.move(self.pos())
-        if self.isMaximized():
-            self.patient_data_window.showMaximized()
-        else:
-            self.patient_data_window.show()
-
-        # Cerrar la ventana actual después de mostrar la nueva
-        QTimer.singleShot(50, self.close)
+        app_window().show_screen(PatientDataScreen)
 
     def open_history(self):
-        
-        self.history_window = HistoryScreen()
-
-        self.history_window.resize(self.size())
-        self.history_window.move(self.pos())
-        if self.isMaximized():
-            self.history_window.showMaximized()
-        else:
-            self.history_window.show()
-
-        QTimer.singleShot(50, self.close)
+        app_window().show_screen(HistoryScreen)
 
 
 # =================================================================================================
@@ -361,21 +496,17 @@ class PatientDataScreen(QWidget):
 
  # Funcionalidad -------------------------------------------------------------------------------
 
+    # Cada visita empieza con el formulario vacío
+    def on_enter(self):
+        for field in (self.name_input, self.surname_input, self.dni_input, self.age_input, self.height_input):
+            field.clear()
+        self.sex_combo.setCurrentIndex(0)
+        self.observations_input.clear()
+        self.name_input.setFocus()
+
     # Volver a la ventana de inicio
     def go_back(self):
-        
-        self.welcome_screen = WelcomeScreen()
-
-        # Mantener tamaño y posición de la ventana actual
-        self.welcome_screen.resize(self.size())
-        self.welcome_screen.move(self.pos())
-        if self.isMaximized():
-            self.welcome_screen.showMaximized()
-        else:
-            self.welcome_screen.show()
-
-        # Cerrar la ventana actual después de mostrar la nueva
-        QTimer.singleShot(50, self.close)
+        app_window().show_screen(WelcomeScreen)
 
 
     # Continuar a la ventana principal
@@ -498,20 +629,7 @@ class PatientDataScreen(QWidget):
         }
 
         try:
-            
-            self.main_window = MainScreen(patient_data)
-
-            # Mantener tamaño y posición de la ventana actual
-            self.main_window.resize(self.size())
-            self.main_window.move(self.pos())
-            if self.isMaximized():
-                self.main_window.showMaximized()
-            else:
-                self.main_window.show()
-
-            # Cerrar la ventana actual después de mostrar la nueva
-            QTimer.singleShot(50, self.close)
-            
+            app_window().show_screen(MainScreen, patient_data)
         except Exception as e:
             msg = QMessageBox(self)
             msg.setIcon(QMessageBox.Icon.Critical)
@@ -521,11 +639,558 @@ class PatientDataScreen(QWidget):
 
 
 
+# =================================================================================================
+# Modelo y delegado de la tabla de historial
+# =================================================================================================
+class HistoryTableModel(QAbstractTableModel):
+    # 0:Fecha, 1:DNI, 2:Nombre, 3:Apellido, 4:Edad, 5:Altura, 6:Sexo, 7:HR, 8:crPWV, 9:Acciones
+    HEADERS = ["Fecha y Hora", "DNI", "Nombre", "Apellido", "Edad", "Altura", "Sexo", "HR", "crPWV", "Acciones"]
+    KEYS = ("fecha", "dni", "nombre", "apellido", "edad", "altura", "sexo", "hr", "pwv")
+    ACTIONS_COLUMN = 9
+    PAGE_SIZE = 200
+
+    MAX_CACHED_PAGES = 50
+
+    # crPWV con lógica dinámica por edad (zona fisiológica del gráfico de referencia)
+    STATUS_COLORS = {STATUS_NORMAL: QColor(Qt.GlobalColor.green), STATUS_ABNORMAL: QColor(Qt.GlobalColor.red)}
+
+    def __init__(self, source, parent=None):
+        # source: count(), fetch_page(offset, limit) y crpwv_status(offset, limit) (MeasurementRepository)
+        super().__init__(parent)
+        self._source = source
+        self._total = source.count()
+        self._pages = OrderedDict()  # nro de página -> (registros, textos, colores crPWV)
+
+    # Carga perezosa: la tabla conoce el total, pero cada página se trae recién cuando se dibuja
+    def _page(self, row):
+        page_no = row // self.PAGE_SIZE
+        page = self._pages.get(page_no)
+        if page is None:
+            offset = page_no * self.PAGE_SIZE
+            records = self._source.fetch_page(offset, self.PAGE_SIZE)
+            # La clasificación ya está calculada para todo el historial: acá solo se lee
+            statuses = self._source.crpwv_status(offset, self.PAGE_SIZE)
+            page = (
+                records,
+                [self.format_record(r) for r in records],
+                [self.STATUS_COLORS.get(int(st)) for st in statuses],
+            )
+            self._pages[page_no] = page
+            if len(self._pages) > self.MAX_CACHED_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_no)
+        return page, row - page_no * self.PAGE_SIZE
+
+    @classmethod
+    def format_record(cls, record):
+        # Textos de cada columna; fecha como DD/MM/YYYY HH:MM
+        return (format_fecha(record["fecha"]),) + tuple(format_value(record, key) for key in cls.KEYS[1:])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._total
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        col = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if col == self.ACTIONS_COLUMN:
+                return None
+            (_, rows, _), i = self._page(index.row())
+            return rows[i][col]
+        if role == Qt.ItemDataRole.ForegroundRole and col == 8:
+            (_, _, colors), i = self._page(index.row())
+            return colors[i]
+        if role == Qt.ItemDataRole.UserRole:
+            (records, _, _), i = self._page(index.row())
+            return records[i]["id"]
+        return None
+
+    def reload(self):
+        # Vuelve a leer el total desde la fuente y descarta las páginas ya formateadas
+        self.beginResetModel()
+        self._total = self._source.count()
+        self._pages.clear()
+        self.endResetModel()
+
+    def record(self, row):
+        (records, _, _), i = self._page(row)
+        return records[i]
+
+
+class HistoryFilterProxy(QAbstractProxyModel):
+    """
+    Filtro de la tabla por lista explícita de filas del modelo fuente.
+
+    Las filas aceptadas las resuelven los índices del historial (SearchIndex), así
+    que filtrar no llama a Python una vez por fila como QSortFilterProxyModel.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = None  # None: sin filtro
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelReset.connect(self._on_source_reset)
+
+    def _on_source_reset(self):
+        self.beginResetModel()
+        self._rows = None
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """rows: filas fuente ordenadas, o None para mostrar todo."""
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        if self._rows is None:
+            return self.sourceModel().rowCount()
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or column < 0:
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def source_row(self, row):
+        return row if self._rows is None else self._rows[row]
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.source_row(proxy_index.row()), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self._rows is not None:
+            pos = bisect_left(self._rows, row)
+            if pos >= len(self._rows) or self._rows[pos] != row:
+                return QModelIndex()
+            row = pos
+        return self.index(row, source_index.column())
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        return self.sourceModel().headerData(section, orientation, role)
+
+
+class HistoryActionsDelegate(QStyledItemDelegate):
+    """Dibuja los botones de descargar / eliminar en vez de crear dos QPushButton por fila."""
+
+    # Emiten el ID estable del registro, no la fila: sigue siendo válido con filtros activos
+    download_clicked = pyqtSignal(object)
+    delete_clicked = pyqtSignal(object)
+
+    ICON_SIZE = 35
+    BUTTON_SIZE = 50
+    SPACING = 8
+    _pixmaps = {}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hover = None  # (fila, botón) bajo el mouse
+
+    @classmethod
+    def _pixmap(cls, name):
+        # Cada ícono se decodifica una sola vez en todo el proceso
+        pixmap = cls._pixmaps.get(name)
+        if pixmap is None:
+            pixmap = QIcon(resource_path(name)).pixmap(QSize(cls.ICON_SIZE, cls.ICON_SIZE))
+            cls._pixmaps[name] = pixmap
+        return pixmap
+
+    def _button_rects(self, cell_rect):
+        total = 2 * self.BUTTON_SIZE + self.SPACING
+        x = cell_rect.x() + (cell_rect.width() - total) // 2
+        y = cell_rect.y() + (cell_rect.height() - self.BUTTON_SIZE) // 2
+        download = QRect(x, y, self.BUTTON_SIZE, self.BUTTON_SIZE)
+        delete = QRect(x + self.BUTTON_SIZE + self.SPACING, y, self.BUTTON_SIZE, self.BUTTON_SIZE)
+        return download, delete
+
+    def paint(self, painter, option, index):
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, QColor("#424242"))
+        rects = self._button_rects(option.rect)
+        icons = ("download-icon.png", "delete-icon.png")
+        for slot, (rect, icon) in enumerate(zip(rects, icons)):
+            if self._hover == (index.row(), slot):
+                painter.fillRect(rect, QColor(255, 255, 255, 25))
+            pixmap = self._pixmap(icon)
+            offset = (self.BUTTON_SIZE - self.ICON_SIZE) // 2
+            painter.drawPixmap(rect.x() + offset, rect.y() + offset, pixmap)
+
+    def sizeHint(self, option, index):
+        return QSize(2 * self.BUTTON_SIZE + self.SPACING + 10, self.BUTTON_SIZE + 4)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.Type.MouseMove, QEvent.Type.MouseButtonRelease):
+            return False
+        pos = event.position().toPoint()
+        slot = None
+        for i, rect in enumerate(self._button_rects(option.rect)):
+            if rect.contains(pos):
+                slot = i
+        hover = (index.row(), slot) if slot is not None else None
+        if hover != self._hover:
+            self._hover = hover
+            if option.widget is not None:
+                option.widget.viewport().update()
+        if event.type() == QEvent.Type.MouseButtonRelease and slot is not None:
+            record_id = index.data(Qt.ItemDataRole.UserRole)
+            if slot == 0:
+                self.download_clicked.emit(record_id)
+            else:
+                self.delete_clicked.emit(record_id)
+            return True
+        return False
+
+
+# =================================================================================================
+# Tendencia por paciente
+# =================================================================================================
+class PatientTrendDialog(QDialog):
+    """crPWV y HR de un paciente a lo largo del tiempo, sobre la zona normal para su edad."""
+
+    def __init__(self, dni, parent=None):
+        load_pyqtgraph()
+        super().__init__(parent)
+        self.dni = dni
+        self.setWindowTitle("Tendencia del Paciente")
+        self.setStyleSheet("background-color: black; color: white;")
+        self.resize(1100, 750)
+
+        layout = QVBoxLayout(self)
+        self.title = QLabel()
+        self.title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.title.setStyleSheet("font-size: 18pt; font-weight: bold; margin: 10px;")
+        layout.addWidget(self.title)
+
+        self.pwv_plot = self._make_plot("crPWV (m/s)")
+        self.hr_plot = self._make_plot("HR (bpm)")
+        self.hr_plot.setXLink(self.pwv_plot)
+        layout.addWidget(self.pwv_plot, 3)
+        layout.addWidget(self.hr_plot, 2)
+
+        # Zona normal (mismas curvas que el gráfico de referencia), según la edad en cada medición
+        dashed_red = pg.mkPen((255, 80, 80), width=1.6, style=Qt.PenStyle.DashLine)
+        self.band_upper = pg.PlotDataItem(pen=dashed_red)
+        self.band_lower = pg.PlotDataItem(pen=dashed_red)
+        self.band_fill = pg.FillBetweenItem(self.band_upper, self.band_lower, brush=pg.mkBrush(0, 255, 0, 70))
+        self.pwv_plot.addItem(self.band_fill)
+        self.pwv_plot.addItem(self.band_upper)
+        self.pwv_plot.addItem(self.band_lower)
+
+        self.pwv_line = pg.PlotDataItem(pen=pg.mkPen('w', width=2), connect="finite")
+        self.pwv_points = pg.ScatterPlotItem(size=12, pen=pg.mkPen('w', width=1.5), pxMode=True)
+        self.pwv_plot.addItem(self.pwv_line)
+        self.pwv_plot.addItem(self.pwv_points)
+
+        self.hr_line = pg.PlotDataItem(
+            pen=pg.mkPen((33, 150, 243), width=2), connect="finite",
+            symbol='o', symbolSize=9, symbolBrush=(33, 150, 243), symbolPen='w',
+        )
+        self.hr_plot.addItem(self.hr_line)
+
+        close_button = QPushButton("Cerrar")
+        close_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+                max-width: 200px;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        close_button.clicked.connect(self.close)
+        layout.addWidget(close_button, alignment=Qt.AlignmentFlag.AlignRight)
+
+        # Se redibuja si se guarda o elimina una medición mientras está abierto
+        measurement_repository().subscribe(self._on_history_changed)
+        self.refresh()
+
+    @staticmethod
+    def _make_plot(label):
+        # Fechas "naive" (parse_epochs): utcOffset=0 para mostrarlas tal cual
+        plot = pg.PlotWidget(axisItems={"bottom": pg.DateAxisItem(utcOffset=0)})
+        plot.setBackground('k')
+        plot.showGrid(x=True, y=True)
+        plot_item = plot.getPlotItem()
+        left_axis = plot_item.getAxis('left')
+        bottom_axis = plot_item.getAxis('bottom')
+        left_axis.setLabel(label, **{'color': '#FFFFFF', 'font-size': '11pt'})
+        for axis in (left_axis, bottom_axis):
+            axis.setPen(pg.mkPen('w'))
+            axis.setTextPen(pg.mkPen('w'))
+        return plot
+
+    def _on_history_changed(self, event, row):
+        self.refresh()
+
+    def closeEvent(self, event):
+        measurement_repository().unsubscribe(self._on_history_changed)
+        super().closeEvent(event)
+
+    def refresh(self):
+        records = measurement_repository().patient_records(self.dni)
+        if not records:
+            self.title.setText(f"DNI {self.dni}: sin mediciones")
+            for item in (self.band_upper, self.band_lower, self.pwv_line, self.hr_line):
+                item.setData([], [])
+            self.pwv_points.setData([], [])
+            return
+
+        last = records[-1]
+        count = f"{len(records)} mediciones" if len(records) != 1 else "1 medición"
+        self.title.setText(f"{last['nombre']} {last['apellido']} - DNI {self.dni} - {count}")
+
+        def column(key):
+            return np.array([np.nan if r[key] is None else r[key] for r in records], dtype=float)
+
+        epochs = parse_epochs(r["fecha"] for r in records)
+        x = np.where(epochs == INVALID_EPOCH, np.nan, epochs.astype(float))
+        pwv = column("pwv")
+        hr = column("hr")
+        edad = column("edad")
+
+        self.pwv_line.setData(x, pwv)
+        self.hr_line.setData(x, hr)
+
+        # Zona normal: de la primera a la última medición, con un margen para que se vea con una sola
+        known = np.isfinite(x) & np.isfinite(edad)
+        if known.any():
+            xs, ages = x[known], edad[known]
+            pad = max(86400.0, 0.05 * (xs[-1] - xs[0]))
+            band_x = np.concatenate(([xs[0] - pad], xs, [xs[-1] + pad]))
+            band_age = np.concatenate(([ages[0]], ages, [ages[-1]]))
+            lower, upper = crpwv_bounds_for_age(band_age)
+            self.band_upper.setData(band_x, upper)
+            self.band_lower.setData(band_x, lower)
+        else:
+            self.band_upper.setData([], [])
+            self.band_lower.setData([], [])
+
+        # Cada punto en verde / rojo según su edad en esa medición (blanco si falta la edad)
+        _, _, status = classify_crpwv(edad, pwv)
+        shown = np.isfinite(x) & np.isfinite(pwv)
+        palette = {
+            STATUS_NORMAL: pg.mkBrush(0, 220, 0),
+            STATUS_ABNORMAL: pg.mkBrush(255, 80, 80),
+        }
+        white = pg.mkBrush(255, 255, 255)
+        brushes = [palette.get(int(st), white) for st in status[shown]]
+        self.pwv_points.setData(x=x[shown], y=pwv[shown], brush=brushes)
+        self.pwv_plot.enableAutoRange()
+        self.hr_plot.enableAutoRange()
+
+
+# =================================================================================================
+# Estadísticas de población
+# =================================================================================================
+class StatisticsDialog(QDialog):
+    """Estadísticas sobre todo el historial; se recalculan al guardar o eliminar mediciones."""
+
+    SEX_COLORS = ((236, 64, 122), (33, 150, 243), (158, 158, 158))  # Femenino, Masculino, sin dato
+    SEX_OFFSETS = (-0.25, 0.0, 0.25)
+    MAX_SCATTER_POINTS = 5000
+
+    def __init__(self, parent=None):
+        load_pyqtgraph()
+        super().__init__(parent)
+        self.setWindowTitle("Estadísticas")
+        self.setStyleSheet("background-color: black; color: white;")
+        self.resize(1400, 900)
+
+        layout = QVBoxLayout(self)
+        title = QLabel("Estadísticas del Historial")
+        title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        title.setStyleSheet("font-size: 22pt; font-weight: bold; margin: 10px;")
+        layout.addWidget(title)
+
+        self.summary_label = QLabel()
+        self.summary_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.summary_label.setStyleSheet("font-size: 12pt;")
+        layout.addWidget(self.summary_label)
+
+        grid = QGridLayout()
+        layout.addLayout(grid, 1)
+        band_ticks = [[(i, label) for i, label in enumerate(AGE_BAND_LABELS)]]
+
+        # crPWV por banda de edad y sexo: mediana y rango intercuartil
+        self.dist_plot = self._make_plot("crPWV (m/s)", "crPWV por edad y sexo (mediana, p25-p75)")
+        self.dist_plot.getPlotItem().getAxis('bottom').setTicks(band_ticks)
+        legend = self.dist_plot.addLegend(offset=(10, 10))
+        legend.setLabelTextColor('w')
+        self.dist_items = []
+        for label, color in zip(SEX_LABELS, self.SEX_COLORS):
+            errors = pg.ErrorBarItem(x=np.zeros(0), y=np.zeros(0), beam=0.12, pen=pg.mkPen(color, width=2))
+            medians = pg.ScatterPlotItem(size=11, brush=pg.mkBrush(*color), pen=pg.mkPen('w'), name=label)
+            self.dist_plot.addItem(errors)
+            self.dist_plot.addItem(medians)
+            self.dist_items.append((errors, medians))
+        grid.addWidget(self.dist_plot, 0, 0)
+
+        # Porcentaje fuera de la zona normal por banda y sexo
+        self.outside_plot = self._make_plot("% fuera de la zona normal", "Fuera de la zona normal por edad y sexo")
+        self.outside_plot.getPlotItem().getAxis('bottom').setTicks(band_ticks)
+        self.outside_bars = []
+        for color in self.SEX_COLORS:
+            bars = pg.BarGraphItem(x=[], height=[], width=0.22, brush=pg.mkBrush(*color))
+            self.outside_plot.addItem(bars)
+            self.outside_bars.append(bars)
+        grid.addWidget(self.outside_plot, 0, 1)
+
+        # crPWV vs edad: mediciones, ajuste empírico y curvas del paper (como en el gráfico de resultados)
+        self.regression_plot = self._make_plot("crPWV (m/s)", "crPWV vs edad")
+        self.regression_plot.setXRange(10, 100, padding=0)
+        x_fit = np.linspace(10, 100, 200)
+        lower, upper = crpwv_bounds_for_age(x_fit)
+        dashed_red = pg.mkPen((255, 80, 80), width=1.6, style=Qt.PenStyle.DashLine)
+        upper_item = pg.PlotDataItem(x_fit, upper, pen=dashed_red)
+        lower_item = pg.PlotDataItem(x_fit, lower, pen=dashed_red)
+        self.regression_plot.addItem(pg.FillBetweenItem(upper_item, lower_item, brush=pg.mkBrush(0, 255, 0, 40)))
+        self.regression_plot.addItem(upper_item)
+        self.regression_plot.addItem(lower_item)
+        self.regression_points = pg.ScatterPlotItem(size=4, pen=None, brush=pg.mkBrush(255, 255, 255, 90))
+        self.regression_plot.addItem(self.regression_points)
+        self.regression_plot.plot(x_fit, CRPWV_CENTER * np.exp(CRPWV_AGE_COEF * x_fit),
+                                  pen=pg.mkPen((0, 220, 0), width=2, style=Qt.PenStyle.DashLine))
+        self.empirical_curve = self.regression_plot.plot([], [], pen=pg.mkPen((255, 235, 59), width=3))
+        self.regression_label = QLabel()
+        self.regression_label.setStyleSheet("font-size: 11pt;")
+        regression_box = QVBoxLayout()
+        regression_box.addWidget(self.regression_plot, 1)
+        regression_box.addWidget(self.regression_label)
+        grid.addLayout(regression_box, 1, 0)
+
+        # Mediciones por día
+        self.daily_plot = self._make_plot("Mediciones", "Mediciones por día",
+                                          axisItems={"bottom": pg.DateAxisItem(utcOffset=0)})
+        self.daily_bars = pg.BarGraphItem(x=[], height=[], width=0.8 * SECONDS_PER_DAY,
+                                          brush=pg.mkBrush(33, 150, 243), pen=pg.mkPen(33, 150, 243))
+        self.daily_plot.addItem(self.daily_bars)
+        grid.addWidget(self.daily_plot, 1, 1)
+
+        close_button = QPushButton("Cerrar")
+        close_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+                max-width: 200px;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        close_button.clicked.connect(self.close)
+        layout.addWidget(close_button, alignment=Qt.AlignmentFlag.AlignRight)
+
+        measurement_repository().subscribe(self._on_history_changed)
+        self.refresh()
+
+    @staticmethod
+    def _make_plot(label, title, **kwargs):
+        plot = pg.PlotWidget(**kwargs)
+        plot.setBackground('k')
+        plot.showGrid(x=True, y=True)
+        plot.setTitle(title, color='w', size='12pt')
+        plot_item = plot.getPlotItem()
+        left_axis = plot_item.getAxis('left')
+        bottom_axis = plot_item.getAxis('bottom')
+        left_axis.setLabel(label, **{'color': '#FFFFFF', 'font-size': '11pt'})
+        for axis in (left_axis, bottom_axis):
+            axis.setPen(pg.mkPen('w'))
+            axis.setTextPen(pg.mkPen('w'))
+        return plot
+
+    def _on_history_changed(self, event, row):
+        self.refresh()
+
+    def closeEvent(self, event):
+        measurement_repository().unsubscribe(self._on_history_changed)
+        super().closeEvent(event)
+
+    def refresh(self):
+        repository = measurement_repository()
+        columns = repository.columns()
+        stats = summarize(columns)
+
+        self.summary_label.setText(
+            f"{stats['measurements']} mediciones  ·  {repository.patient_count()} pacientes  ·  "
+            f"{100 * stats['outside_fraction']:.1f} % fuera de la zona normal "
+            f"({stats['outside']} de {stats['classified']} con edad y crPWV)"
+        )
+
+        by_band = stats["by_band"]
+        bands = np.arange(len(AGE_BAND_LABELS), dtype=float)
+        for i, ((errors, medians), bars) in enumerate(zip(self.dist_items, self.outside_bars)):
+            has_data = by_band["count"][:, i] > 0
+            x = bands[has_data] + self.SEX_OFFSETS[i]
+            median = by_band["median"][has_data, i]
+            errors.setData(x=x, y=median, top=by_band["p75"][has_data, i] - median,
+                           bottom=median - by_band["p25"][has_data, i])
+            medians.setData(x=x, y=median)
+            outside = np.nan_to_num(by_band["outside_fraction"][:, i]) * 100.0
+            bars.setOpts(x=bands + self.SEX_OFFSETS[i], height=outside)
+
+        # Nube de puntos submuestreada: la regresión usa todas las mediciones
+        edad, pwv = columns["edad"], columns["pwv"]
+        ok = np.flatnonzero(np.isfinite(edad) & np.isfinite(pwv))
+        step = max(1, len(ok) // self.MAX_SCATTER_POINTS)
+        self.regression_points.setData(x=edad[ok[::step]], y=pwv[ok[::step]])
+        reg = stats["regression"]
+        if np.isfinite(reg["a"]):
+            x_fit = np.linspace(10, 100, 200)
+            self.empirical_curve.setData(x_fit, reg["a"] * np.exp(reg["b"] * x_fit))
+            self.regression_label.setText(
+                f"Empírica: crPWV = {reg['a']:.2f} · e^({reg['b']:.4f} · edad)   "
+                f"(R² {reg['r2']:.2f}, n = {reg['n']})      "
+                f"Paper: crPWV = {reg['paper_a']:.2f} · e^({reg['paper_b']:.4f} · edad)"
+            )
+        else:
+            self.empirical_curve.setData([], [])
+            self.regression_label.setText("Sin mediciones suficientes para el ajuste.")
+
+        days, counts = stats["per_day"]
+        self.daily_bars.setOpts(x=days + SECONDS_PER_DAY / 2, height=counts)
+
+
 # =================================================================================================
 # Ventana de Historial de Mediciones
 # =================================================================================================
 class HistoryScreen(QWidget):
-    def save_pdf(self, report_text):
+    def save_pdf(self, item):
 
         # ================= SELECCIÓN DE RUTA =================
         file_path, _ = QFileDialog.getSaveFileName(
@@ -542,43 +1207,25 @@ class HistoryScreen(QWidget):
             file_path += ".pdf"
 
         # ================= CREAR PDF =================
-        c = canvas.Canvas(file_path, pagesize=A4)
-        width, height = A4
-
-        # ================= LOGO =================
-        logo_path = resource_path("Logo.jpg")
-        if os.path.exists(logo_path):
-            logo_width = 140
-            logo_height = 60
-            x_centered = (width - logo_width) / 2
-
-            c.drawImage(
-                logo_path,
-                x=x_centered,
-                y=height - 100,
-                width=logo_width,
-                height=logo_height,
-                preserveAspectRatio=True,
-                mask='auto'
-            )
-
-        # ================= TÍTULO =================
-        c.setFont("Helvetica-Bold", 16)
-        c.drawCentredString(width / 2, height - 160, "REPORTE DE MEDICIÓN")
-
-        # ================= TEXTO =================
-        margen_izquierdo = 140
-        text = c.beginText(margen_izquierdo, height - 200)
-        text.setFont("Helvetica", 11)
-        text.setLeading(14)
-
-        for line in report_text.strip().split("\n"):
-            text.textLine(line)
-
-        c.drawText(text)
-
-        c.showPage()
-        c.save()
+        # Texto y gráficos se dibujan en otro proceso; la GUI solo espera el resultado
+        from Reportes import submit_report
+        future = submit_report(file_path, item, resource_path("Logo.jpg"))
+        # Un temporizador por exportación: dos reportes seguidos no comparten el future
+        timer = QTimer(self)
+        timer.timeout.connect(lambda: self._poll_report(timer, future, file_path))
+        timer.start(30)
+
+    def _poll_report(self, timer, future, file_path):
+        if not future.done():
+            return
+        timer.stop()
+        timer.deleteLater()
+        try:
+            future.result()
+        except Exception as e:
+            QMessageBox.critical(self, "Error al Exportar",
+                                 f"No se pudo generar el reporte:\n{e}")
+            return
 
         # ================= MENSAJE DE CONFIRMACIÓN =================
         msg = QMessageBox(self)
@@ -649,7 +1296,12 @@ class HistoryScreen(QWidget):
                 max-width: 500px;
             }
         """)
-        self.search_input.textChanged.connect(self.filter_table)
+        # Búsqueda con debounce: se filtra cuando se deja de tipear, no en cada tecla
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(lambda: self.filter_table(self.search_input.text()))
+        self.search_input.textChanged.connect(self.search_timer.start)
         search_layout.addWidget(self.search_input)
 
         search_layout.addSpacing(20)
@@ -672,9 +1324,109 @@ class HistoryScreen(QWidget):
 
         search_layout.addWidget(filter_button)
 
+        export_button = QPushButton("Exportar")
+        export_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        export_button.clicked.connect(self.export_history)
+        search_layout.addWidget(export_button)
+
+        merge_button = QPushButton("🔀 Fusionar Estaciones")
+        merge_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        merge_button.clicked.connect(self.merge_stations)
+        search_layout.addWidget(merge_button)
+
+        batch_pdf_button = QPushButton("🖨 Exportar PDFs")
+        batch_pdf_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        batch_pdf_button.clicked.connect(self.export_selection_pdfs)
+        search_layout.addWidget(batch_pdf_button)
+
+        trend_button = QPushButton("📈 Tendencia del Paciente")
+        trend_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        trend_button.clicked.connect(self.open_selected_trend)
+        search_layout.addWidget(trend_button)
+
+        stats_button = QPushButton("📊 Estadísticas")
+        stats_button.setStyleSheet("""
+            QPushButton {
+                background-color: #424242;
+                color: white;
+                font-size: 12pt;
+                padding: 10px 20px;
+                border-radius: 5px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #616161;
+            }
+        """)
+        stats_button.clicked.connect(self.open_statistics)
+        search_layout.addWidget(stats_button)
+
         self.layout.addLayout(search_layout)
         self.layout.addSpacing(20)
 
+        self._search_rows = None  # None: sin búsqueda
+        self._date_range = None  # (epoch desde, epoch hasta) o None
+        self._date_rows = None
+        self._table_slot = self.layout.count()  # La tabla (o el mensaje vacío) va acá, antes de "Volver"
+        self.empty_label = None
+
+        # Historial compartido: no se relee la base en cada visita y avisa altas y bajas
+        repository = measurement_repository()
+        repository.refresh_if_changed()
+        repository.subscribe(self._on_history_changed)
+        # Cambios hechos por otra estación / proceso sobre la misma base
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setInterval(2000)
+        self.reload_timer.timeout.connect(repository.refresh_if_changed)
+        self.reload_timer.start()
         self.load_data()
 
         back_button = QPushButton("Volver")
@@ -698,10 +1450,8 @@ class HistoryScreen(QWidget):
 
     @staticmethod
     def _crpwv_bounds_for_age(age_years):
-        exp_term = np.exp(0.0022 * age_years)
-        upper = 12.0 * exp_term
-        lower = 4.0 * exp_term
-        return lower, upper
+        # Escalar o arreglo de edades (ver Historial.crpwv_bounds_for_age)
+        return crpwv_bounds_for_age(age_years)
 
 
     def _is_crpwv_normal(self, age_years, crpwv_value):
@@ -712,30 +1462,13 @@ class HistoryScreen(QWidget):
 
 
     def load_data(self):
-        filename = resource_path("mediciones_pwv.csv") 
-        self.all_data = [] # Inicializamos para evitar el AttributeError
-
-        # Si el archivo NO existe, lo creamos con el formato correcto vacio
-        if not os.path.exists(filename):
-            print(f"Creando archivo nuevo: {filename}")
-            header = ["Fecha y Hora", "DNI", "Nombre", "Apellido", "Edad", "Altura (cm)", "Sexo", "HR (bpm)", "crPWV (m/s)", "Observaciones"]
-
-            try:
-                with open(filename, mode='w', newline='', encoding='utf-8-sig') as file:
-                    writer = csv.writer(file, delimiter=';')
-                    writer.writerow(header)
-            except Exception as e:
-                print(f"Error al crear el archivo: {e}")
-
-        # Una vez creado (o si ya existía), lo cargamos normalmente
         try:
-            with open(filename, newline='', encoding='utf-8-sig') as file:
-                rows = list(csv.reader(file, delimiter=';'))
-
-            if len(rows) > 1:
-                # Filtramos posibles filas vacías al final
-                self.all_data = [r for r in rows[1:] if len(r) >= 9]
-                self.show_table(self.all_data)
+            repository = measurement_repository()
+            if repository.count() > 0:
+                self.show_table(repository)
+                # La primera página sale de la base; la copia en memoria y sus índices se arman en
+                # otro hilo y quedan en el repositorio (solo la primera visita los arma)
+                repository.load_in_background()
             else:
                 self.show_empty_message()
 
@@ -744,31 +1477,32 @@ class HistoryScreen(QWidget):
             self.show_empty_message()
 
     def show_empty_message(self):
-        label = QLabel("No existen registros.")
-        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        label.setStyleSheet("font-size: 18pt; color: gray;")
-        self.layout.addWidget(label)
-
-    def show_table(self, data):
-        self.table = QTableWidget()
-        self.table.setRowCount(len(data))
-        visible_headers = ["Fecha y Hora", "DNI", "Nombre",  "Apellido", "Edad", "Altura", "Sexo", "HR", "crPWV", "Acciones"]
-        self.table.setColumnCount(len(visible_headers))
-        self.table.setHorizontalHeaderLabels(visible_headers)
+        self.empty_label = QLabel("No existen registros.")
+        self.empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.empty_label.setStyleSheet("font-size: 18pt; color: gray;")
+        self.layout.insertWidget(self._table_slot, self.empty_label)
+
+    def show_table(self, source):
+        self.model = HistoryTableModel(source, self)
+        self.proxy = HistoryFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
 
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #1a1a1a;
                 color: white;
                 gridline-color: #2a2a2a;
                 font-size: 11pt;
                 border: none;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 12px;
                 border-bottom: 1px solid #2a2a2a;
             }
-            QTableWidget::item:alternate {
+            QTableView::item:alternate {
                 background-color: #2a2a2a;
             }
             QHeaderView::section {
@@ -780,109 +1514,55 @@ class HistoryScreen(QWidget):
                 border: none;
                 border-bottom: 2px solid #424242;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #424242;
             }
         """)
 
         self.table.setAlternatingRowColors(False)
         self.table.verticalHeader().setVisible(False)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel) # Barra deslizante
         self.table.verticalScrollBar().setSingleStep(5)
+        self.table.setMouseTracking(True) # Hover de los botones dibujados por el delegado
 
-        for r, row in enumerate(data):
-            # 0:Fecha, 1:DNI, 2:Nombre, 3:Apellido, 4:Edad, 5:Altura, 6:Sexo, 7:HR, 8:crPWV
-            
-            # Fecha (DD/MM/YYYY HH:MM)
-            try:
-                raw_date = row[0]
-                # Leemos el formato del CSV (Año-Mes-Día)
-                dt_obj = datetime.strptime(raw_date, "%Y-%m-%d %H:%M:%S")
-                
-                # Lo escribimos en formato local (Día/Mes/Año) y sin segundos
-                clean_date = dt_obj.strftime("%d/%m/%Y %H:%M")
-                
-                self.table.setItem(r, 0, QTableWidgetItem(clean_date))
-            except Exception:
-                self.table.setItem(r, 0, QTableWidgetItem(row[0]))
-             
-            self.table.setItem(r, 1, QTableWidgetItem(row[1])) # DNI
-            self.table.setItem(r, 2, QTableWidgetItem(row[2])) # Nombre
-            self.table.setItem(r, 3, QTableWidgetItem(row[3])) # Apellido
-            self.table.setItem(r, 4, QTableWidgetItem(row[4])) # Edad
-            self.table.setItem(r, 5, QTableWidgetItem(row[5])) # Altura
-            self.table.setItem(r, 6, QTableWidgetItem(row[6])) # Sexo
-            self.table.setItem(r, 7, QTableWidgetItem(row[7])) # HR
-
-            # crPWV con lógica dinámica por edad (zona fisiológica del gráfico de referencia)
-            pwv_item = QTableWidgetItem(row[8])
-            try:
-                val = float(row[8])
-                edad_val = float(row[4])
-                es_normal = self._is_crpwv_normal(edad_val, val)
-                pwv_item.setForeground(Qt.GlobalColor.green if es_normal else Qt.GlobalColor.red)
-            except: pass
-            self.table.setItem(r, 8, pwv_item)
-
-            # Botones
-            actions_widget = QWidget()
-            actions_widget.setStyleSheet("background-color: transparent;") 
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(5, 2, 5, 2)
-            actions_layout.setSpacing(8)
-
-            # Boton de descargar
-            download_button = QPushButton()
-            download_button.setIcon(QIcon(resource_path("download-icon.png")))
-            download_button.setIconSize(QSize(35, 35))
-            download_button.setFixedSize(50, 50)
-            download_button.setStyleSheet("""
-                QPushButton {
-                    background-color: transparent;
-                    border: none;
-                }
-                QPushButton:hover {
-                    background-color: rgba(255, 255, 255, 0.1);
-                }
-            """)
-            download_button.clicked.connect(lambda checked, row=r: self.print_record(row))
-            actions_layout.addWidget(download_button)
-
-            # Boton de eliminar
-            delete_button = QPushButton()
-            delete_button.setIcon(QIcon(resource_path("delete-icon.png")))
-            delete_button.setIconSize(QSize(35, 35))
-            delete_button.setFixedSize(50, 50)
-            delete_button.setStyleSheet("""
-                QPushButton {
-                    background-color: transparent;
-                    border: none;
-                }
-                QPushButton:hover {
-                    background-color: rgba(255, 255, 255, 0.1);
-                }
-            """)
-            delete_button.clicked.connect(lambda checked, row=r: self.delete_record(row))
-            actions_layout.addWidget(delete_button)
+        # Alto fijo de fila: la vista no necesita medir cada fila
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(75)
+
+        # Botones de descargar / eliminar
+        self.actions_delegate = HistoryActionsDelegate(self.table)
+        self.actions_delegate.download_clicked.connect(self.print_record)
+        self.actions_delegate.delete_clicked.connect(self.delete_record)
+        self.table.setItemDelegateForColumn(HistoryTableModel.ACTIONS_COLUMN, self.actions_delegate)
 
-            self.table.setCellWidget(r, 9, actions_widget)
-            self.table.setRowHeight(r, 75)
+        # Doble clic en una medición: tendencia de ese paciente
+        self.table.doubleClicked.connect(self._on_row_double_clicked)
 
+        self.table.horizontalHeader().setResizeContentsPrecision(HistoryTableModel.PAGE_SIZE) # Solo la primera página
         self.table.resizeColumnsToContents()
         self.table.horizontalHeader().setStretchLastSection(True)
 
-        for i in range(self.table.columnCount()):
+        for i in range(self.model.columnCount()):
             if self.table.columnWidth(i) < 100:
                 self.table.setColumnWidth(i, 100)
         
-        actions_col = self.table.columnCount() - 1
+        actions_col = self.model.columnCount() - 1
         self.table.setColumnWidth(actions_col, 200)
 
-        self.layout.addWidget(self.table)
+        self.layout.insertWidget(self._table_slot, self.table)
 
-    def delete_record(self, row):
+        self._reapply_filters()
+
+    def _reapply_filters(self):
+        # Las filas cambiaron: se recalculan búsqueda y rango de fechas activos
+        self._search_rows = None
+        self._date_rows = None
+        if self.search_input.text().strip() or self._date_range is not None:
+            self.filter_table(self.search_input.text())
+
+    def delete_record(self, record_id):
 
         # Mensaje de confirmación
         msg = QMessageBox(self)
@@ -930,27 +1610,15 @@ class HistoryScreen(QWidget):
 
         # Si el usuario confirmed la eliminación
         if msg.clickedButton() == yes_button:
-            self.perform_deletion(row)
-
-    def perform_deletion(self, row):
-        filename = resource_path("mediciones_pwv.csv")
+            self.perform_deletion(record_id)
 
+    def perform_deletion(self, record_id):
         try:
-            # Leer el archivo CSV completo
-            with open(filename, 'r', newline='', encoding='utf-8-sig') as file:
-                rows = list(csv.reader(file, delimiter=';'))
-
-            # Eliminar la fila (row+1 porque row 0 es el header)
-            if len(rows) > row + 1:
-                del rows[row + 1]
-
-            # Reescribir el archivo CSV sin la fila eliminada
-            with open(filename, 'w', newline='', encoding='utf-8-sig') as file:
-                writer = csv.writer(file, delimiter=';')
-                writer.writerows(rows)
-
-            # Recargar la tabla
-            self.refresh_table()
+            # La tabla se actualiza sola con el aviso del repositorio
+            measurement_repository().delete(record_id)
+            waveform = waveform_path(measurement_store().path, record_id)
+            if os.path.exists(waveform):
+                os.remove(waveform)
 
             # Mensaje de éxito
             success_msg = QMessageBox(self)
@@ -991,103 +1659,312 @@ class HistoryScreen(QWidget):
 
             error_msg.exec()
 
+    def _on_history_changed(self, event, row):
+        self.refresh_table()
+
     def refresh_table(self):
-        # Eliminar la tabla existente
+        # Con tabla y registros: mismo widget, se recarga el modelo y se conserva el scroll
+        if hasattr(self, 'table') and measurement_repository().count() > 0:
+            scroll = self.table.verticalScrollBar().value()
+            self.model.reload()
+            self._reapply_filters()
+            self.table.verticalScrollBar().setValue(scroll)
+            return
+
+        # Pasaje entre "sin registros" y tabla
         if hasattr(self, 'table'):
             self.table.setParent(None)
             self.table.deleteLater()
+            del self.table
+        if self.empty_label is not None:
+            self.empty_label.setParent(None)
+            self.empty_label.deleteLater()
+            self.empty_label = None
 
         # Recargar los datos
         self.load_data()
 
+    def _apply_filters(self):
+        # Búsqueda y rango de fechas combinados: el proxy recibe la intersección de filas
+        if self._date_range is not None and self._date_rows is None:
+            self._date_rows = measurement_repository().rows_between(*self._date_range)
+        self.proxy.set_rows(intersect_rows(self._search_rows, self._date_rows))
+
     def filter_table(self, text):
         if not hasattr(self, 'table'):
             return
 
-        text = text.lower()
-        for row in range(self.table.rowCount()):
-            should_show = False
-            if text == "":
-                should_show = True
+        repository = measurement_repository()
+        if not repository.indexes_ready:
+            repository.load_in_background()
+        if repository.loading:
+            # Copia e índices se arman en otro hilo (buscar fila por fila en paralelo le disputa
+            # el GIL y congela la GUI): se reintenta con el mismo temporizador hasta que estén
+            self.search_timer.start()
+            return
+        # Sin índice (falló la carga en segundo plano), el repositorio busca fila por fila
+        self._search_rows = repository.search(text)
+        self._apply_filters()
+
+    # Cada visita empieza sin búsqueda ni filtro de fechas, con los cambios de otras estaciones
+    def on_enter(self):
+        self.search_timer.stop()
+        self.search_input.blockSignals(True)
+        self.search_input.clear()
+        self.search_input.blockSignals(False)
+        self._search_rows = None
+        self._date_range = None
+        self._date_rows = None
+        measurement_repository().refresh_if_changed()
+        if hasattr(self, 'table'):
+            self._apply_filters()
+            self.table.scrollToTop()
+        self.reload_timer.start()
+
+    # Oculta: sin consultar la base; las altas y bajas propias siguen llegando por la suscripción
+    def on_leave(self):
+        self.reload_timer.stop()
+        for name in ("trend_dialog", "stats_dialog"):
+            dialog = getattr(self, name, None)
+            if dialog is not None:
+                dialog.close()
+                setattr(self, name, None)
+
+    def closeEvent(self, event):
+        self.reload_timer.stop()
+        measurement_repository().unsubscribe(self._on_history_changed)
+        super().closeEvent(event)
+
+    def _on_row_double_clicked(self, index):
+        if index.column() != HistoryTableModel.ACTIONS_COLUMN:
+            self.open_patient_trend(index.data(Qt.ItemDataRole.UserRole))
+
+    def open_selected_trend(self):
+        index = self.table.currentIndex() if hasattr(self, 'table') else None
+        if index is None or not index.isValid():
+            msg = QMessageBox(self)
+            msg.setIcon(QMessageBox.Icon.Information)
+            msg.setWindowTitle("Tendencia del Paciente")
+            msg.setText("Seleccione una medición del paciente en la tabla.")
+            msg.setStyleSheet("QMessageBox { background-color: white; } QLabel { color: black; }")
+            msg.exec()
+            return
+        self.open_patient_trend(index.data(Qt.ItemDataRole.UserRole))
+
+    def open_patient_trend(self, record_id):
+        record = self._record_by_id(record_id)
+        if record is None:
+            return
+        self.trend_dialog = PatientTrendDialog(record["dni"], self)
+        self.trend_dialog.show()
+
+    def open_statistics(self):
+        self.stats_dialog = StatisticsDialog(self)
+        self.stats_dialog.show()
+
+    def _record_by_id(self, record_id):
+        # Índice ID -> registro del historial compartido: O(1), con o sin filtros
+        return measurement_repository().get(record_id)
+
+    # Formatos de exportación: filtro del diálogo -> extensión
+    EXPORT_FORMATS = {
+        "CSV (*.csv)": ".csv",
+        "NumPy columnar (*.npz)": ".npz",
+        "Parquet (*.parquet)": ".parquet",
+        "Arrow (*.arrow)": ".arrow",
+    }
+
+    def export_history(self):
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Exportar historial",
+            "mediciones_pwv.csv",
+            ";;".join(self.EXPORT_FORMATS)
+        )
+        if not file_path:
+            return
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in self.EXPORT_FORMATS.values():
+            extension = self.EXPORT_FORMATS.get(selected_filter, ".csv")
+            file_path += extension
+
+        try:
+            store = measurement_store()
+            if extension == ".csv":
+                count = store.export_csv(file_path)
             else:
-                # Search in ID, Name columns
-                for col in range(self.table.columnCount()):
-                    item = self.table.item(row, col)
-                    if item and text in item.text().lower():
-                        should_show = True
-                        break
+                count = store.export_columnar(file_path)
+            QMessageBox.information(self, "Exportación completa",
+                                    f"Se exportaron {count} registros a:\n{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error al Exportar",
+                                 f"No se pudo exportar el historial:\n{e}")
+
+    def _report_item(self, record, status, histories=None):
+        # (registro, estado, historial del paciente, señal guardada) para Reportes.draw_report
+        dni = record["dni"]
+        if histories is not None and dni in histories:
+            history = histories[dni]
+        elif dni:
+            history = [(r["fecha"], r["edad"], r["pwv"]) for r in measurement_repository().patient_records(dni)]
+        else:
+            history = [(record["fecha"], record["edad"], record["pwv"])]
+        if histories is not None and dni:
+            histories[dni] = history
+        waveform = waveform_path(measurement_store().path, record["id"])
+        return (dict(record), status, history, waveform if os.path.exists(waveform) else None)
+
+    def _visible_items(self):
+        # Mediciones que muestra la tabla (búsqueda + fechas), con su estado ya calculado
+        repository = measurement_repository()
+        records = repository.records()
+        status = repository.columns()["status"]
+        rows = intersect_rows(self._search_rows, self._date_rows)
+        if rows is None:
+            rows = range(len(records))
+        histories = {}  # Un historial por paciente, compartido entre sus mediciones
+        return [self._report_item(records[row], int(status[row]), histories) for row in rows]
+
+    def export_selection_pdfs(self):
+        items = self._visible_items() if hasattr(self, 'table') else []
+        if not items:
+            QMessageBox.information(self, "Exportar PDFs", "No hay mediciones para exportar.")
+            return
 
-            self.table.setRowHidden(row, not should_show)
+        msg = QMessageBox(self)
+        msg.setIcon(QMessageBox.Icon.Question)
+        msg.setWindowTitle("Exportar PDFs")
+        msg.setText(f"Exportar {len(items)} reporte(s) de las mediciones filtradas:")
+        msg.setStyleSheet("QMessageBox { background-color: white; } QLabel { color: black; }")
+        folder_btn = msg.addButton("Un PDF por medición", QMessageBox.ButtonRole.AcceptRole)
+        merged_btn = msg.addButton("Un solo PDF", QMessageBox.ButtonRole.AcceptRole)
+        msg.addButton("Cancelar", QMessageBox.ButtonRole.RejectRole)
+        msg.exec()
 
-    def go_back(self):
-       
-        self.welcome = WelcomeScreen()
-        self.welcome.resize(self.size())
-        self.welcome.move(self.pos())
-        if self.isMaximized():
-            self.welcome.showMaximized()
+        if msg.clickedButton() == folder_btn:
+            merged = False
+            destination = QFileDialog.getExistingDirectory(self, "Carpeta para los reportes")
+        elif msg.clickedButton() == merged_btn:
+            merged = True
+            destination, _ = QFileDialog.getSaveFileName(self, "Guardar reportes como PDF", "reportes.pdf", "PDF (*.pdf)")
+            if destination and not destination.lower().endswith(".pdf"):
+                destination += ".pdf"
         else:
-            self.welcome.show()
-        QTimer.singleShot(50, self.close)
+            return
+        if not destination:
+            return
 
+        # Los PDFs se generan en otros procesos; la GUI solo consulta el avance
+        from Reportes import BatchReportExport
+        self.batch_export = BatchReportExport(items, destination, merged, resource_path("Logo.jpg"))
+        self.batch_destination = destination
+        self.batch_progress = QProgressDialog("Generando reportes...", "Cancelar", 0, len(items), self)
+        self.batch_progress.setWindowTitle("Exportar PDFs")
+        self.batch_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.batch_progress.setMinimumDuration(0)
+        self.batch_progress.canceled.connect(self.batch_export.cancel)
+        self.batch_timer = QTimer(self)
+        self.batch_timer.timeout.connect(self._poll_batch_export)
+        self.batch_timer.start(100)
+
+    def _poll_batch_export(self):
+        batch = self.batch_export
+        done = batch.poll()
+        if not batch.cancelled:
+            self.batch_progress.setValue(min(done, batch.total - 1))
+            self.batch_progress.setLabelText(f"Generando reportes... {done} de {batch.total}")
+        if not batch.finished():
+            return
 
-    def print_record(self, row):
-        # Extraer datos de las celdas según los nuevos índices de la tabla
-        fecha_hora = self.table.item(row, 0).text()
-        dni = self.table.item(row, 1).text()
-        nombre = self.table.item(row, 2).text()
-        apellido = self.table.item(row, 3).text()
-        edad = self.table.item(row, 4).text()
-        altura = self.table.item(row, 5).text()
-        sexo = self.table.item(row, 6).text()
-        hr = self.table.item(row, 7).text()
-        pwv = self.table.item(row, 8).text()
-
-        # Obtener observaciones (No visibles en tabla, se buscan en la lista original)
-        observaciones = ""
-        for r in self.all_data:
-            if r[1] == dni: # La columna 1 en el CSV es el DNI
-                observaciones = r[9] # La columna 9 son las observaciones
-                break
-
-        # Determinamos el estado para el reporte con criterio dinámico por edad
-        pwv_status = ""
+        self.batch_timer.stop()
+        self.batch_progress.canceled.disconnect()  # close() emite canceled
+        self.batch_progress.close()
         try:
-            pwv_val = float(pwv.split()[0]) # .split() por si tiene el " m/s"
-            edad_val = float(edad)
-            es_normal = self._is_crpwv_normal(edad_val, pwv_val)
-            pwv_status = " (Normal)" if es_normal else " (Anormal)"
-        except: pass
-
-        # Construir el texto del reporte
-        report_text = f"""
-
-Fecha y Hora: {fecha_hora}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-DATOS DEL PACIENTE:
-  • Nombre y Apellido: {nombre} {apellido}
-  • DNI: {dni}
-  • Edad: {edad}
-  • Altura: {altura}
-  • Sexo: {sexo}
-
-  
-RESULTADOS DE LA MEDICIÓN:
-  • HR: {hr} bpm
-  • crPWV: {pwv} m/s{pwv_status}
-
-"""
-        # Agregar observaciones solo si existen
-        if observaciones and observaciones.strip():
-            report_text += f"""
-OBSERVACIONES:
-  {observaciones}
-"""
-        
-        report_text += """
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-        """
+            written = batch.close()
+        except Exception as e:
+            QMessageBox.critical(self, "Error al Exportar",
+                                 f"No se pudieron generar los reportes:\n{e}")
+            return
+        finally:
+            self.batch_export = None
+
+        if batch.cancelled:
+            QMessageBox.information(self, "Exportación cancelada",
+                                    f"Se cancelaron los reportes ({written} ya escritos en {self.batch_destination}).")
+        else:
+            QMessageBox.information(self, "Exportación completa",
+                                    f"Se generaron {batch.total} reporte(s) en:\n{self.batch_destination}")
+
+    def merge_stations(self):
+        paths, _ = QFileDialog.getOpenFileNames(
+            self,
+            "Fusionar historiales de otras estaciones",
+            "",
+            "Historiales (*.csv *.npz *.parquet *.arrow *.db *.jsonl);;Todos los archivos (*)"
+        )
+        if not paths:
+            return
+
+        # La fusión corre en otro hilo con su propia conexión; la GUI solo consulta el avance
+        self.merge = BackgroundMerge(measurement_store().path, paths)
+        self.merge_progress = QProgressDialog("Leyendo el historial actual...", "Cancelar", 0, len(paths), self)
+        self.merge_progress.setWindowTitle("Fusionar Estaciones")
+        self.merge_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.merge_progress.setMinimumDuration(0)
+        self.merge_progress.canceled.connect(self.merge.cancel)
+        self.merge_timer = QTimer(self)
+        self.merge_timer.timeout.connect(self._poll_merge)
+        self.merge_timer.start(100)
+
+    def _poll_merge(self):
+        merge = self.merge
+        status = merge.poll()
+        if status is not None and not merge.cancelled:
+            index, path, read, added = status
+            self.merge_progress.setValue(index)
+            self.merge_progress.setLabelText(f"{os.path.basename(path)} ({index + 1} de {merge.total})\n"
+                                             f"{read} leídas, {added} nuevas")
+        if not merge.finished():
+            return
+
+        self.merge_timer.stop()
+        self.merge_progress.canceled.disconnect()  # close() emite canceled
+        self.merge_progress.close()
+        # Lo agregado antes de un error o de cancelar también queda guardado
+        measurement_repository().invalidate()
+        try:
+            result = merge.close()
+        except Exception as e:
+            QMessageBox.critical(self, "Error al Fusionar",
+                                 f"No se pudo fusionar el historial:\n{e}")
+            return
+        finally:
+            self.merge = None
+
+        title = "Fusión cancelada" if result["cancelled"] else "Fusión completa"
+        message = (f"Se agregaron {result['added']} mediciones nuevas de {merge.total} archivo(s).\n"
+                   f"Duplicadas omitidas: {result['duplicates']}")
+        if result["invalid"]:
+            message += f"\nFilas sin fecha omitidas: {result['invalid']}"
+        if result["skipped"]:
+            message += "\nSe omitió el archivo del propio historial."
+        if result["missing"]:
+            message += "\nNo se encontraron: " + ", ".join(os.path.basename(p) for p in result["missing"])
+        QMessageBox.information(self, title, message)
+
+    def go_back(self):
+        app_window().show_screen(WelcomeScreen)
+
+
+    def print_record(self, record_id):
+        record = self._record_by_id(record_id)
+        if record is None:
+            return
+
+        # Estado para el reporte con criterio dinámico por edad (clasificación ya calculada al cargar)
+        status = measurement_repository().crpwv_status_of(record_id)
+        from Reportes import report_text
+        report = report_text(record, status)
 
         msg = QMessageBox(self) 
         msg.setIcon(QMessageBox.Icon.Information)
@@ -1099,7 +1976,7 @@ OBSERVACIONES:
             QLabel { color: black; background-color: transparent; }
         """)
 
-        msg.setText(report_text)
+        msg.setText(report)
     
 
         font = QFont()
@@ -1141,7 +2018,7 @@ OBSERVACIONES:
         msg.exec()
 
         if msg.clickedButton() == print_btn:
-            self.save_pdf(report_text)
+            self.save_pdf(self._report_item(record, status))
 
 
 
@@ -1178,6 +2055,9 @@ OBSERVACIONES:
             QDialogButtonBox.StandardButton.Ok |
             QDialogButtonBox.StandardButton.Cancel
         )
+        clear_button = buttons.addButton("Quitar filtro", QDialogButtonBox.ButtonRole.ResetRole)
+        clear_button.setEnabled(self._date_range is not None)
+        clear_button.clicked.connect(lambda: self.clear_date_filter(dialog))
         layout.addWidget(buttons)
 
         buttons.accepted.connect(
@@ -1188,21 +2068,18 @@ OBSERVACIONES:
         dialog.exec()
 
     def apply_date_filter(self, from_date, to_date, dialog):
-        filtered_data = []
-
-        for row in self.all_data:
-            try:
-                # Columna 0 = "Fecha y Hora"
-                row_datetime = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-                row_date = QDate(row_datetime.year, row_datetime.month, row_datetime.day)
-
-                if from_date <= row_date <= to_date:
-                    filtered_data.append(row)
-
-            except Exception:
-                pass
+        if not hasattr(self, 'table'):
+            dialog.reject()
+            return
+        # Rango [desde 00:00, día siguiente a hasta 00:00) por búsqueda binaria sobre las fechas ya parseadas
+        to_next = to_date.addDays(1)
+        date_range = (
+            date_epoch(from_date.year(), from_date.month(), from_date.day()),
+            date_epoch(to_next.year(), to_next.month(), to_next.day()),
+        )
+        date_rows = measurement_repository().rows_between(*date_range)
 
-        if not filtered_data:
+        if len(date_rows) == 0:
             msg = QMessageBox(self)
             msg.setIcon(QMessageBox.Icon.Information)
             msg.setWindowTitle("Sin resultados")
@@ -1211,14 +2088,18 @@ OBSERVACIONES:
             msg.exec()
             return
 
-        # Eliminar tabla actual solo si hay resultados
-        if hasattr(self, 'table'):
-            self.table.setParent(None)
-            self.table.deleteLater()
+        # La tabla no se reconstruye: solo cambian las filas que deja pasar el proxy
+        self._date_range = date_range
+        self._date_rows = date_rows
+        self._apply_filters()
 
-        # Mostrar datos filtrados
-        self.show_table(filtered_data)
+        dialog.accept()
 
+    def clear_date_filter(self, dialog):
+        self._date_range = None
+        self._date_rows = None
+        if hasattr(self, 'table'):
+            self._apply_filters()
         dialog.accept()
 
 
@@ -1234,58 +2115,14 @@ OBSERVACIONES:
 class MainScreen(QMainWindow):
 
     # Layout --------------------------------------------------------------------------------------
-    def __init__(self, patient_data):
+    def __init__(self, patient_data=None):
         super().__init__() # Inicializar la ventana
-        
-        # Inicializar comunicación (verificar si el método existe)
-        try:
-            ComunicacionMax.start_connection()
-        except Exception:
-            pass
+        load_pyqtgraph()
 
         # Variables
-        self.patient_data = patient_data
-        self._show_calibrating_until_ready = False
-        self._curve_hold_seconds = 0.8
-        self._last_curve1_data_time = 0.0
-        self._last_curve2_data_time = 0.0
-        self._last_x_end = None
-        self._last_x_range = None
-        self._last_valid_hr = None
-        self._last_valid_pwv = None
-        self._last_allow_signal_plot = None
-        self._session_started_once = False
-        self._patient_data_sent = False
-        self._last_patient_data_send_attempt = 0.0
-        self._patient_data_retry_sec = 1.0
-        self._dist_alert_color = "#ff6fae"
-        self._plot_refresh_interval_sec = 1.0 / 24.0
-        self._last_plot_refresh_time = 0.0
-        self._default_y_ticks = [
-            (-100.0, "-100"),
-            (-50.0, "-50"),
-            (0.0, "0"),
-            (50.0, "50"),
-            (100.0, "100"),
-        ]
-        self._axis1_ticks_key = None
-        self._axis2_ticks_key = None
-        self.measuring = False  # Medición inicialmente desactivada
-
-        try:
-            self.patient_age = int(self.patient_data['edad'])
-        except (ValueError, KeyError, TypeError):
-            self.patient_age = None # Por si acaso
-
-        try:
-            altura_m = float(self.patient_data['altura']) / 100.0
-            # Verificar si el método existe antes de llamarlo
-            if hasattr(processor, 'set_height_from_frontend'):
-                processor.set_height_from_frontend(altura_m)
-            elif hasattr(processor, 'set_height'):
-                processor.set_height(altura_m)
-        except (ValueError, KeyError, AttributeError):
-            pass
+        self.patient_data = {}
+        self.patient_age = None
+        self._reset_state()
 
         self.setWindowTitle("Stiffio") # Título
         self.setGeometry(100, 100, 1400, 800) # Tamaño
@@ -1319,6 +2156,80 @@ class MainScreen(QMainWindow):
         self.setup_graphs() # Gráficos
         self.setup_metrics() # Métricas
 
+        # Timer de dibujo: uno solo por pantalla, se reinicia en cada medición
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.update_plot)
+
+        if patient_data is not None:
+            self.on_enter(patient_data)
+
+    # La pantalla se reutiliza: cada paciente nuevo entra por acá
+    def on_enter(self, patient_data):
+        # Inicializar comunicación (verificar si el método existe)
+        try:
+            ComunicacionMax.start_connection()
+        except Exception:
+            pass
+
+        self.stop_graph_update()
+        self.patient_data = patient_data
+        self._reset_state()
+
+        try:
+            self.patient_age = int(self.patient_data['edad'])
+        except (ValueError, KeyError, TypeError):
+            self.patient_age = None # Por si acaso
+
+        try:
+            altura_m = float(self.patient_data['altura']) / 100.0
+            # Verificar si el método existe antes de llamarlo
+            if hasattr(processor, 'set_height_from_frontend'):
+                processor.set_height_from_frontend(altura_m)
+            elif hasattr(processor, 'set_height'):
+                processor.set_height(altura_m)
+        except (ValueError, KeyError, AttributeError):
+            pass
+
+        self._show_patient_data()
+        self._show_start_button(False)
+        self._reset_plots()
+
+    def on_leave(self):
+        self.stop_graph_update()
+
+    def _reset_state(self):
+        self._show_calibrating_until_ready = False
+        self._curve_hold_seconds = 0.8
+        self._last_curve1_data_time = 0.0
+        self._last_curve2_data_time = 0.0
+        self._last_x_end = None
+        self._last_x_range = None
+        self._last_valid_hr = None
+        self._last_valid_pwv = None
+        self._last_allow_signal_plot = None
+        self._session_started_once = False
+        self._patient_data_sent = False
+        self._last_patient_data_send_attempt = 0.0
+        self._patient_data_retry_sec = 1.0
+        self._dist_alert_color = "#ff6fae"
+        self._plot_refresh_interval_sec = 1.0 / 24.0
+        self._last_plot_refresh_time = 0.0
+        self._render_interval_ms = 20  # ~50 Hz con la ventana visible
+        self._hidden_ingest_interval_ms = 250  # Solo ingesta mientras la ventana no se ve
+        self._render_suspended = False
+        self._alert_states = {}  # QLabel -> último estado visual aplicado
+        self._default_y_ticks = [
+            (-100.0, "-100"),
+            (-50.0, "-50"),
+            (0.0, "0"),
+            (50.0, "50"),
+            (100.0, "100"),
+        ]
+        self._axis1_ticks_key = None
+        self._axis2_ticks_key = None
+        self.measuring = False  # Medición inicialmente desactivada
+
 
 
     # Logo -----------------------------------------------------------
@@ -1417,32 +2328,23 @@ class MainScreen(QMainWindow):
         self.patient_data_layout.addSpacing(5)
 
 
-        # Nombre y Apellido
-        full_name = f"{self.patient_data.get('nombre', '')} {self.patient_data.get('apellido', '')}"
-        self.name_label = QLabel(f"<b>Nombre y Apellido:</b> {full_name}")
-        self.name_label.setStyleSheet("color: white; font-size: 14pt;")
-        self.patient_data_layout.addWidget(self.name_label)
-
-        # DNI
-        dni_val = self.patient_data.get('dni', 'N/A')
-        self.dni_label = QLabel(f"<b>DNI:</b> {dni_val}")
-        self.dni_label.setStyleSheet("color: white; font-size: 14pt;")
-        self.patient_data_layout.addWidget(self.dni_label)
-
-        # Edad
-        self.age_label = QLabel(f"<b>Edad:</b> {self.patient_data['edad']}")
-        self.age_label.setStyleSheet("color: white; font-size: 14pt;")
-        self.patient_data_layout.addWidget(self.age_label)
-
-        # Altura
-        self.height_label = QLabel(f"<b>Altura:</b> {self.patient_data['altura']} cm")
-        self.height_label.setStyleSheet("color: white; font-size: 14pt;")
-        self.patient_data_layout.addWidget(self.height_label)
+        # Nombre y Apellido, DNI, Edad, Altura, Sexo (los textos se completan en _show_patient_data)
+        self.name_label = QLabel()
+        self.dni_label = QLabel()
+        self.age_label = QLabel()
+        self.height_label = QLabel()
+        self.sex_label = QLabel()
+        for label in (self.name_label, self.dni_label, self.age_label, self.height_label, self.sex_label):
+            label.setStyleSheet("color: white; font-size: 14pt;")
+            self.patient_data_layout.addWidget(label)
 
-        # Sexo
-        self.sex_label = QLabel(f"<b>Sexo:</b> {self.patient_data['sexo']}")
-        self.sex_label.setStyleSheet("color: white; font-size: 14pt;")
-        self.patient_data_layout.addWidget(self.sex_label)
+    def _show_patient_data(self):
+        full_name = f"{self.patient_data.get('nombre', '')} {self.patient_data.get('apellido', '')}"
+        self.name_label.setText(f"<b>Nombre y Apellido:</b> {full_name}")
+        self.dni_label.setText(f"<b>DNI:</b> {self.patient_data.get('dni', 'N/A')}")
+        self.age_label.setText(f"<b>Edad:</b> {self.patient_data.get('edad', '')}")
+        self.height_label.setText(f"<b>Altura:</b> {self.patient_data.get('altura', '')} cm")
+        self.sex_label.setText(f"<b>Sexo:</b> {self.patient_data.get('sexo', '')}")
 
 
         # Gráfico de Resultados ------------------------------------------
@@ -1642,13 +2544,7 @@ class MainScreen(QMainWindow):
         # Alerta para sensor 1 (proximal)
         self.prox_alert_label = QLabel("REVISAR SENSOR")
         self.prox_alert_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.prox_alert_label.setStyleSheet("""
-            background-color: red;
-            color: white;
-            font-size: 22pt;
-            font-weight: bold;
-            border-radius: 10px;
-        """)
+        self.prox_alert_label.setStyleSheet(self._alert_style(22, "red"))
         self.prox_alert_label.setVisible(False)  # No mostrar al principio
         # Hacer que ocupe todo el PlotWidget
         self.prox_alert_label.setParent(self.graph1)
@@ -1657,13 +2553,7 @@ class MainScreen(QMainWindow):
         # Alerta para sensor 2 (distal)
         self.dist_alert_label = QLabel("REVISAR SENSOR")
         self.dist_alert_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.dist_alert_label.setStyleSheet("""
-            background-color: #ff6fae;
-            color: white;
-            font-size: 22pt;
-            font-weight: bold;
-            border-radius: 10px;
-        """)
+        self.dist_alert_label.setStyleSheet(self._alert_style(22, self._dist_alert_color))
         self.dist_alert_label.setVisible(False) # No mostrar al principio
         self.dist_alert_label.setParent(self.graph2)
         self.dist_alert_label.setGeometry(270, 110, 500, 100) # Posición y tamaño del cartel
@@ -1766,15 +2656,7 @@ class MainScreen(QMainWindow):
         if msg.clickedButton() == si_button:
             self._enviar_reset_estudio_remoto()
             self._limpiar_sesion_local()
-
-            self.welcome_screen = WelcomeScreen()
-            self.welcome_screen.resize(self.size())
-            self.welcome_screen.move(self.pos())
-            if self.isMaximized():
-                self.welcome_screen.showMaximized()
-            else:
-                self.welcome_screen.show()
-            QTimer.singleShot(50, self.close)
+            app_window().show_screen(WelcomeScreen)
 
     '''
     Esta funcion no tiene el popup
@@ -1834,16 +2716,7 @@ class MainScreen(QMainWindow):
         if msg.clickedButton() == si_button:
             self._enviar_reset_estudio_remoto()
             self._limpiar_sesion_local()
-
-           
-            self.patient_data_window = PatientDataScreen()
-            self.patient_data_window.resize(self.size())
-            self.patient_data_window.move(self.pos())
-            if self.isMaximized():
-                self.patient_data_window.showMaximized()
-            else:
-                self.patient_data_window.show()
-            QTimer.singleShot(50, self.close)
+            app_window().show_screen(PatientDataScreen)
 
 
     '''
@@ -1900,24 +2773,7 @@ class MainScreen(QMainWindow):
                 self._last_valid_pwv = None
                 self._last_allow_signal_plot = None
                 self._last_plot_refresh_time = 0.0
-
-                self.graph1.setYRange(-100.0, 100.0, padding=0)
-                self.graph2.setYRange(-100.0, 100.0, padding=0)
-                self.graph1.getAxis('left').setTextPen(pg.mkPen('#d0d0d0'))
-                self.graph1.getAxis('left').setPen(pg.mkPen('#6f6f6f'))
-                self.graph2.getAxis('left').setTextPen(pg.mkPen('#d0d0d0'))
-                self.graph2.getAxis('left').setPen(pg.mkPen('#6f6f6f'))
-                self._axis1_ticks_key = None
-                self._axis2_ticks_key = None
-                self._set_default_y_ticks(self.graph1, 1)
-                self._set_default_y_ticks(self.graph2, 2)
-                self.curve1.setData([], [])
-                self.curve2.setData([], [])
-                self.prox_alert_label.setVisible(False)
-                self.dist_alert_label.setVisible(False)
-                self.hr_esp_label.setText("HR: -- bpm")
-                self.pwv_label.setText("crPWV: -- m/s")
-                self.patient_point_item.setData([], [])
+                self._reset_plots()
             else:
                 self._last_curve1_data_time = now
                 self._last_curve2_data_time = now
@@ -1926,6 +2782,15 @@ class MainScreen(QMainWindow):
                 metrics = processor.get_metrics()
                 self._show_calibrating_until_ready = bool(metrics.get("calibrating", False))
 
+            self._show_start_button(True)
+            self.start_graph_update() # <--- Esto inicia el Timer
+        else:
+            self.measuring = False
+            self._show_start_button(False)
+            self.stop_graph_update()
+
+    def _show_start_button(self, measuring):
+        if measuring:
             self.start_graph_button.setText("Detener Medición")
             self.start_graph_button.setStyleSheet("""
                 QPushButton {
@@ -1940,9 +2805,7 @@ class MainScreen(QMainWindow):
                     background-color: #D32F2F;
                 }
             """)
-            self.start_graph_update() # <--- Esto inicia el Timer
         else:
-            self.measuring = False
             self.start_graph_button.setText("Iniciar Medición")
             self.start_graph_button.setStyleSheet("""
                 QPushButton {
@@ -1957,65 +2820,135 @@ class MainScreen(QMainWindow):
                     background-color: #45a049;
                 }
             """)
-            self.stop_graph_update()
+
+    # Gráficos, métricas y alertas como al abrir la pantalla
+    def _reset_plots(self):
+        self.graph1.setYRange(-100.0, 100.0, padding=0)
+        self.graph2.setYRange(-100.0, 100.0, padding=0)
+        self.graph1.getAxis('left').setTextPen(pg.mkPen('#d0d0d0'))
+        self.graph1.getAxis('left').setPen(pg.mkPen('#6f6f6f'))
+        self.graph2.getAxis('left').setTextPen(pg.mkPen('#d0d0d0'))
+        self.graph2.getAxis('left').setPen(pg.mkPen('#6f6f6f'))
+        self._axis1_ticks_key = None
+        self._axis2_ticks_key = None
+        self._set_default_y_ticks(self.graph1, 1)
+        self._set_default_y_ticks(self.graph2, 2)
+        self.curve1.setData([], [])
+        self.curve2.setData([], [])
+        self._set_alert_state(self.prox_alert_label, None)
+        self._set_alert_state(self.dist_alert_label, None)
+        self.hr_esp_label.setText("HR: -- bpm")
+        self.pwv_label.setText("crPWV: -- m/s")
+        self.patient_point_item.setData([], [])
 
     # Arranca el grafico
     def start_graph_update(self):
-        self.timer = QTimer()
-        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start(20)  # ~50 Hz para visualizacion mas fluida
+        self._render_suspended = False
+        self.timer.start(self._render_interval_ms)  # ~50 Hz para visualizacion mas fluida
 
     # Detiene el gráfico
     def stop_graph_update(self):
-        if hasattr(self, 'timer'):
-            self.timer.stop()
+        self.timer.stop()
 
-    def _show_calibrating_alert(self, label, bg_color):
-        label.setText("CALIBRANDO")
-        label.setStyleSheet(f"""
+    def _set_timer_interval(self, interval_ms):
+        if self.timer.interval() != interval_ms:
+            self.timer.setInterval(interval_ms)
+
+    # La ventana está minimizada, oculta o tapada por completo
+    def _is_render_exposed(self):
+        # Dentro de AppWindow la pantalla es un widget hijo: se mira la ventana que la contiene
+        window = self.window()
+        if (not self.isVisible()) or window.isMinimized():
+            return False
+        handle = window.windowHandle()
+        return handle is None or handle.isExposed()
+
+    def _ingest_while_hidden(self):
+        # Sin redibujar: solo drenamos la cola para que no desborde mientras no se ve la ventana
+        self._render_suspended = True
+        self._set_timer_interval(self._hidden_ingest_interval_ms)
+        processor.process_all()
+        self._retry_send_patient_data(time.monotonic())
+
+    def _resume_rendering(self):
+        # Al volver a mostrarse, el próximo tick redibuja todo de una sola vez
+        now = time.monotonic()
+        self._render_suspended = False
+        self._set_timer_interval(self._render_interval_ms)
+        self._last_allow_signal_plot = None
+        self._last_x_range = None
+        self._last_plot_refresh_time = 0.0
+        self._last_curve1_data_time = now
+        self._last_curve2_data_time = now
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange:
+            self.window_state_changed()
+
+    def window_state_changed(self):
+        if self.measuring and self._render_suspended and not self.window().isMinimized():
+            # Restaurada: volver al ritmo normal sin esperar al tick lento
+            self._set_timer_interval(self._render_interval_ms)
+
+    def _retry_send_patient_data(self, now):
+        if (not self._patient_data_sent) and (now - self._last_patient_data_send_attempt >= self._patient_data_retry_sec):
+            self._last_patient_data_send_attempt = now
+            self._try_send_patient_data()
+
+    # Alertas sobre los gráficos ------------------------------------
+    # Cada estado visual es (texto, tamaño de fuente, color de fondo) o None si la alerta está oculta.
+    # Las hojas de estilo se arman una sola vez por (tamaño, color) y los widgets solo se tocan
+    # cuando el estado cambia, no en cada tick de 20 ms.
+    _ALERT_STYLE_TEMPLATE = """
             background-color: {bg_color};
             color: white;
-            font-size: 22pt;
+            font-size: {font_pt}pt;
             font-weight: bold;
             border-radius: 10px;
-        """)
-        label.setVisible(True)
+        """
+    _alert_style_cache = {}
+
+    @classmethod
+    def _alert_style(cls, font_pt, bg_color):
+        key = (font_pt, bg_color)
+        style = cls._alert_style_cache.get(key)
+        if style is None:
+            style = cls._ALERT_STYLE_TEMPLATE.format(font_pt=font_pt, bg_color=bg_color)
+            cls._alert_style_cache[key] = style
+        return style
+
+    def _set_alert_state(self, label, state):
+        prev = self._alert_states.get(label, ())
+        if prev == state:
+            return
+        self._alert_states[label] = state
+
+        if state is None:
+            label.setVisible(False)
+            return
+
+        text, font_pt, bg_color = state
+        if (not prev) or prev[0] != text:
+            label.setText(text)
+        if (not prev) or prev[1:] != state[1:]:
+            label.setStyleSheet(self._alert_style(font_pt, bg_color))
+        if not prev:
+            label.setVisible(True)
+
+    def _show_calibrating_alert(self, label, bg_color):
+        self._set_alert_state(label, ("CALIBRANDO", 22, bg_color))
 
     def _show_connection_alert(self, label, bg_color):
-        label.setText("SIN CONEXION ESP32")
-        label.setStyleSheet(f"""
-            background-color: {bg_color};
-            color: white;
-            font-size: 20pt;
-            font-weight: bold;
-            border-radius: 10px;
-        """)
-        label.setVisible(True)
+        self._set_alert_state(label, ("SIN CONEXION ESP32", 20, bg_color))
 
     def _show_sensor_alert(self, label, sensor_name, connected_ok, skin_ok, bg_color):
         if not connected_ok:
-            label.setText(f"{sensor_name} DESCONECTADO")
-            label.setStyleSheet(f"""
-                background-color: {bg_color};
-                color: white;
-                font-size: 18pt;
-                font-weight: bold;
-                border-radius: 10px;
-            """)
-            label.setVisible(True)
+            self._set_alert_state(label, (f"{sensor_name} DESCONECTADO", 18, bg_color))
         elif not skin_ok:
-            label.setText("REVISAR SENSOR")
-            label.setStyleSheet(f"""
-                background-color: {bg_color};
-                color: white;
-                font-size: 22pt;
-                font-weight: bold;
-                border-radius: 10px;
-            """)
-            label.setVisible(True)
+            self._set_alert_state(label, ("REVISAR SENSOR", 22, bg_color))
         else:
-            label.setVisible(False)
+            self._set_alert_state(label, None)
 
     def _to_float_or_none(self, value):
         if value is None:
@@ -2107,6 +3040,12 @@ class MainScreen(QMainWindow):
         if not self.measuring:
             return
 
+        if not self._is_render_exposed():
+            self._ingest_while_hidden()
+            return
+        if self._render_suspended:
+            self._resume_rendering()
+
         processor.process_all()
         t, y1, y2 = processor.get_signals()
         status = processor.get_sensor_status()
@@ -2119,9 +3058,7 @@ class MainScreen(QMainWindow):
         ws_connected = bool(status.get("connected", False))
         now = time.monotonic()
         prev_x_end = self._last_x_end
-        if (not self._patient_data_sent) and (now - self._last_patient_data_send_attempt >= self._patient_data_retry_sec):
-            self._last_patient_data_send_attempt = now
-            self._try_send_patient_data()
+        self._retry_send_patient_data(now)
 
         calibrating = bool(metrics.get("calibrating", False))
         buffer_ready = bool(metrics.get("buffer_ready", not calibrating))
@@ -2237,8 +3174,6 @@ class MainScreen(QMainWindow):
 
     # Guardar medicion
     def save_measurement(self):
-        filename = resource_path("mediciones_pwv.csv")
-
         # Datos del paciente
         # (Usamos .get() para evitar errores si una clave no existe)
         nombre = self.patient_data.get('nombre', 'N/A')
@@ -2265,47 +3200,39 @@ class MainScreen(QMainWindow):
                                 "Asegúrese de que la crPWV y la HR se estén midiendo.")
             return
 
-        # Formatear los datos
-        pwv_str = f"{pwv_val:.1f}"
-        hr_str = f"{hr_val:.0f}"
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        record = make_record(timestamp, dni, nombre, apellido, edad, altura, sexo,
+                             hr_val, round(pwv_val, 1), observaciones)
 
-        # Encabezado
-        header = ["Fecha y Hora", "DNI", "Nombre", "Apellido", "Edad", "Altura (cm)", "Sexo", "HR (bpm)", "crPWV (m/s)", "Observaciones"]
-        data_row = [timestamp, dni,  nombre, apellido, edad, altura, sexo, hr_str, pwv_str, observaciones]
-
-        # Escribir en el archivo CSV
+        # Guardar en la base de mediciones
         try:
-            # Revisar si el archivo ya existe para no escribir el encabezado cada vez
-            file_exists = os.path.isfile(filename)
-
-            # Usamos 'a' (append) para añadir al final sin borrar lo anterior
-            with open(filename, mode='a', newline='', encoding='utf-8-sig') as file:
-                writer = csv.writer(file, delimiter=';')
+            # El repositorio guarda en la base y actualiza el historial en memoria
+            measurement_repository().add(record)
 
-                if not file_exists:
-                    writer.writerow(header)  # Escribir encabezado si el archivo es nuevo
-
-                writer.writerow(data_row) # Escribir la fila de datos
+            # Señal de la sesión para los gráficos del reporte
+            proximal, distal = processor.get_recording()
+            if proximal:
+                save_waveform(waveform_path(measurement_store().path, record["id"]),
+                              proximal, distal, processor.fs)
 
             # 6. Mostrar mensaje de éxito
             QMessageBox.information(self, "Guardado Exitoso",
-                                    f"Medición guardada en:\n{filename}")
+                                    f"Medición guardada en:\n{measurement_store().path}")
 
         except Exception as e:
             # 7. Mostrar mensaje de error
             QMessageBox.critical(self, "Error al Guardar",
-                                 f"No se pudo guardar el archivo:\n{e}")
+                                 f"No se pudo guardar la medición:\n{e}")
 
 
 # =================================================================================================
 # Loop Principal
 # =================================================================================================
-import sys
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Procesos de la exportación de PDFs en el ejecutable
+    configure_render_backend()
     app = QApplication(sys.argv)
-    window = WelcomeScreen()
+    window = app_window()
+    window.show_screen(WelcomeScreen)
     window.showMaximized()  # Esto hace que abra maximizada
     sys.exit(app.exec())
-exit(app.exec())
-
@@ -0,0 +1,232 @@
+"""
+FUSIONARMEDICIONES.PY
+Merge the measurement histories of several stations into one store.
+
+Sources can be:
+- A station's mediciones_pwv.csv: old 9-column rows (no "Observaciones")
+  and new 10-column rows, UTF-8 (with or without BOM) or Windows-1252,
+  ';' or ',' as delimiter.
+- Columnar exports (.npz / .parquet / .arrow, see Mediciones.write_columnar).
+- Another store (.db SQLite or journal file), opened read-only: it is never
+  created, migrated or locked.
+
+Records are streamed in batches and deduplicated against the destination
+and against each other by (timestamp, DNI, measured values) with a set of
+hashes: memory grows with the number of distinct measurements (one hash
+each), never with the size of the files.
+
+Uso:
+    python FusionarMediciones.py DESTINO ORIGEN [ORIGEN ...]
+"""
+
+import argparse
+import codecs
+import os
+import sys
+import threading
+
+from Mediciones import (
+    COLUMNAR_BATCH, COLUMNAR_EXTENSIONS, CSV_DELIMITER, CSV_ENCODING,
+    batched, open_store, read_columnar, read_csv,
+)
+
+
+# Extensiones que se leen como CSV de una estación
+CSV_EXTENSIONS = (".csv", ".txt")
+# Si el CSV no es UTF-8 válido se lee con la codificación de Excel en Windows
+CSV_FALLBACK_ENCODING = "cp1252"
+
+
+def record_key(record):
+    """Identidad de una medición: fecha, DNI y valores medidos (crPWV con la precisión del CSV)."""
+    pwv = record.get("pwv")
+    return (
+        record.get("fecha"), record.get("dni"), record.get("edad"), record.get("altura"),
+        (record.get("sexo") or "").casefold(), record.get("hr"),
+        None if pwv is None else round(pwv, 1),
+    )
+
+
+def record_hash(record):
+    # hash() de 64 bits: con millones de registros la chance de una colisión es ~1e-7
+    return hash(record_key(record))
+
+
+# ==============================================================================
+# ORÍGENES
+# ==============================================================================
+def _csv_encoding(path):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as file:
+        try:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return CSV_FALLBACK_ENCODING
+    return CSV_ENCODING
+
+
+def _csv_delimiter(path, encoding):
+    with open(path, newline="", encoding=encoding) as file:
+        for line in file:
+            if line.strip():
+                return "," if CSV_DELIMITER not in line and "," in line else CSV_DELIMITER
+    return CSV_DELIMITER
+
+
+def iter_source_batches(path, batch_size=COLUMNAR_BATCH):
+    """Lotes de registros (sin ID) de un archivo de otra estación."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in CSV_EXTENSIONS:
+        encoding = _csv_encoding(path)
+        yield from batched(read_csv(path, encoding, _csv_delimiter(path, encoding)), batch_size)
+    elif ext in COLUMNAR_EXTENSIONS:
+        yield from read_columnar(path, batch_size)
+    else:
+        source = open_store(path, readonly=True)
+        try:
+            for batch in batched(source.iter_records(), batch_size):
+                # Los IDs son de la otra base: el destino asigna los suyos
+                for record in batch:
+                    record["id"] = None
+                yield batch
+        finally:
+            source.close()
+
+
+# ==============================================================================
+# FUSIÓN
+# ==============================================================================
+def merge_sources(store, paths, batch_size=COLUMNAR_BATCH, progress=None, cancelled=None):
+    """
+    Agrega a store las mediciones de paths que no estén ya (ni en store ni en
+    un origen anterior). progress(index, path, read, added) se llama por lote;
+    si cancelled() devuelve True se detiene al terminar el lote en curso (lo
+    ya agregado queda guardado); también se consulta mientras se leen las
+    mediciones del destino.
+    Devuelve dict con read, added, duplicates, invalid, skipped (el propio
+    destino), missing (orígenes que no existen) y cancelled.
+    """
+    result = {"read": 0, "added": 0, "duplicates": 0, "invalid": 0, "skipped": [], "missing": [],
+              "cancelled": False}
+
+    seen = set()
+    for batch in batched(store.iter_records(), batch_size):
+        seen.update(map(record_hash, batch))
+        if cancelled is not None and cancelled():
+            result["cancelled"] = True
+            return result
+
+    store_path = os.path.abspath(store.path)
+    for index, path in enumerate(paths):
+        if os.path.abspath(path) == store_path:
+            result["skipped"].append(path)
+            continue
+        if not os.path.isfile(path):
+            result["missing"].append(path)
+            continue
+        read = added = 0
+        for batch in iter_source_batches(path, batch_size):
+            new = []
+            for record in batch:
+                if not record["fecha"]:
+                    result["invalid"] += 1
+                    continue
+                key = record_hash(record)
+                if key in seen:
+                    result["duplicates"] += 1
+                    continue
+                seen.add(key)
+                new.append(record)
+            if new:
+                store.add_many(new)
+            read += len(batch)
+            added += len(new)
+            result["read"] += len(batch)
+            result["added"] += len(new)
+            if progress is not None:
+                progress(index, path, read, added)
+            if cancelled is not None and cancelled():
+                result["cancelled"] = True
+                return result
+    return result
+
+
+class BackgroundMerge:
+    """
+    merge_sources en un hilo, con su propia conexión al destino (no comparte la
+    de la GUI). Uso desde la GUI: poll() en un QTimer hasta finished(), luego
+    close(), que devuelve el resultado o relanza el error del hilo.
+    """
+
+    def __init__(self, store_path, paths, batch_size=COLUMNAR_BATCH):
+        self.total = len(paths)
+        self.cancelled = False
+        self._status = None  # Último (index, path, read, added) informado por merge_sources
+        self._cancel = threading.Event()
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(store_path, paths, batch_size),
+                                        name="fusionar-mediciones", daemon=True)
+        self._thread.start()
+
+    def _run(self, store_path, paths, batch_size):
+        try:
+            store = open_store(store_path)
+            try:
+                self._result = merge_sources(store, paths, batch_size, progress=self._progress,
+                                             cancelled=self._cancel.is_set)
+            finally:
+                store.close()
+        except Exception as e:
+            self._error = e
+
+    def _progress(self, index, path, read, added):
+        self._status = (index, path, read, added)
+
+    def poll(self):
+        """Último avance (index, path, read, added), o None mientras se lee el destino (no bloquea)."""
+        return self._status
+
+    def finished(self):
+        return not self._thread.is_alive()
+
+    def cancel(self):
+        self.cancelled = True
+        self._cancel.set()
+
+    def close(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("destino", help="base consolidada (.db) o diario; se crea si no existe")
+    parser.add_argument("origenes", nargs="+", help="CSV, .npz / .parquet / .arrow, .db o diarios de otras estaciones")
+    args = parser.parse_args()
+
+    store = open_store(args.destino)
+    try:
+        def report(index, path, read, added):
+            print(f"\r{os.path.basename(path)}: {read} leídos, {added} nuevos", end="", file=sys.stderr)
+
+        result = merge_sources(store, args.origenes, progress=report)
+    finally:
+        store.close()
+    print(file=sys.stderr)
+    print(f"Leídos: {result['read']}  Agregados: {result['added']}  "
+          f"Duplicados: {result['duplicates']}  Sin fecha: {result['invalid']}")
+    for path in result["skipped"]:
+        print(f"Omitido (es el destino): {path}")
+    for path in result["missing"]:
+        print(f"No existe: {path}", file=sys.stderr)
+    if result["missing"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
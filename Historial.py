@@ -0,0 +1,869 @@
+"""
+HISTORIAL.PY
+In-memory indexes over the measurement history (no Qt).
+
+- SearchIndex: accent-folded search by DNI / name / surname. Built once when
+  the history is loaded; a query (a name, a surname, a few DNI digits)
+  returns the matching row positions in under a millisecond on 100k
+  records (benchmarks/bench_suite.py --only history checks it).
+- DateIndex: timestamps parsed once (vectorized) into a sorted epoch array;
+  a date range resolves to row positions with two binary searches.
+- HistoryColumns: columnar (NumPy) copy of the numeric fields with the
+  age-normal crPWV classification of every row, computed in one vectorized
+  pass and shared by table colouring, reports and statistics.
+- MeasurementRepository: process-wide in-memory copy of the store shared by
+  every screen, with the indexes above (plus ID -> record and DNI ->
+  measurements) kept up to date on its own writes.
+
+Row positions are the chronological order of the store (fecha, id), i.e.
+the rows of HistoryTableModel.
+"""
+
+from bisect import bisect_left, bisect_right
+import math
+import threading
+import unicodedata
+import weakref
+
+import numpy as np
+
+
+def fold_text(text):
+    """Minúsculas y sin tildes: "Núñez" -> "nunez"."""
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """
+    Two-level index: row position <- unique word <- trigram.
+
+    DNIs, names and surnames repeat a lot across measurements, so trigrams
+    are built per unique word, not per row:
+    - query words of 3+ characters: the words of the rarest trigram of the
+      query are the only candidates; keep those that really contain it;
+    - 1-2 characters: prefix range over the sorted word array (bisect).
+    Every query word must match (AND); each one can match any field. Row
+    postings are kept as sorted NumPy arrays, so the union over the matching
+    words and the AND between query words run in C; a query word much less
+    selective than the rows left is checked against the words of each row
+    instead of expanding its postings.
+    """
+
+    # Con más filas candidatas que postings / ROW_CHECK_RATIO conviene intersecar arreglos
+    ROW_CHECK_RATIO = 8
+
+    def __init__(self):
+        self._ids = []
+        self._row_words = []  # fila -> ids de palabra de esa fila
+        self._fold_cache = {}
+        self._word_ids = {}  # palabra -> id de palabra
+        self._words = []  # id de palabra -> palabra
+        self._postings = []  # id de palabra -> filas que la contienen
+        # Copia CSR de los postings (filas de todas las palabras en un solo arreglo) para unir
+        # postings en C; las palabras que cambiaron después de armarla se leen de las listas
+        self._flat_rows = None
+        self._offsets = None
+        self._stale = None  # id de palabra (< palabras en la copia) -> cambió desde que se armó
+        self._trigram_words = {}  # trigrama -> set de ids de palabra
+        self._sorted_words = None  # caché para búsquedas por prefijo
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: iterable de (record_id, dni, nombre, apellido) en orden de filas."""
+        index = cls()
+        for record_id, dni, nombre, apellido in rows:
+            index.add(record_id, dni, nombre, apellido)
+        index._sort_words()
+        index._freeze()
+        return index
+
+    def __len__(self):
+        return len(self._ids)
+
+    def record_id(self, position):
+        return self._ids[position]
+
+    def add(self, record_id, dni, nombre, apellido):
+        position = len(self._ids)
+        self._ids.append(record_id)
+        words = set()
+        for field in (dni, nombre, apellido):
+            folded = self._fold_cache.get(field)
+            if folded is None:
+                folded = fold_text(field).split()
+                self._fold_cache[field] = folded
+            words.update(folded)
+        row_words = []
+        for word in words:
+            word_id = self._word_ids.get(word)
+            if word_id is None:
+                word_id = len(self._words)
+                self._word_ids[word] = word_id
+                self._words.append(word)
+                self._postings.append([])
+                for tri in _trigrams(word):
+                    self._trigram_words.setdefault(tri, set()).add(word_id)
+                self._sorted_words = None
+            self._postings[word_id].append(position)
+            if self._stale is not None and word_id < len(self._stale):
+                self._stale[word_id] = True
+            row_words.append(word_id)
+        self._row_words.append(tuple(row_words))
+        return position
+
+    def remove(self, position):
+        """Quita una fila; las posiciones siguientes bajan en uno."""
+        del self._ids[position]
+        for word_id in self._row_words.pop(position):
+            self._postings[word_id].remove(position)
+        # Las posiciones de cada posting están ordenadas: solo se corre la cola
+        for postings in self._postings:
+            i = bisect_left(postings, position)
+            if i < len(postings):
+                postings[i:] = [p - 1 for p in postings[i:]]
+        # Corrió todas las posiciones: la copia CSR se rearma en la próxima búsqueda
+        self._flat_rows = None
+
+    def _freeze(self):
+        lengths = np.fromiter(map(len, self._postings), dtype=np.int64, count=len(self._postings))
+        self._offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self._offsets[1:])
+        self._flat_rows = np.fromiter((p for postings in self._postings for p in postings),
+                                      dtype=np.int64, count=int(self._offsets[-1]))
+        self._stale = np.zeros(len(lengths), dtype=bool)
+
+    def _sort_words(self):
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._word_ids.items())
+
+    def _words_by_prefix(self, prefix):
+        self._sort_words()
+        start = bisect_left(self._sorted_words, (prefix,))
+        out = []
+        for word, word_id in self._sorted_words[start:]:
+            if not word.startswith(prefix):
+                break
+            out.append(word_id)
+        return out
+
+    def _words_containing(self, token):
+        # Toda palabra que contiene el token contiene su trigrama menos frecuente: esas son las
+        # únicas candidatas, sin copiar ni intersecar los sets de los demás trigramas
+        rarest = None
+        for tri in _trigrams(token):
+            candidates = self._trigram_words.get(tri)
+            if not candidates:
+                return []
+            if rarest is None or len(candidates) < len(rarest):
+                rarest = candidates
+        words = self._words
+        return [w for w in rarest if token in words[w]]
+
+    def _match_words(self, token):
+        if len(token) < 3:
+            return self._words_by_prefix(token)
+        return self._words_containing(token)
+
+    def _rows_of(self, word_ids):
+        """Filas (arreglo ordenado, sin repetir) que tienen alguna de las palabras."""
+        if self._flat_rows is None:
+            self._freeze()
+        ids = np.fromiter(word_ids, dtype=np.int64, count=len(word_ids))
+        known = ids < len(self._stale)
+        changed = ~known
+        changed[known] = self._stale[ids[known]]
+        fresh = ids[~changed]
+        if len(fresh) == 1 and len(ids) == 1:
+            start, end = self._offsets[fresh[0]], self._offsets[fresh[0] + 1]
+            return self._flat_rows[start:end].copy()
+
+        # Tramos [offset, offset + largo) de cada palabra del arreglo CSR, juntados sin bucle
+        starts = self._offsets[fresh]
+        lengths = self._offsets[fresh + 1] - starts
+        ends = np.cumsum(lengths)
+        take = np.arange(int(ends[-1]) if len(ends) else 0, dtype=np.int64)
+        take += np.repeat(starts - (ends - lengths), lengths)
+        rows = self._flat_rows[take]
+        if changed.any():
+            postings = self._postings
+            extra = [p for w in ids[changed].tolist() for p in postings[w]]
+            rows = np.concatenate([rows, np.array(extra, dtype=np.int64)])
+        if len(ids) == 1:
+            return rows
+        # Una fila puede tener dos palabras que coinciden (p. ej. nombre y apellido)
+        rows.sort()
+        if len(rows) > 1:
+            rows = rows[np.concatenate(([True], rows[1:] != rows[:-1]))]
+        return rows
+
+    def search(self, query):
+        """Posiciones (arreglo ordenado) que cumplen la búsqueda, o None si la búsqueda está vacía."""
+        tokens = fold_text(query).split()
+        if not tokens:
+            return None
+
+        matches = []
+        postings = self._postings
+        for token in set(tokens):
+            word_ids = self._match_words(token)
+            if not word_ids:
+                return np.empty(0, dtype=np.int64)
+            matches.append((sum(len(postings[w]) for w in word_ids), word_ids))
+        matches.sort(key=lambda m: m[0])
+
+        positions = self._rows_of(matches[0][1])
+        for size, word_ids in matches[1:]:
+            if len(positions) * self.ROW_CHECK_RATIO < size:
+                # Pocas filas contra una palabra muy frecuente: se revisan las palabras de cada fila
+                allowed = set(word_ids)
+                row_words = self._row_words
+                positions = np.array([p for p in positions.tolist() if not allowed.isdisjoint(row_words[p])],
+                                     dtype=np.int64)
+            else:
+                positions = np.intersect1d(positions, self._rows_of(word_ids), assume_unique=True)
+            if len(positions) == 0:
+                break
+        return positions
+
+    def search_ids(self, query):
+        positions = self.search(query)
+        if positions is None:
+            return None
+        return [self._ids[p] for p in positions.tolist()]
+
+
+def linear_search(rows, query):
+    """
+    Misma búsqueda que SearchIndex.search, fila por fila y sin índice (mientras el índice
+    todavía se arma). rows: iterable de (record_id, dni, nombre, apellido) en orden de filas.
+    """
+    tokens = set(fold_text(query).split())
+    if not tokens:
+        return None
+    # Palabras de la fila separadas por un espacio: " ab" es prefijo de alguna palabra y un
+    # token de 3+ caracteres (sin espacios) es subcadena de alguna palabra
+    needles = [" " + token if len(token) < 3 else token for token in tokens]
+    fold_cache = {}
+    positions = []
+    for position, (_, *fields) in enumerate(rows):
+        line = ""
+        for field in fields:
+            folded = fold_cache.get(field)
+            if folded is None:
+                folded = " " + " ".join(fold_text(field).split())
+                fold_cache[field] = folded
+            line += folded
+        if all(needle in line for needle in needles):
+            positions.append(position)
+    return np.array(positions, dtype=np.int64)
+
+
+# ==============================================================================
+# FECHAS
+# ==============================================================================
+INVALID_EPOCH = np.iinfo(np.int64).min
+
+
+def _epoch_or_invalid(fecha):
+    try:
+        value = np.datetime64(str(fecha).strip(), "s")
+    except ValueError:
+        return INVALID_EPOCH
+    return INVALID_EPOCH if np.isnat(value) else int(value.astype(np.int64))
+
+
+def parse_epochs(fechas):
+    """
+    Segundos desde 1970 (hora local, sin zona) de cada "YYYY-MM-DD HH:MM:SS".
+    Las fechas que no se pueden leer quedan en INVALID_EPOCH.
+    """
+    fechas = list(fechas)
+    try:
+        # Camino rápido: numpy parsea todo el arreglo en C
+        values = np.array(fechas, dtype="datetime64[s]")
+    except ValueError:
+        return np.fromiter((_epoch_or_invalid(f) for f in fechas), dtype=np.int64, count=len(fechas))
+    epochs = values.astype(np.int64)
+    epochs[np.isnat(values)] = INVALID_EPOCH
+    return epochs
+
+
+def date_epoch(year, month, day):
+    """Epoch de las 00:00 de un día, en la misma escala que parse_epochs."""
+    return int(np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "s").astype(np.int64))
+
+
+def format_fecha(fecha):
+    """"YYYY-MM-DD HH:MM:SS" -> "DD/MM/YYYY HH:MM" (sin parsear); otro formato se devuelve igual."""
+    if len(fecha) >= 16 and fecha[4] == "-" and fecha[7] == "-" and fecha[10] == " " and fecha[13] == ":":
+        return f"{fecha[8:10]}/{fecha[5:7]}/{fecha[0:4]} {fecha[11:16]}"
+    return fecha
+
+
+class DateIndex:
+    """
+    Epochs of every row, sorted once at load.
+
+    Rows come from the store ordered by (fecha, id), so for well-formed
+    timestamps the epoch array is already sorted and a date range is a
+    contiguous block of rows. Rows with unreadable dates never match a range.
+    """
+
+    def __init__(self, epochs):
+        epochs = np.asarray(epochs, dtype=np.int64)
+        valid = np.flatnonzero(epochs != INVALID_EPOCH)
+        # argsort estable: ante la misma fecha se respeta el orden de filas
+        self._rows = valid[np.argsort(epochs[valid], kind="stable")]
+        self._sorted = epochs[self._rows]
+        self._size = len(epochs)
+        # Caso normal: todas las filas válidas y ya ordenadas -> rangos contiguos
+        self._update_contiguous()
+
+    @classmethod
+    def from_fechas(cls, fechas):
+        return cls(parse_epochs(fechas))
+
+    def __len__(self):
+        return self._size
+
+    def _update_contiguous(self):
+        self._contiguous = len(self._rows) == self._size and bool(np.all(self._rows[1:] > self._rows[:-1]))
+
+    def append(self, epoch):
+        """Agrega la fila siguiente (posición len(self))."""
+        row = self._size
+        self._size += 1
+        if epoch == INVALID_EPOCH:
+            self._contiguous = False
+            return
+        i = int(np.searchsorted(self._sorted, epoch, side="right"))
+        self._rows = np.insert(self._rows, i, row)
+        self._sorted = np.insert(self._sorted, i, epoch)
+        if i != len(self._sorted) - 1:
+            self._contiguous = False
+
+    def remove(self, position):
+        """Quita una fila; las posiciones siguientes bajan en uno."""
+        keep = self._rows != position
+        self._rows = self._rows[keep]
+        self._sorted = self._sorted[keep]
+        self._rows[self._rows > position] -= 1
+        self._size -= 1
+        self._update_contiguous()
+
+    def rows_between(self, start, end):
+        """Filas (ordenadas) con start <= epoch < end."""
+        lo = int(np.searchsorted(self._sorted, start, side="left"))
+        hi = int(np.searchsorted(self._sorted, end, side="left"))
+        if hi <= lo:
+            return np.empty(0, dtype=np.int64)
+        if self._contiguous:
+            return np.arange(lo, hi, dtype=np.int64)
+        return np.sort(self._rows[lo:hi])
+
+
+def intersect_rows(a, b):
+    """Intersección de dos listas de filas ordenadas; None significa "todas las filas"."""
+    if a is None:
+        return None if b is None else np.asarray(b, dtype=np.int64).tolist()
+    if b is None:
+        return np.asarray(a, dtype=np.int64).tolist()
+    return np.intersect1d(np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64), assume_unique=True).tolist()
+
+
+# ==============================================================================
+# CLASIFICACIÓN crPWV POR EDAD
+# ==============================================================================
+# Zona fisiológica del gráfico de referencia (paper): [4, 12] * exp(0.0022 * edad), centro 7.37
+CRPWV_AGE_COEF = 0.0022
+CRPWV_LOWER = 4.0
+CRPWV_CENTER = 7.37
+CRPWV_UPPER = 12.0
+
+STATUS_UNKNOWN = -1  # Falta la edad o la crPWV
+STATUS_ABNORMAL = 0
+STATUS_NORMAL = 1
+
+
+def crpwv_bounds_for_age(age_years):
+    """(inferior, superior) de la zona normal. Escalar -> math.exp; arreglo -> una sola llamada a np.exp."""
+    if np.ndim(age_years) == 0:
+        exp_term = math.exp(CRPWV_AGE_COEF * float(age_years))
+    else:
+        exp_term = np.exp(CRPWV_AGE_COEF * np.asarray(age_years, dtype=float))
+    return CRPWV_LOWER * exp_term, CRPWV_UPPER * exp_term
+
+
+def classify_crpwv(ages, pwv):
+    """(inferior, superior, estado STATUS_*) de cada medición, vectorizado."""
+    ages = np.asarray(ages, dtype=float)
+    pwv = np.asarray(pwv, dtype=float)
+    lower, upper = crpwv_bounds_for_age(ages)
+    with np.errstate(invalid="ignore"):
+        status = np.where((lower <= pwv) & (pwv <= upper), STATUS_NORMAL, STATUS_ABNORMAL).astype(np.int8)
+    status[~(np.isfinite(ages) & np.isfinite(pwv))] = STATUS_UNKNOWN
+    return lower, upper, status
+
+
+def _float_or_nan(value):
+    return np.nan if value is None else value
+
+
+SEX_UNKNOWN = 0
+SEX_FEMALE = 1
+SEX_MALE = 2
+_sex_codes = {}
+
+
+def sex_code(sexo):
+    """"Femenino" / "F" -> SEX_FEMALE, "Masculino" / "M" -> SEX_MALE, otro -> SEX_UNKNOWN."""
+    code = _sex_codes.get(sexo)
+    if code is None:
+        folded = fold_text(sexo).strip()
+        code = SEX_FEMALE if folded.startswith("f") else SEX_MALE if folded.startswith("m") else SEX_UNKNOWN
+        _sex_codes[sexo] = code
+    return code
+
+
+class HistoryColumns:
+    """
+    Columnar copy of the history, one entry per row (same order as the
+    repository): edad, pwv, hr (NaN when missing), sexo (SEX_* code) and
+    epoch (INVALID_EPOCH when unreadable), plus the derived classification
+    columns "lower", "upper" and "status". Appends are amortized O(1)
+    (capacity doubling); a removal shifts the tail.
+    """
+
+    # columna -> (dtype, valor a partir del registro)
+    SOURCE = {
+        "edad": (float, lambda r: _float_or_nan(r["edad"])),
+        "pwv": (float, lambda r: _float_or_nan(r["pwv"])),
+        "hr": (float, lambda r: _float_or_nan(r["hr"])),
+        "sexo": (np.int8, lambda r: sex_code(r["sexo"])),
+    }
+
+    def __init__(self, records):
+        n = len(records)
+        data = {
+            name: np.fromiter(map(value, records), dtype=dtype, count=n)
+            for name, (dtype, value) in self.SOURCE.items()
+        }
+        data["epoch"] = parse_epochs(r["fecha"] for r in records)
+        data["lower"], data["upper"], data["status"] = classify_crpwv(data["edad"], data["pwv"])
+        self._data = data
+        self._size = n
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, name):
+        return self._data[name][:self._size]
+
+    def append(self, record):
+        row = self._size
+        if row == len(self._data["status"]):
+            capacity = max(16, 2 * row)
+            for name, values in self._data.items():
+                grown = np.empty(capacity, dtype=values.dtype)
+                grown[:row] = values[:row]
+                self._data[name] = grown
+        values = {name: value(record) for name, (_, value) in self.SOURCE.items()}
+        lower, upper, status = classify_crpwv([values["edad"]], [values["pwv"]])
+        values.update(epoch=parse_epochs([record["fecha"]])[0], lower=lower[0], upper=upper[0], status=status[0])
+        for name, value in values.items():
+            self._data[name][row] = value
+        self._size += 1
+
+    def remove(self, row):
+        n = self._size
+        for values in self._data.values():
+            values[row:n - 1] = values[row + 1:n]
+        self._size -= 1
+
+
+# ==============================================================================
+# REPOSITORIO
+# ==============================================================================
+def _record_key(record):
+    return (record["fecha"], record["id"])
+
+
+def _search_fields(record):
+    return (record["id"], record["dni"], record["nombre"], record["apellido"])
+
+
+def _classify_records(records):
+    # Estados de unos pocos registros sueltos (páginas leídas de la base, sin copia columnar)
+    ages = [_float_or_nan(r["edad"]) for r in records]
+    pwv = [_float_or_nan(r["pwv"]) for r in records]
+    return classify_crpwv(ages, pwv)[2]
+
+
+class MeasurementRepository:
+    """
+    Process-wide in-memory copy of the measurement history.
+
+    Shared by every screen, so re-opening the history does not touch the
+    disk. load_in_background() reads the copy and builds the search and date
+    indexes in a worker thread; until then count(), fetch_page() and
+    crpwv_status() are answered by the store's own paged queries, and
+    search() / rows_between() scan the rows. Other reads load the copy on
+    first use. The copy is dropped when the store files change on disk
+    (mtime/size: another station or process saved) and updated in place on
+    the repository's own writes, together with the indexes.
+
+    Subscribers are called as callback(event, row) with event "added",
+    "removed" (row = model row) or "reset" (row = None). Bound methods are
+    held weakly, so a destroyed screen stops receiving events on its own.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.RLock()
+        self._records = None  # orden (fecha, id), igual que las filas del modelo
+        self._by_id = None  # ID estable -> registro
+        self._by_dni = None  # DNI -> registros del paciente, en orden cronológico
+        self._columns = None  # HistoryColumns, armado en la misma carga
+        self._signature = None
+        self._search_index = None
+        self._date_index = None
+        self._generation = 0  # Cambia con cada modificación de la copia: invalida cargas en curso
+        self._loader = None
+        self._copy_loaded = threading.Condition(self._lock)
+        self._subscribers = []
+
+    # Suscripciones --------------------------------------------------------
+    def subscribe(self, callback):
+        if hasattr(callback, "__self__"):
+            ref = weakref.WeakMethod(callback)
+        else:
+            def ref():
+                return callback
+        self._subscribers.append(ref)
+
+    def unsubscribe(self, callback):
+        self._subscribers = [ref for ref in self._subscribers if ref() not in (None, callback)]
+
+    def _notify(self, event, row=None):
+        alive = []
+        for ref in list(self._subscribers):
+            callback = ref()
+            if callback is None:
+                continue
+            try:
+                callback(event, row)
+            except RuntimeError:
+                # Widget de Qt ya destruido
+                continue
+            alive.append(ref)
+        self._subscribers = alive
+
+    # Carga e invalidación -------------------------------------------------
+    def _read_store(self):
+        # La firma se toma antes de leer: una escritura concurrente fuerza otra lectura
+        signature = self.store.signature()
+        records = self.store.all_records()
+        by_id = {}
+        by_dni = {}
+        for r in records:
+            by_id[r["id"]] = r
+            by_dni.setdefault(r["dni"], []).append(r)
+        # Clasificación de todo el historial en una sola pasada vectorizada
+        return signature, records, by_id, by_dni, HistoryColumns(records)
+
+    def _install(self, signature, records, by_id, by_dni, columns):
+        self._generation += 1
+        # Si ya se mostraron datos de la base (count / fetch_page sin copia), se conserva esa
+        # firma: un cambio de otro proceso durante la lectura todavía avisa "reset"
+        if self._signature is None:
+            self._signature = signature
+        self._records, self._by_id, self._by_dni, self._columns = records, by_id, by_dni, columns
+        self._copy_loaded.notify_all()
+
+    def _ensure_loaded(self):
+        if self._records is None:
+            self._install(*self._read_store())
+        return self._records
+
+    def _drop(self):
+        self._generation += 1
+        self._signature = None
+        self._records = None
+        self._by_id = None
+        self._by_dni = None
+        self._columns = None
+        self._search_index = None
+        self._date_index = None
+
+    @property
+    def loaded(self):
+        return self._records is not None
+
+    @property
+    def indexes_ready(self):
+        return self._search_index is not None and self._date_index is not None
+
+    @property
+    def loading(self):
+        return self._loader is not None
+
+    def load_in_background(self):
+        """Lee la copia y arma los índices de búsqueda y fechas en un hilo, sin frenar la GUI."""
+        with self._lock:
+            if self.indexes_ready or self._loader is not None:
+                return
+            self._loader = threading.Thread(target=self._load_worker, name="historial", daemon=True)
+            self._loader.start()
+
+    def _load_worker(self):
+        try:
+            self._build_in_background()
+        finally:
+            with self._lock:
+                self._loader = None
+                self._copy_loaded.notify_all()
+
+    def _build_in_background(self):
+        while True:
+            with self._lock:
+                if self.indexes_ready:
+                    return
+                generation = self._generation
+                loaded = self._records is not None
+                if loaded:
+                    rows = [_search_fields(r) for r in self._records]
+                    epochs = np.array(self._columns["epoch"], dtype=np.int64)
+            # Lo caro, fuera del lock: la GUI sigue leyendo la base o la copia y escribiendo
+            if not loaded:
+                # Primero la copia: las búsquedas fila por fila ya no leen la base
+                state = self._read_store()
+                with self._lock:
+                    if self._generation == generation:
+                        self._install(*state)
+                continue
+            search_index = SearchIndex.from_rows(rows)
+            date_index = DateIndex(epochs)
+            with self._lock:
+                if self._generation == generation:
+                    if self._search_index is None:
+                        self._search_index = search_index
+                    if self._date_index is None:
+                        self._date_index = date_index
+                    return
+            # La copia cambió mientras se armaban: se arman de nuevo sobre la actual
+
+    def refresh_if_changed(self):
+        """Descarta la copia si la base cambió en disco desde la última lectura. Devuelve True si la descartó."""
+        with self._lock:
+            if self._signature is None or self.store.signature() == self._signature:
+                return False
+            self._drop()
+        self._notify("reset")
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._drop()
+        self._notify("reset")
+
+    # Lectura ---------------------------------------------------------------
+    def _store_signature(self):
+        # Sin copia en memoria: lo que se muestra sale de la base, desde esta firma
+        if self._signature is None:
+            self._signature = self.store.signature()
+
+    def count(self):
+        with self._lock:
+            if self._records is None:
+                self._store_signature()
+                return self.store.count()
+            return len(self._records)
+
+    def fetch_page(self, offset, limit):
+        with self._lock:
+            if self._records is None:
+                self._store_signature()
+                # Consulta paginada de la base: la primera página no espera la carga completa
+                return self.store.fetch_page(offset, limit)
+            return self._records[offset:offset + limit]
+
+    def record(self, row):
+        with self._lock:
+            return self._ensure_loaded()[row]
+
+    def records(self):
+        """Lista compartida de registros en orden de filas (no modificar)."""
+        with self._lock:
+            return self._ensure_loaded()
+
+    def get(self, record_id):
+        """Registro por ID (O(1)), o None si no existe."""
+        with self._lock:
+            if self._records is None:
+                return self.store.get(record_id)
+            return self._by_id.get(record_id)
+
+    def row_of(self, record_id):
+        """Fila actual de un ID: búsqueda binaria por (fecha, id) sobre el orden de filas."""
+        with self._lock:
+            self._ensure_loaded()
+            record = self._by_id.get(record_id)
+            if record is None:
+                return None
+            row = bisect_left(self._records, _record_key(record), key=_record_key)
+            return row if row < len(self._records) and self._records[row] is record else None
+
+    def patient_records(self, dni):
+        """Mediciones de un DNI en orden cronológico (sin recorrer el historial)."""
+        with self._lock:
+            if self._records is None:
+                return self.store.find_by_dni(dni)
+            return list(self._by_dni.get(str(dni).strip(), ()))
+
+    def columns(self):
+        """Copia columnar (HistoryColumns) en el orden de filas."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._columns
+
+    def patient_count(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._by_dni)
+
+    def crpwv_status(self, offset, limit):
+        """Estados STATUS_* de las filas [offset, offset + limit)."""
+        with self._lock:
+            if self._records is None:
+                return _classify_records(self.fetch_page(offset, limit))
+            return self._columns["status"][offset:offset + limit]
+
+    def crpwv_status_of(self, record_id):
+        with self._lock:
+            if self._records is None:
+                record = self.store.get(record_id)
+                return STATUS_UNKNOWN if record is None else int(_classify_records([record])[0])
+            row = self.row_of(record_id)
+            return STATUS_UNKNOWN if row is None else int(self._columns["status"][row])
+
+    def search_index(self):
+        with self._lock:
+            if self._search_index is None:
+                self._search_index = SearchIndex.from_rows(_search_fields(r) for r in self._ensure_loaded())
+            return self._search_index
+
+    def _wait_for_copy(self):
+        # Con la copia leyéndose en otro hilo, esperarla cuesta menos que recorrer la base en
+        # paralelo. None si la carga terminó sin copia (error de lectura)
+        self.load_in_background()
+        self._copy_loaded.wait_for(lambda: self._records is not None or self._loader is None)
+        return self._records
+
+    def search(self, query):
+        """Filas que cumplen la búsqueda: con el índice si ya está armado, si no fila por fila."""
+        with self._lock:
+            if self._search_index is not None:
+                return self._search_index.search(query)
+            records = self._wait_for_copy()
+            if records is None:
+                records = self.store.iter_records()
+            return linear_search((_search_fields(r) for r in records), query)
+
+    def rows_between(self, start, end):
+        """Filas con start <= fecha < end (epochs): con el índice, o recorriendo la base sin copia."""
+        with self._lock:
+            if self._wait_for_copy() is None:
+                return DateIndex.from_fechas(r["fecha"] for r in self.store.iter_records()).rows_between(start, end)
+            return self.date_index().rows_between(start, end)
+
+    def date_index(self):
+        with self._lock:
+            if self._date_index is None:
+                # Las fechas ya están parseadas en la copia columnar
+                self._ensure_loaded()
+                self._date_index = DateIndex(self._columns["epoch"])
+            return self._date_index
+
+    # Escritura -------------------------------------------------------------
+    def add(self, record):
+        """Guarda un registro en la base y en la copia en memoria. Devuelve su ID."""
+        self.refresh_if_changed()
+        with self._lock:
+            record_id = self.store.add(record)
+            if self._records is None:
+                # Sin copia: se leerá completa cuando haga falta; lo leído de la base queda viejo
+                self._drop()
+                row = None
+            else:
+                row = self._add_to_copy(record_id, record)
+        self._notify("reset" if row is None else "added", row)
+        return record_id
+
+    def _add_to_copy(self, record_id, record):
+        self._signature = self.store.signature()
+        self._generation += 1
+        record = dict(record)
+        self._by_id[record_id] = record
+        patient = self._by_dni.setdefault(record["dni"], [])
+        if not patient or _record_key(record) >= _record_key(patient[-1]):
+            patient.append(record)
+        else:
+            patient.insert(bisect_right(patient, _record_key(record), key=_record_key), record)
+        records = self._records
+        if not records or _record_key(record) >= _record_key(records[-1]):
+            # Caso normal: la medición nueva es la más reciente
+            row = len(records)
+            records.append(record)
+            self._columns.append(record)
+            if self._search_index is not None:
+                self._search_index.add(*_search_fields(record))
+            if self._date_index is not None:
+                self._date_index.append(self._columns["epoch"][row])
+        else:
+            # Fecha anterior a la última (reloj atrasado): se inserta en orden y se rearman los índices
+            row = bisect_right(records, _record_key(record), key=_record_key)
+            records.insert(row, record)
+            self._columns = HistoryColumns(records)
+            self._search_index = None
+            self._date_index = None
+        return row
+
+    def delete(self, record_id):
+        self.refresh_if_changed()
+        with self._lock:
+            deleted = self.store.delete(record_id)
+            if not deleted:
+                return deleted
+            if self._records is None:
+                self._drop()
+                row = None
+            else:
+                row = self._remove_from_copy(record_id)
+                if row is None:
+                    return deleted
+        self._notify("reset" if row is None else "removed", row)
+        return deleted
+
+    def _remove_from_copy(self, record_id):
+        self._signature = self.store.signature()
+        self._generation += 1
+        row = self.row_of(record_id)
+        if row is None:
+            return None
+        record = self._records.pop(row)
+        del self._by_id[record_id]
+        self._columns.remove(row)
+        patient = self._by_dni[record["dni"]]
+        patient.remove(record)
+        if not patient:
+            del self._by_dni[record["dni"]]
+        if self._search_index is not None:
+            self._search_index.remove(row)
+        if self._date_index is not None:
+            self._date_index.remove(row)
+        return row
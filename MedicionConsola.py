@@ -0,0 +1,257 @@
+"""
+MEDICIONCONSOLA.PY
+Headless measurement runner: a full measurement without Qt, for scripted
+calibration checks, automated station tests and machines without a display.
+
+It does what MainScreen does, without drawing:
+- connects to the ESP32 through ComunicacionMax (same WebSocket thread);
+- sends height / age with enviar_datos_paciente, retrying every second
+  until the firmware accepts them;
+- runs SignalProcessor every 20 ms (calibration, startup fill, playback);
+- waits for the final crPWV / HR reported by the firmware (it only sends
+  them once the measurement is finished) and for --settle seconds of
+  stable values;
+- writes the record and its waveform to the measurement store (the same
+  STIFFIO_MEDICIONES / mediciones_pwv.db as the application) and sends the
+  study reset to the ESP32, like leaving the measurement screen.
+
+HR and crPWV come from the firmware: there is no Python-side PWV engine.
+
+Progress goes to stdout as JSON lines, one object per event with "event"
+and "t" (seconds since start): start, connected, patient_sent, status
+(every --status-every s), result, saved, error.
+
+--simulate replaces the ESP32 by a SimuladorPPG station on a virtual clock
+(ComunicacionMax.VirtualClock): it checks the whole pipeline and the store
+without hardware, in a fraction of a second.
+
+Exit status: 0 measurement saved (or obtained, with --no-save), 1 no final
+result before --timeout, 2 no connection before --connect-timeout.
+
+Uso:
+    python MedicionConsola.py --dni 30111222 --nombre Ana --apellido Pérez --edad 45 --altura 165 --sexo Femenino
+    python MedicionConsola.py --edad 45 --altura 165 --timeout 240 --store otra_base.db
+    python MedicionConsola.py --edad 45 --altura 165 --simulate --no-save
+"""
+
+import argparse
+from datetime import datetime
+import json
+import os
+import sys
+import time
+
+import ComunicacionMax
+import SimuladorPPG
+from BackEnd import SignalProcessor
+from Mediciones import TIMESTAMP_FORMAT, make_record, open_store, save_waveform, waveform_path
+
+
+TICK_SECONDS = 0.020  # Igual que el QTimer de MainScreen
+PATIENT_RETRY_SECONDS = 1.0
+
+# Misma base que la aplicación (FrontEnd.measurement_store)
+MEASUREMENTS_PATH = os.getenv("STIFFIO_MEDICIONES", "").strip() or "mediciones_pwv.db"
+LEGACY_CSV = "mediciones_pwv.csv"
+
+
+def emit(event, started, **fields):
+    print(json.dumps(dict({"event": event, "t": round(ComunicacionMax.now() - started, 3)}, **fields),
+                     ensure_ascii=False), flush=True)
+
+
+# ==============================================================================
+# ESTACIÓN SIMULADA
+# ==============================================================================
+class SimulatedStation:
+    """ESP32 simulado con SimuladorPPG sobre un reloj virtual.
+
+    Hace de ws_app de ComunicacionMax (recibe los datos del paciente por send) y entrega los
+    paquetes con on_message, en el instante de cada muestra, a medida que avanza wait().
+    Como el firmware, espera los datos del paciente antes de medir y recién informa HR y
+    crPWV después de result_after segundos de señal.
+    """
+
+    def __init__(self, fs=50, hr=72, pwv=8.5, seed=0, result_after=30.0, seconds=600):
+        self.fs = fs
+        self.hr = hr
+        self.pwv = pwv
+        self.seed = seed
+        self.result_after = result_after
+        self.seconds = seconds
+        self.clock = ComunicacionMax.VirtualClock()
+        self._packets = []
+        self._sent = 0
+        self._signal_start = None
+
+    def connect(self):
+        ComunicacionMax.set_clock(self.clock)
+        ComunicacionMax.on_open(None)
+        with ComunicacionMax._state_lock:
+            ComunicacionMax.ws_app = self
+            ComunicacionMax.active_ws_url = "simulado"
+
+    def close(self):
+        ComunicacionMax.on_close(None, None, None)
+        ComunicacionMax.set_clock(None)
+
+    def send(self, message):
+        data = json.loads(message)
+        if "h" not in data or self._signal_start is not None:
+            return
+        recording = SimuladorPPG.generate(self.seconds, fs=self.fs, hr=self.hr, pwv=self.pwv,
+                                          height_cm=data["h"], seed=self.seed)
+        self._packets = list(SimuladorPPG.packets(recording, metrics=False))
+        hr = int(round(recording["hr"]))
+        pwv = round(recording["pwv"], 2)
+        for packet in self._packets[int(self.result_after * self.fs):]:
+            packet["hr"] = hr
+            packet["pwv"] = pwv
+        self._signal_start = self.clock()
+
+    def wait(self, seconds):
+        end = self.clock() + seconds
+        if self._signal_start is not None:
+            while self._sent < len(self._packets):
+                at = self._signal_start + self._sent / self.fs
+                if at > end:
+                    break
+                self.clock.time = at
+                ComunicacionMax.on_message(None, json.dumps(self._packets[self._sent]))
+                self._sent += 1
+        self.clock.time = end
+
+
+class DeviceLink:
+    """Conexión real: hilo WebSocket de ComunicacionMax y espera con el reloj de pared."""
+
+    def connect(self):
+        ComunicacionMax.start_connection()
+
+    def close(self):
+        pass
+
+    def wait(self, seconds):
+        time.sleep(seconds)
+
+
+# ==============================================================================
+# MEDICIÓN
+# ==============================================================================
+def wait_connection(link, started, timeout=30.0):
+    while not ComunicacionMax.get_snapshot(include_stream=False)["connected"]:
+        if ComunicacionMax.now() - started > timeout:
+            emit("error", started, message="sin conexión con el ESP32", urls=ComunicacionMax.WS_URL_CANDIDATES)
+            return False
+        link.wait(TICK_SECONDS)
+    emit("connected", started, ws_url=ComunicacionMax.get_snapshot(include_stream=False)["ws_url"])
+    return True
+
+
+def measure(patient, link, started, timeout=180.0, settle=2.0, status_every=1.0):
+    """Corre la medición ya conectada e imprime sus eventos. Devuelve (HR, crPWV, procesador) o None."""
+    processor = SignalProcessor()
+    ComunicacionMax.reset_stream_buffers()
+    processor.start_session()
+    measuring_since = ComunicacionMax.now()
+    patient_sent = False
+    last_attempt = None
+    last_status = None
+    stable = None  # (hr, pwv, desde cuándo)
+
+    while ComunicacionMax.now() - measuring_since <= timeout:
+        now = ComunicacionMax.now()
+        if not patient_sent and (last_attempt is None or now - last_attempt >= PATIENT_RETRY_SECONDS):
+            last_attempt = now
+            patient_sent = ComunicacionMax.enviar_datos_paciente(patient["altura"], patient["edad"])
+            if patient_sent:
+                emit("patient_sent", started, altura=patient["altura"], edad=patient["edad"])
+
+        processor.process_all()
+        metrics = processor.get_metrics()
+        hr, pwv = metrics["hr"], metrics["pwv"]
+
+        if last_status is None or now - last_status >= status_every:
+            last_status = now
+            status = processor.get_sensor_status()
+            emit("status", started, connected=status["connected"], c1=status["c1"], c2=status["c2"],
+                 s1=status["s1"], s2=status["s2"], calibration=round(metrics["calibration_progress"], 3),
+                 playback=metrics["buffer_ready"], hr=hr, pwv=pwv,
+                 dropped=ComunicacionMax.get_snapshot(include_stream=False)["dropped"])
+
+        if hr is None or pwv is None:
+            stable = None
+        elif stable is None or stable[:2] != (hr, pwv):
+            stable = (hr, pwv, now)
+        if stable is not None and now - stable[2] >= settle:
+            emit("result", started, hr=hr, pwv=round(pwv, 1))
+            return hr, pwv, processor
+
+        link.wait(TICK_SECONDS)
+
+    emit("error", started, message="sin resultado final del ESP32", timeout=timeout)
+    return None
+
+
+def save(patient, hr, pwv, processor, store_path):
+    store = open_store(store_path)
+    try:
+        store.import_legacy_csv_once(os.path.abspath(LEGACY_CSV))
+        record = make_record(datetime.now().strftime(TIMESTAMP_FORMAT), patient["dni"], patient["nombre"],
+                             patient["apellido"], patient["edad"], patient["altura"], patient["sexo"],
+                             hr, round(pwv, 1), patient["observaciones"])
+        store.add(record)
+        waveform = None
+        proximal, distal = processor.get_recording()
+        if proximal:
+            waveform = waveform_path(store.path, record["id"])
+            save_waveform(waveform, proximal, distal, processor.fs)
+        return record, waveform
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edad", type=int, required=True)
+    parser.add_argument("--altura", type=int, required=True, help="cm; el firmware calcula la distancia con ella")
+    parser.add_argument("--dni", default="")
+    parser.add_argument("--nombre", default="")
+    parser.add_argument("--apellido", default="")
+    parser.add_argument("--sexo", default="")
+    parser.add_argument("--observaciones", default="")
+    parser.add_argument("--store", default=MEASUREMENTS_PATH, help="base de mediciones (.db o diario)")
+    parser.add_argument("--no-save", action="store_true", help="no guardar la medición")
+    parser.add_argument("--timeout", type=float, default=180.0, help="s de medición sin resultado final")
+    parser.add_argument("--connect-timeout", type=float, default=30.0)
+    parser.add_argument("--settle", type=float, default=2.0, help="s con HR / crPWV estables antes de aceptarlos")
+    parser.add_argument("--status-every", type=float, default=1.0)
+    parser.add_argument("--simulate", action="store_true", help="ESP32 simulado (SimuladorPPG, reloj virtual)")
+    parser.add_argument("--sim-pwv", type=float, default=8.5)
+    parser.add_argument("--sim-hr", type=float, default=72.0)
+    args = parser.parse_args()
+
+    patient = {key: getattr(args, key) for key in
+               ("dni", "nombre", "apellido", "edad", "altura", "sexo", "observaciones")}
+    link = SimulatedStation(hr=args.sim_hr, pwv=args.sim_pwv) if args.simulate else DeviceLink()
+    link.connect()
+    started = ComunicacionMax.now()
+    emit("start", started, altura=patient["altura"], edad=patient["edad"], simulated=args.simulate)
+    try:
+        if not wait_connection(link, started, args.connect_timeout):
+            sys.exit(2)
+        outcome = measure(patient, link, started, args.timeout, args.settle, args.status_every)
+        if outcome is None:
+            sys.exit(1)
+        hr, pwv, processor = outcome
+        if not args.no_save:
+            record, waveform = save(patient, hr, pwv, processor, args.store)
+            emit("saved", started, id=record["id"], store=os.path.abspath(args.store), waveform=waveform)
+    finally:
+        # Como al salir de la pantalla de medición: el ESP32 queda listo para el próximo estudio
+        ComunicacionMax.enviar_reset_estudio()
+        link.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1073 @@
+"""
+MEDICIONES.PY
+Persistent measurement stores.
+
+- MeasurementStore (SQLite, the default): one row per saved measurement,
+  identified by a stable integer ID (AUTOINCREMENT: IDs are never reused
+  after a deletion). Indexes on DNI, surname and timestamp; WAL journal so
+  readers never block the writer.
+- MeasurementJournal: append-only JSON-lines file for a folder shared by
+  several stations. Records get a random hex ID; deletions are appended
+  tombstones, and compaction rewrites the file atomically (os.replace).
+  Writers serialize on an advisory lock, append each save with a single
+  write + fsync, and every line carries a CRC32, so readers skip torn or
+  corrupted lines.
+- open_store(path) picks one or the other by file extension.
+- One-shot importer for the legacy mediciones_pwv.csv, including the old
+  rows without the "Observaciones" column.
+- Export back to the semicolon CSV format used by the app.
+- Typed columnar export / import of the whole history for analysis tools:
+  .npz of NumPy arrays (always available) and Arrow IPC / Parquet when
+  pyarrow is installed. Written in chunks, so memory stays constant.
+- Saved recordings (proximal / distal signal of each measurement) in
+  ondas/<id>.npz next to the store.
+
+Records are plain dicts:
+{
+  "id": int, "fecha": "YYYY-MM-DD HH:MM:SS",
+  "dni": str, "nombre": str, "apellido": str,
+  "edad": int|None, "altura": int|None, "sexo": str,
+  "hr": int|None, "pwv": float|None, "observaciones": str
+}
+"""
+
+import csv
+from itertools import islice
+import json
+import math
+from operator import itemgetter
+import os
+import pathlib
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import uuid
+import zipfile
+import zlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# ==============================================================================
+# FORMATO
+# ==============================================================================
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CSV_DELIMITER = ";"
+CSV_ENCODING = "utf-8-sig"
+CSV_HEADER = ["Fecha y Hora", "DNI", "Nombre", "Apellido", "Edad", "Altura (cm)", "Sexo", "HR (bpm)", "crPWV (m/s)", "Observaciones"]
+
+# Claves de cada registro, en el mismo orden que las columnas del CSV
+RECORD_FIELDS = ("fecha", "dni", "nombre", "apellido", "edad", "altura", "sexo", "hr", "pwv", "observaciones")
+
+# Filas del CSV viejo: 9 columnas (sin observaciones); las nuevas tienen 10
+CSV_MIN_COLUMNS = 9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mediciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    dni TEXT NOT NULL DEFAULT '',
+    nombre TEXT NOT NULL DEFAULT '',
+    apellido TEXT NOT NULL DEFAULT '',
+    edad INTEGER,
+    altura INTEGER,
+    sexo TEXT NOT NULL DEFAULT '',
+    hr INTEGER,
+    pwv REAL,
+    observaciones TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_mediciones_dni ON mediciones(dni);
+CREATE INDEX IF NOT EXISTS idx_mediciones_apellido ON mediciones(apellido COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_mediciones_fecha ON mediciones(fecha, id);
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+_COLUMNS = "id, " + ", ".join(RECORD_FIELDS)
+_ORDER = "ORDER BY fecha, id"
+
+
+def _to_int_or_none(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip().replace(",", ".")
+        if not value:
+            return None
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(v):
+        return None
+    return int(round(v))
+
+
+def _to_float_or_none(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip().replace(",", ".")
+        if not value:
+            return None
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return v if math.isfinite(v) else None
+
+
+def make_record(fecha, dni="", nombre="", apellido="", edad=None, altura=None, sexo="",
+                hr=None, pwv=None, observaciones="", record_id=None):
+    return {
+        "id": record_id,
+        "fecha": str(fecha).strip(),
+        "dni": str(dni or "").strip(),
+        "nombre": str(nombre or "").strip(),
+        "apellido": str(apellido or "").strip(),
+        "edad": _to_int_or_none(edad),
+        "altura": _to_int_or_none(altura),
+        "sexo": str(sexo or "").strip(),
+        "hr": _to_int_or_none(hr),
+        "pwv": _to_float_or_none(pwv),
+        "observaciones": str(observaciones or "").strip(),
+    }
+
+
+def format_value(record, key):
+    """Texto de un campo tal como se muestra en la tabla y se escribe en el CSV."""
+    value = record.get(key)
+    if value is None:
+        return ""
+    if key == "pwv":
+        return f"{value:.1f}"
+    return str(value)
+
+
+# ==============================================================================
+# CSV
+# ==============================================================================
+def parse_csv_row(row):
+    """Normaliza una fila del CSV (9 o 10 columnas). Devuelve None si no es un registro."""
+    if len(row) < CSV_MIN_COLUMNS:
+        return None
+    if row[0].strip() in ("", CSV_HEADER[0]):
+        return None
+    observaciones = row[9] if len(row) > 9 else ""
+    return make_record(*row[:9], observaciones=observaciones)
+
+
+def read_csv(path, encoding=CSV_ENCODING, delimiter=CSV_DELIMITER):
+    with open(path, newline="", encoding=encoding) as file:
+        for row in csv.reader(file, delimiter=delimiter):
+            record = parse_csv_row(row)
+            if record is not None:
+                yield record
+
+
+def record_to_csv_row(record):
+    return [format_value(record, key) for key in RECORD_FIELDS]
+
+
+def write_csv(path, records):
+    count = 0
+    with open(path, mode="w", newline="", encoding=CSV_ENCODING) as file:
+        writer = csv.writer(file, delimiter=CSV_DELIMITER)
+        writer.writerow(CSV_HEADER)
+        for record in records:
+            writer.writerow(record_to_csv_row(record))
+            count += 1
+    return count
+
+
+# ==============================================================================
+# COLUMNAR (npz / Arrow / Parquet)
+# ==============================================================================
+# Registros por lote al escribir / leer: la memoria no depende del tamaño del historial
+COLUMNAR_BATCH = 50000
+COLUMNAR_EXTENSIONS = (".npz", ".parquet", ".arrow", ".feather")
+
+# Tipos de las columnas. En el .npz los faltantes son NaN (números) o NaT (fecha);
+# en Arrow / Parquet son nulos y edad, altura y HR quedan como enteros.
+COLUMNAR_NUMBERS = {"edad": np.float32, "altura": np.float32, "hr": np.float32, "pwv": np.float64}
+COLUMNAR_TEXT = ("id", "dni", "nombre", "apellido", "sexo", "observaciones")
+COLUMNAR_TEXT_ENCODING = "utf-8"
+
+
+def _npz_layout():
+    """
+    Arreglos del .npz, en orden. Cada columna de texto se guarda como en Arrow:
+    <col>_data (bytes UTF-8 concatenados, uint8) y <col>_offsets (int64, n + 1):
+    el valor i es <col>_data[offsets[i]:offsets[i + 1]].
+    """
+    layout = [("fecha", np.dtype("datetime64[s]"))]
+    layout += [(key, np.dtype(dtype)) for key, dtype in COLUMNAR_NUMBERS.items()]
+    for key in COLUMNAR_TEXT:
+        layout += [(key + "_offsets", np.dtype(np.int64)), (key + "_data", np.dtype(np.uint8))]
+    return layout
+
+
+def batched(iterable, size):
+    """Listas de hasta size elementos, sin materializar el iterable completo."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _fechas_to_datetime64(fechas):
+    try:
+        return np.array(fechas, dtype="datetime64[s]")
+    except ValueError:
+        # Alguna fecha ilegible (p. ej. del CSV viejo): se convierte una por una y queda NaT
+        out = np.empty(len(fechas), dtype="datetime64[s]")
+        for i, fecha in enumerate(fechas):
+            try:
+                out[i] = np.datetime64(fecha, "s")
+            except ValueError:
+                out[i] = np.datetime64("NaT")
+        return out
+
+
+def _datetime64_to_fechas(values):
+    text = np.datetime_as_string(values.astype("datetime64[s]"), unit="s")
+    return ["" if t == "NaT" else t.replace("T", " ") for t in text.tolist()]
+
+
+def _text_values(records, key):
+    values = list(map(itemgetter(key), records))
+    if key == "id":
+        return [str(v) for v in values]
+    return values
+
+
+def _number_values(records, key, dtype):
+    # None -> NaN al convertir a float
+    return np.array(list(map(itemgetter(key), records)), dtype=dtype)
+
+
+def _columns_to_records(fechas, numbers, text):
+    # make_record vuelve a normalizar: NaN -> None, enteros redondeados, texto sin espacios
+    rows = zip(fechas, text["dni"], text["nombre"], text["apellido"], numbers["edad"], numbers["altura"],
+               text["sexo"], numbers["hr"], numbers["pwv"], text["observaciones"])
+    return [make_record(*row) for row in rows]
+
+
+class _NpzWriter:
+    """Escribe cada columna en un archivo temporal lote por lote y al cerrar arma el .npz (zip de .npy)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._tmpdir = tempfile.mkdtemp(prefix=".columnas-", dir=os.path.dirname(os.path.abspath(path)))
+        self._layout = _npz_layout()
+        self._files = {name: open(os.path.join(self._tmpdir, name), "wb") for name, _ in self._layout}
+        self._lengths = dict.fromkeys(self._files, 0)
+        self._text_end = dict.fromkeys(COLUMNAR_TEXT, 0)
+        for key in COLUMNAR_TEXT:
+            self._put(key + "_offsets", np.zeros(1, dtype=np.int64))
+
+    def _put(self, name, array):
+        self._files[name].write(np.ascontiguousarray(array).tobytes())
+        self._lengths[name] += len(array)
+
+    def write(self, records):
+        self._put("fecha", _fechas_to_datetime64(list(map(itemgetter("fecha"), records))))
+        for key, dtype in COLUMNAR_NUMBERS.items():
+            self._put(key, _number_values(records, key, dtype))
+        for key in COLUMNAR_TEXT:
+            encoded = [v.encode(COLUMNAR_TEXT_ENCODING) for v in _text_values(records, key)]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+            offsets = self._text_end[key] + np.cumsum(lengths)
+            self._put(key + "_offsets", offsets)
+            self._put(key + "_data", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            if len(offsets):
+                self._text_end[key] = int(offsets[-1])
+
+    def abort(self):
+        for file in self._files.values():
+            file.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def close(self):
+        try:
+            for file in self._files.values():
+                file.close()
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name, dtype in self._layout:
+                    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (self._lengths[name],)}
+                    with archive.open(name + ".npy", "w", force_zip64=True) as out, \
+                            open(os.path.join(self._tmpdir, name), "rb") as src:
+                        np.lib.format.write_array_header_2_0(out, header)
+                        shutil.copyfileobj(src, out, 1 << 20)
+            os.replace(tmp_path, self.path)
+        finally:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class _NpyStream:
+    """Lectura por lotes de un .npy dentro del zip, sin cargar el arreglo completo."""
+
+    def __init__(self, archive, name):
+        try:
+            self._file = archive.open(name + ".npy")
+        except KeyError:
+            raise ValueError(f"El archivo no tiene la columna '{name}'") from None
+        version = np.lib.format.read_magic(self._file)
+        read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                       else np.lib.format.read_array_header_2_0)
+        shape, _, self.dtype = read_header(self._file)
+        self.length = shape[0] if shape else 1
+
+    def read(self, count):
+        return np.frombuffer(self._file.read(int(count) * self.dtype.itemsize), dtype=self.dtype)
+
+
+def _read_npz(path, batch_size):
+    with zipfile.ZipFile(path) as archive:
+        streams = {name: _NpyStream(archive, name) for name, _ in _npz_layout()}
+        text_start = {key: int(streams[key + "_offsets"].read(1)[0]) for key in COLUMNAR_TEXT}
+        total = streams["fecha"].length
+        for start in range(0, total, batch_size):
+            count = min(batch_size, total - start)
+            fechas = _datetime64_to_fechas(streams["fecha"].read(count))
+            numbers = {key: streams[key].read(count).tolist() for key in COLUMNAR_NUMBERS}
+            text = {}
+            for key in COLUMNAR_TEXT:
+                offsets = (streams[key + "_offsets"].read(count) - text_start[key]).tolist()
+                data = streams[key + "_data"].read(offsets[-1]).tobytes()
+                text[key] = [data[a:b].decode(COLUMNAR_TEXT_ENCODING) for a, b in zip([0] + offsets, offsets)]
+                text_start[key] += offsets[-1]
+            yield _columns_to_records(fechas, numbers, text)
+
+
+def _pyarrow():
+    # Dependencia opcional: solo se importa al exportar / importar Arrow o Parquet
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Para Arrow / Parquet hace falta instalar pyarrow (pip install pyarrow); "
+                           "el formato .npz no lo necesita.") from None
+    return pyarrow
+
+
+def _arrow_schema(pa):
+    fields = [("id", pa.string()), ("fecha", pa.timestamp("s"))]
+    for key in RECORD_FIELDS[1:]:
+        if key in COLUMNAR_TEXT:
+            fields.append((key, pa.string()))
+        elif key == "pwv":
+            fields.append((key, pa.float64()))
+        else:
+            fields.append((key, pa.int32()))
+    return pa.schema(fields)
+
+
+def _arrow_batch(pa, schema, records):
+    arrays = []
+    for field in schema:
+        if field.name == "fecha":
+            values = _fechas_to_datetime64(list(map(itemgetter("fecha"), records)))
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))  # NaT -> nulo
+        elif field.name in COLUMNAR_TEXT:
+            arrays.append(pa.array(_text_values(records, field.name), type=field.type))
+        else:
+            arrays.append(pa.array(list(map(itemgetter(field.name), records)), type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_arrow(path, records, batch_size):
+    pa = _pyarrow()
+    schema = _arrow_schema(pa)
+    parquet = path.lower().endswith(".parquet")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    count = 0
+    try:
+        if parquet:
+            writer = pa.parquet.ParquetWriter(tmp_path, schema)
+        else:
+            sink = pa.OSFile(tmp_path, "wb")
+            writer = pa.ipc.new_file(sink, schema)
+        try:
+            for batch in batched(records, batch_size):
+                record_batch = _arrow_batch(pa, schema, batch)
+                if parquet:
+                    writer.write_table(pa.Table.from_batches([record_batch]))
+                else:
+                    writer.write_batch(record_batch)
+                count += len(batch)
+        finally:
+            writer.close()
+            if not parquet:
+                sink.close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def _read_arrow(path, batch_size):
+    pa = _pyarrow()
+    if path.lower().endswith(".parquet"):
+        batches = pa.parquet.ParquetFile(path).iter_batches(batch_size=batch_size)
+    else:
+        reader = pa.ipc.open_file(path)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        data = batch.to_pydict()
+        n = batch.num_rows
+        fechas = [f.strftime(TIMESTAMP_FORMAT) if f is not None else "" for f in data.get("fecha", [None] * n)]
+        numbers = {key: data.get(key, [None] * n) for key in COLUMNAR_NUMBERS}
+        text = {key: data.get(key, [""] * n) for key in COLUMNAR_TEXT}
+        yield _columns_to_records(fechas, numbers, text)
+
+
+def _columnar_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in COLUMNAR_EXTENSIONS:
+        raise ValueError(f"Formato no soportado: '{ext}' (usar {', '.join(COLUMNAR_EXTENSIONS)})")
+    return ext
+
+
+def write_columnar(path, records, batch_size=COLUMNAR_BATCH):
+    """Escribe los registros en .npz / .parquet / .arrow por lotes. Devuelve la cantidad escrita."""
+    if _columnar_kind(path) != ".npz":
+        return _write_arrow(path, records, batch_size)
+    writer = _NpzWriter(path)
+    count = 0
+    try:
+        for batch in batched(records, batch_size):
+            writer.write(batch)
+            count += len(batch)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return count
+
+
+def read_columnar(path, batch_size=COLUMNAR_BATCH):
+    """Lotes (listas) de registros nuevos, sin ID, leídos de un archivo de write_columnar."""
+    if _columnar_kind(path) != ".npz":
+        return _read_arrow(path, batch_size)
+    return _read_npz(path, batch_size)
+
+
+class _FileTransfer:
+    # Importar / exportar CSV y columnar (comunes a los dos stores) ----------
+    def import_csv(self, path):
+        return self.add_many(list(read_csv(path)))
+
+    def import_legacy_csv_once(self, path):
+        """Importa el CSV histórico la primera vez que se abre la base. Devuelve la cantidad importada."""
+        if self.get_meta("csv_importado") is not None:
+            return 0
+        imported = 0
+        if os.path.exists(path):
+            imported = self.import_csv(path)
+        self.set_meta("csv_importado", os.path.abspath(path))
+        return imported
+
+    def export_csv(self, path):
+        return write_csv(path, self.iter_records())
+
+    def import_columnar(self, path):
+        return sum(self.add_many(batch) for batch in read_columnar(path))
+
+    def export_columnar(self, path):
+        return write_columnar(path, self.iter_records())
+
+
+# ==============================================================================
+# SEÑALES GUARDADAS
+# ==============================================================================
+# Señal proximal/distal de cada medición en ondas/<id>.npz junto a la base (para los reportes)
+WAVEFORM_FOLDER = "ondas"
+
+
+def waveform_path(store_path, record_id):
+    """Archivo con la señal guardada de una medición, junto a la base de mediciones."""
+    folder = os.path.dirname(os.path.abspath(store_path))
+    return os.path.join(folder, WAVEFORM_FOLDER, f"{record_id}.npz")
+
+
+def save_waveform(path, proximal, distal, fs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, proximal=np.asarray(proximal, dtype=np.float32),
+                        distal=np.asarray(distal, dtype=np.float32), fs=float(fs))
+
+
+def load_waveform(path):
+    with np.load(path) as data:
+        return data["proximal"].astype(float), data["distal"].astype(float), float(data["fs"])
+
+
+# ==============================================================================
+# STORE (SQLite)
+# ==============================================================================
+class MeasurementStore(_FileTransfer):
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if readonly:
+            # Base de otra estación: solo lectura, sin crearla ni tocar su modo de journal ni su esquema
+            uri = pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_record(row):
+        record = dict(row)
+        for key in ("dni", "nombre", "apellido", "sexo", "observaciones"):
+            if record[key] is None:
+                record[key] = ""
+        return record
+
+    @staticmethod
+    def _record_values(record):
+        return tuple(record.get(key) for key in RECORD_FIELDS)
+
+    # Escritura -----------------------------------------------------------
+    def add(self, record):
+        """Guarda un registro y devuelve su ID estable."""
+        placeholders = ", ".join("?" for _ in RECORD_FIELDS)
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                f"INSERT INTO mediciones ({', '.join(RECORD_FIELDS)}) VALUES ({placeholders})",
+                self._record_values(record),
+            )
+        record["id"] = cur.lastrowid
+        return cur.lastrowid
+
+    def add_many(self, records):
+        placeholders = ", ".join("?" for _ in RECORD_FIELDS)
+        with self._lock, self._conn:
+            cur = self._conn.executemany(
+                f"INSERT INTO mediciones ({', '.join(RECORD_FIELDS)}) VALUES ({placeholders})",
+                (self._record_values(r) for r in records),
+            )
+        return cur.rowcount
+
+    def delete(self, record_id):
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM mediciones WHERE id = ?", (record_id,))
+        return cur.rowcount > 0
+
+    # Lectura -------------------------------------------------------------
+    def signature(self):
+        """(mtime, tamaño) de los archivos de la base: cambia con cualquier escritura, propia o de otro proceso."""
+        sig = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+            except OSError:
+                sig.append(None)
+                continue
+            sig.append((st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def get(self, record_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM mediciones WHERE id = ?", (record_id,)).fetchone()
+        return self._row_to_record(row) if row is not None else None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM mediciones").fetchone()[0]
+
+    def fetch_page(self, offset, limit):
+        """Registros [offset, offset + limit) en orden cronológico."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM mediciones {_ORDER} LIMIT ? OFFSET ?",
+                (int(limit), int(offset)),
+            ).fetchall()
+        return [self._row_to_record(r) for r in rows]
+
+    def find_by_dni(self, dni):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM mediciones WHERE dni = ? {_ORDER}", (str(dni).strip(),)
+            ).fetchall()
+        return [self._row_to_record(r) for r in rows]
+
+    def all_records(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM mediciones {_ORDER}").fetchall()
+        return [self._row_to_record(r) for r in rows]
+
+    def iter_records(self, batch_size=5000):
+        # Lectura por lotes con keyset (fecha, id): memoria constante para exportar
+        last = ("", -1)
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM mediciones WHERE (fecha, id) > (?, ?) {_ORDER} LIMIT ?",
+                    (last[0], last[1], int(batch_size)),
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield self._row_to_record(r)
+            last = (rows[-1]["fecha"], rows[-1]["id"])
+
+    # Meta ----------------------------------------------------------------
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT valor FROM meta WHERE clave = ?", (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (clave, valor) VALUES (?, ?) ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                (key, str(value)),
+            )
+
+
+# ==============================================================================
+# DIARIO (archivo de solo agregado)
+# ==============================================================================
+JOURNAL_ENCODING = "utf-8"
+JOURNAL_HEADER = "# stiffio-mediciones 1"
+
+# Compactar cuando las lápidas superan esta fracción de las líneas del archivo
+COMPACT_TOMBSTONE_RATIO = 0.2
+COMPACT_MIN_TOMBSTONES = 50
+
+
+def _record_sort_key(record):
+    return (record["fecha"], record["id"])
+
+
+def _encode_line(entry):
+    # <json>\t<crc32 del json>\n   (json.dumps nunca deja un tab literal)
+    body = json.dumps(entry, ensure_ascii=False).encode(JOURNAL_ENCODING)
+    return b"%s\t%08x\n" % (body, zlib.crc32(body))
+
+
+def _decode_line(line):
+    """Entrada de una línea del diario; None si está cortada, no tiene checksum o no coincide."""
+    body, sep, crc = line.rpartition(b"\t")
+    if not sep:
+        return None
+    try:
+        if zlib.crc32(body) != int(crc, 16):
+            return None
+    except ValueError:
+        return None
+    try:
+        entry = json.loads(body.decode(JOURNAL_ENCODING))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return entry if isinstance(entry, list) and entry else None
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _fsync_dir(path):
+    # Persiste el os.replace en el directorio (no aplica en Windows)
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileLock:
+    """
+    Exclusive advisory lock shared by processes and stations, taken on a
+    separate "<file>.lock" that is never replaced (fcntl.lockf on POSIX,
+    also honoured over NFS/SMB mounts; msvcrt.locking on Windows).
+    Re-entrant within the process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = self._lock_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def _lock_file(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if fcntl is not None:
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK reintenta ~10 s y después falla: se sigue esperando
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl is not None:
+                    fcntl.lockf(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MeasurementJournal(_FileTransfer):
+    """
+    Append-only measurement file, one JSON array per line:
+
+        ["A", id, fecha, dni, nombre, apellido, edad, altura, sexo, hr, pwv, observaciones]
+        ["D", id]            tombstone: the record with that ID is deleted
+        ["M", clave, valor]  metadata (the last one wins)
+
+    followed by a tab and the CRC32 of the JSON text.
+
+    Nothing is rewritten in place: a deletion appends a tombstone that every
+    reader honours. compact() drops deleted records by writing a new file
+    next to the old one and swapping it in with os.replace, so a crash leaves
+    either the old or the new file, never a half-written one.
+
+    Readers keep the parsed state and only read the bytes appended since the
+    last look; a replaced file (compaction by another process) is re-read.
+    A line without its final newline is not read yet (it may still be being
+    written); lines without a checksum or failing it are skipped and counted in
+    corrupt_lines.
+
+    Writers (several processes or stations on a shared folder) take the
+    FileLock, append each batch with one os.write on an O_APPEND descriptor
+    and fsync it before releasing. A torn tail left by a writer that died
+    mid-write is closed with a newline first, so it cannot swallow the next
+    record.
+    """
+
+    def __init__(self, path, compact_ratio=COMPACT_TOMBSTONE_RATIO, readonly=False):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()  # Siempre antes que _file_lock
+        self._file_lock = FileLock(path + ".lock")
+        self._compactor = None
+        self._reset_state()
+        with self._lock:
+            # Solo lectura: sin encabezado ni "<archivo>.lock" (leer nunca toma el bloqueo)
+            if not readonly and (not os.path.exists(path) or os.path.getsize(path) == 0):
+                with self._file_lock:
+                    if not os.path.exists(path) or os.path.getsize(path) == 0:
+                        self._write((JOURNAL_HEADER + "\n").encode(JOURNAL_ENCODING))
+            # La lectura inicial no necesita el bloqueo: solo se leen líneas completas
+            self._sync()
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def _reset_state(self):
+        self._records = {}  # id -> registro vivo
+        self._deleted = set()
+        self._meta = {}
+        self._record_lines = 0
+        self._tombstone_lines = 0
+        self._offset = 0
+        self._file_id = None
+        self._sorted = None
+        self.corrupt_lines = 0
+        self._version = getattr(self, "_version", 0) + 1
+
+    # Lectura del archivo ----------------------------------------------------
+    def _sync(self):
+        """Aplica lo agregado al archivo desde la última lectura (todo, si el archivo fue reemplazado)."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        file_id = None if st is None else (st.st_dev, st.st_ino)
+        size = 0 if st is None else st.st_size
+        if file_id != self._file_id or size < self._offset:
+            self._reset_state()
+            self._file_id = file_id
+        if size > self._offset:
+            self._read_from(self._offset)
+
+    def _read_from(self, offset):
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+        # Solo líneas completas: una línea sin "\n" todavía se está escribiendo
+        end = data.rfind(b"\n") + 1
+        changed = False
+        for line in data[:end].splitlines():
+            changed |= self._apply(line)
+        self._offset = offset + end
+        if changed:
+            self._sorted = None
+            self._version += 1
+
+    def _apply(self, line):
+        line = line.strip()
+        if not line or line.startswith(b"#"):
+            return False
+        entry = _decode_line(line)
+        if entry is None:
+            self.corrupt_lines += 1
+            return False
+        op = entry[0]
+        if op == "A" and len(entry) >= 2 + len(RECORD_FIELDS):
+            self._record_lines += 1
+            record_id = entry[1]
+            if record_id in self._deleted:
+                return False
+            self._records[record_id] = make_record(*entry[2:2 + len(RECORD_FIELDS)], record_id=record_id)
+            return True
+        if op == "D" and len(entry) >= 2:
+            self._tombstone_lines += 1
+            self._deleted.add(entry[1])
+            return self._records.pop(entry[1], None) is not None
+        if op == "M" and len(entry) >= 3:
+            self._meta[entry[1]] = entry[2]
+        return False
+
+    def _write(self, data):
+        # Una sola escritura en modo O_APPEND + fsync antes de soltar el bloqueo
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            _write_all(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _append(self, entries):
+        data = b"".join(_encode_line(e) for e in entries)
+        with self._lock, self._file_lock:
+            self._sync()
+            # Con el bloqueo tomado nadie está escribiendo: bytes sin "\n" al final son un registro cortado
+            try:
+                torn = os.path.getsize(self.path) > self._offset
+            except FileNotFoundError:
+                torn = False
+            self._write(b"\n" + data if torn else data)
+            # Lo propio (y lo ajeno que haya entrado antes) se aplica leyendo la cola del archivo
+            self._sync()
+
+    @staticmethod
+    def _record_entry(record):
+        return ["A", record["id"]] + [record.get(key) for key in RECORD_FIELDS]
+
+    def _sorted_records(self):
+        self._sync()
+        if self._sorted is None:
+            self._sorted = sorted(self._records.values(), key=_record_sort_key)
+        return self._sorted
+
+    # Escritura -----------------------------------------------------------
+    def add(self, record):
+        """Guarda un registro y devuelve su ID estable."""
+        if record.get("id") is None:
+            record["id"] = uuid.uuid4().hex
+        self._append([self._record_entry(record)])
+        return record["id"]
+
+    def add_many(self, records):
+        entries = []
+        for record in records:
+            if record.get("id") is None:
+                record["id"] = uuid.uuid4().hex
+            entries.append(self._record_entry(record))
+        if entries:
+            self._append(entries)
+        return len(entries)
+
+    def delete(self, record_id):
+        # Verificación y lápida bajo el bloqueo de archivo: si dos procesos borran el mismo ID,
+        # el segundo ya lee la lápida del primero y devuelve False
+        with self._lock, self._file_lock:
+            self._sync()
+            if record_id not in self._records:
+                return False
+            self._append([["D", record_id]])
+        self.compact_in_background()
+        return True
+
+    # Lectura -------------------------------------------------------------
+    def signature(self):
+        """Versión del contenido: cambia con altas y bajas (propias o de otro proceso), no al compactar."""
+        with self._lock:
+            self._sync()
+            return self._version
+
+    def get(self, record_id):
+        with self._lock:
+            self._sync()
+            record = self._records.get(record_id)
+        return dict(record) if record is not None else None
+
+    def count(self):
+        with self._lock:
+            self._sync()
+            return len(self._records)
+
+    def fetch_page(self, offset, limit):
+        """Registros [offset, offset + limit) en orden cronológico."""
+        with self._lock:
+            return [dict(r) for r in self._sorted_records()[offset:offset + limit]]
+
+    def find_by_dni(self, dni):
+        dni = str(dni).strip()
+        with self._lock:
+            return [dict(r) for r in self._sorted_records() if r["dni"] == dni]
+
+    def all_records(self):
+        with self._lock:
+            return [dict(r) for r in self._sorted_records()]
+
+    def iter_records(self, batch_size=5000):
+        with self._lock:
+            records = self._sorted_records()
+        for start in range(0, len(records), batch_size):
+            for r in records[start:start + batch_size]:
+                yield dict(r)
+
+    # Meta ----------------------------------------------------------------
+    def get_meta(self, key, default=None):
+        with self._lock:
+            self._sync()
+            return self._meta.get(key, default)
+
+    def set_meta(self, key, value):
+        self._append([["M", key, str(value)]])
+
+    # Compactación --------------------------------------------------------
+    def tombstone_ratio(self):
+        with self._lock:
+            self._sync()
+            lines = self._record_lines + self._tombstone_lines
+            return self._tombstone_lines / lines if lines else 0.0
+
+    def needs_compaction(self):
+        return self._tombstone_lines >= COMPACT_MIN_TOMBSTONES and self.tombstone_ratio() >= self.compact_ratio
+
+    def compact(self, force=False):
+        """Reescribe el archivo sin registros borrados ni lápidas. Devuelve True si lo reemplazó."""
+        with self._lock, self._file_lock:
+            self._sync()
+            if not force and not self.needs_compaction():
+                return False
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            parts = [(JOURNAL_HEADER + "\n").encode(JOURNAL_ENCODING)]
+            parts += [_encode_line(["M", k, v]) for k, v in self._meta.items()]
+            parts += [_encode_line(self._record_entry(r)) for r in self._sorted_records()]
+            try:
+                with open(tmp_path, "wb") as file:
+                    file.write(b"".join(parts))
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError:
+                # El diario queda como estaba (p. ej. os.replace rechazado en Windows / SMB)
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            _fsync_dir(self.path)
+            st = os.stat(self.path)
+            self._file_id = (st.st_dev, st.st_ino)
+            self._offset = st.st_size
+            self._record_lines = len(self._records)
+            self._tombstone_lines = 0
+            self._deleted.clear()
+            self.corrupt_lines = 0
+            return True
+
+    def import_legacy_csv_once(self, path):
+        # Con el bloqueo tomado: dos estaciones que arrancan juntas no importan el CSV dos veces
+        with self._lock, self._file_lock:
+            return super().import_legacy_csv_once(path)
+
+    def compact_in_background(self):
+        """Lanza compact() en un hilo si hace falta y no hay otra compactación en curso."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return False
+            if not self.needs_compaction():
+                return False
+            self._compactor = threading.Thread(target=self._compact_quietly, name="compactar-mediciones", daemon=True)
+            self._compactor.start()
+            return True
+
+    def _compact_quietly(self):
+        # En segundo plano nadie espera el resultado: el error se informa y el diario sigue sin compactar
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Error al compactar {self.path}: {e}", file=sys.stderr)
+
+
+def open_store(path, readonly=False):
+    """
+    SQLite para .db / .sqlite; cualquier otra extensión usa el diario de solo agregado.
+    Con readonly=True la base tiene que existir y nunca se escribe (historial de otra estación).
+    """
+    if readonly and not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3"):
+        return MeasurementStore(path, readonly)
+    return MeasurementJournal(path, readonly=readonly)
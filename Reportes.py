@@ -0,0 +1,558 @@
+"""
+REPORTES.PY
+PDF measurement reports (ReportLab, no Qt).
+
+- report_text(record, status): report body, as shown in the preview dialog
+- draw_report / write_report: one A4 page per measurement: logo, text and
+  vector graphics drawn straight into the canvas (representative
+  proximal/distal beats of the saved recording, the patient's point on the
+  crPWV-vs-age reference band, and the patient's crPWV trend)
+- Saved recordings are read with Mediciones.load_waveform
+- submit_report: one report in a background process (the GUI polls the future)
+- BatchReportExport: many reports rendered in a process pool, either one
+  PDF per measurement in a folder or a single merged PDF. The GUI polls
+  progress from a QTimer and can cancel; it never waits on the workers.
+
+Report items are tuples (record, status, history, waveform): history is the
+patient's [(fecha, edad, pwv)] and waveform the path of the saved recording
+(or None). The decoded logo and the reference-band paths are cached per
+process, so a report takes a few tens of milliseconds.
+
+Kept free of Qt (no FrontEnd / BackEnd imports) so the pool workers only
+load ReportLab, NumPy and the history helpers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import lru_cache
+import multiprocessing
+import os
+import queue
+import re
+
+import numpy as np
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.pdfgen.pathobject import PDFPathObject
+
+from Historial import (
+    STATUS_ABNORMAL, STATUS_NORMAL, CRPWV_AGE_COEF, CRPWV_CENTER,
+    classify_crpwv, crpwv_bounds_for_age, format_fecha, parse_epochs, INVALID_EPOCH,
+)
+from Mediciones import format_value, load_waveform
+
+
+# Campos del reporte, en el orden de la tabla del historial
+REPORT_KEYS = ("dni", "nombre", "apellido", "edad", "altura", "sexo", "hr", "pwv")
+
+# Reportes por tarea del pool al exportar a una carpeta
+BATCH_CHUNK = 25
+BATCH_MAX_WORKERS = 4
+
+
+# ==============================================================================
+# UN REPORTE
+# ==============================================================================
+def report_text(record, status):
+    fecha_hora = format_fecha(record["fecha"])
+    dni, nombre, apellido, edad, altura, sexo, hr, pwv = (format_value(record, key) for key in REPORT_KEYS)
+    observaciones = record.get("observaciones") or ""
+
+    # Estado con criterio dinámico por edad (Historial.classify_crpwv)
+    pwv_status = {STATUS_NORMAL: " (Normal)", STATUS_ABNORMAL: " (Anormal)"}.get(status, "")
+
+    text = f"""
+
+Fecha y Hora: {fecha_hora}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+DATOS DEL PACIENTE:
+  • Nombre y Apellido: {nombre} {apellido}
+  • DNI: {dni}
+  • Edad: {edad}
+  • Altura: {altura}
+  • Sexo: {sexo}
+
+  
+RESULTADOS DE LA MEDICIÓN:
+  • HR: {hr} bpm
+  • crPWV: {pwv} m/s{pwv_status}
+
+"""
+    # Agregar observaciones solo si existen
+    if observaciones.strip():
+        text += f"""
+OBSERVACIONES:
+  {observaciones}
+"""
+
+    text += """
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+        """
+    return text
+
+
+# ==============================================================================
+# LATIDOS REPRESENTATIVOS
+# ==============================================================================
+def representative_beats(proximal, distal, fs):
+    """
+    Latido promedio de cada canal, alineado en los picos del proximal.
+    Devuelve (t en s relativo al pico, proximal, distal, latidos) o None.
+    """
+    n = min(len(proximal), len(distal))
+    if n < 2 * fs:
+        return None
+    p = np.asarray(proximal[:n], dtype=float)
+    d = np.asarray(distal[:n], dtype=float)
+
+    # Picos del proximal: máximos locales sobre el percentil 60, separados al menos 0.33 s
+    threshold = np.percentile(p, 60)
+    candidates = np.flatnonzero((p[1:-1] > p[:-2]) & (p[1:-1] >= p[2:]) & (p[1:-1] > threshold)) + 1
+    min_gap = max(1, int(0.33 * fs))
+    peaks = []
+    for i in candidates:
+        if peaks and i - peaks[-1] < min_gap:
+            if p[i] > p[peaks[-1]]:
+                peaks[-1] = i
+            continue
+        peaks.append(i)
+    if len(peaks) < 3:
+        return None
+
+    period = int(np.median(np.diff(peaks)))
+    before = int(0.35 * period)
+    after = period - before
+    peaks = np.array([i for i in peaks if i - before >= 0 and i + after <= n])
+    if len(peaks) < 2:
+        return None
+    offsets = np.arange(-before, after)
+    window = peaks[:, None] + offsets[None, :]
+    return offsets / fs, p[window].mean(axis=0), d[window].mean(axis=0), len(peaks)
+
+
+# ==============================================================================
+# GRÁFICOS VECTORIALES
+# ==============================================================================
+GRID_GRAY = (0.85, 0.85, 0.85)
+AXIS_GRAY = (0.35, 0.35, 0.35)
+PROXIMAL_COLOR = (0.13, 0.59, 0.95)
+DISTAL_COLOR = (0.96, 0.26, 0.21)
+NORMAL_COLOR = (0.30, 0.69, 0.31)
+ABNORMAL_COLOR = (0.96, 0.26, 0.21)
+BAND_COLOR = (0.30, 0.69, 0.31)
+
+REFERENCE_AGES = (10.0, 100.0)
+REFERENCE_PWV = (2.0, 18.0)
+
+
+@lru_cache(maxsize=4)
+def _logo(logo_path, mtime):
+    # Imagen decodificada una sola vez por proceso (mtime invalida la caché si cambia el archivo)
+    return ImageReader(logo_path)
+
+
+def _polyline(xs, ys, closed=False):
+    path = PDFPathObject()
+    path.moveTo(xs[0], ys[0])
+    for x, y in zip(xs[1:], ys[1:]):
+        path.lineTo(x, y)
+    if closed:
+        path.close()
+    return path
+
+
+class _Panel:
+    """Rectángulo de gráfico en la página: ejes, grilla y transformación datos -> puntos."""
+
+    def __init__(self, rect, xlim, ylim):
+        self.x, self.y, self.w, self.h = rect
+        self.xlim, self.ylim = xlim, ylim
+
+    def px(self, values):
+        return self.x + (np.asarray(values, dtype=float) - self.xlim[0]) / (self.xlim[1] - self.xlim[0]) * self.w
+
+    def py(self, values):
+        return self.y + (np.asarray(values, dtype=float) - self.ylim[0]) / (self.ylim[1] - self.ylim[0]) * self.h
+
+    def draw_axes(self, c, title, xticks, yticks, xlabel="", ylabel=""):
+        c.saveState()
+        c.setLineWidth(0.4)
+        c.setStrokeColorRGB(*GRID_GRAY)
+        c.setFillColorRGB(*AXIS_GRAY)
+        c.setFont("Helvetica", 7)
+        for value, label in yticks:
+            y = float(self.py(value))
+            c.line(self.x, y, self.x + self.w, y)
+            c.drawRightString(self.x - 3, y - 2.5, label)
+        for value, label in xticks:
+            x = float(self.px(value))
+            c.line(x, self.y, x, self.y + self.h)
+            c.drawCentredString(x, self.y - 9, label)
+        if xlabel:
+            c.drawCentredString(self.x + self.w / 2, self.y - 18, xlabel)
+        if ylabel:
+            c.saveState()
+            c.translate(self.x - 20, self.y + self.h / 2)
+            c.rotate(90)
+            c.drawCentredString(0, 0, ylabel)
+            c.restoreState()
+        c.setStrokeColorRGB(*AXIS_GRAY)
+        c.rect(self.x, self.y, self.w, self.h, stroke=1, fill=0)
+        c.setFont("Helvetica-Bold", 9)
+        c.setFillColorRGB(0, 0, 0)
+        c.drawString(self.x, self.y + self.h + 5, title)
+        c.restoreState()
+
+    def clip(self, c):
+        path = c.beginPath()
+        path.rect(self.x, self.y, self.w, self.h)
+        c.clipPath(path, stroke=0, fill=0)
+
+    def message(self, c, text):
+        c.saveState()
+        c.setFont("Helvetica-Oblique", 9)
+        c.setFillColorRGB(*AXIS_GRAY)
+        c.drawCentredString(self.x + self.w / 2, self.y + self.h / 2, text)
+        c.restoreState()
+
+
+def _draw_points(c, xs, ys, statuses, radius=2.2):
+    for x, y, status in zip(xs, ys, statuses):
+        c.setFillColorRGB(*(NORMAL_COLOR if status == STATUS_NORMAL else ABNORMAL_COLOR))
+        c.circle(float(x), float(y), radius, stroke=0, fill=1)
+
+
+def _draw_beats(c, rect, waveform):
+    beats = None
+    if waveform and os.path.exists(waveform):
+        beats = representative_beats(*load_waveform(waveform))
+    xlim = (beats[0][0], beats[0][-1]) if beats else (-0.35, 0.65)
+    panel = _Panel(rect, xlim, (-100.0, 100.0))
+    ticks = [(t, f"{t:.1f}") for t in np.arange(np.ceil(xlim[0] * 5) / 5, xlim[1], 0.2)]
+    title = f"Latido representativo ({beats[3]} latidos promediados)" if beats else "Latido representativo"
+    panel.draw_axes(c, title, ticks, [(v, str(v)) for v in (-100, 0, 100)], "Tiempo desde el pico proximal (s)")
+    if not beats:
+        panel.message(c, "Sin registro de la señal para esta medición")
+        return
+
+    t, proximal, distal, _ = beats
+    c.saveState()
+    panel.clip(c)
+    c.setLineWidth(1.4)
+    for values, color in ((proximal, PROXIMAL_COLOR), (distal, DISTAL_COLOR)):
+        c.setStrokeColorRGB(*color)
+        c.drawPath(_polyline(panel.px(t), panel.py(values)), stroke=1, fill=0)
+    c.restoreState()
+
+    c.saveState()
+    c.setFont("Helvetica", 7)
+    for i, (label, color) in enumerate((("Proximal", PROXIMAL_COLOR), ("Distal", DISTAL_COLOR))):
+        y = panel.y + panel.h - 10 - 9 * i
+        c.setStrokeColorRGB(*color)
+        c.setLineWidth(1.4)
+        c.line(panel.x + panel.w - 60, y + 2, panel.x + panel.w - 48, y + 2)
+        c.drawString(panel.x + panel.w - 44, y, label)
+    c.restoreState()
+
+
+@lru_cache(maxsize=8)
+def _reference_paths(rect):
+    # Curvas de referencia en coordenadas de página: iguales en todos los reportes
+    panel = _Panel(rect, REFERENCE_AGES, REFERENCE_PWV)
+    ages = np.linspace(REFERENCE_AGES[0], REFERENCE_AGES[1], 91)
+    lower, upper = crpwv_bounds_for_age(ages)
+    xs = panel.px(ages)
+    band = _polyline(np.concatenate([xs, xs[::-1]]), np.concatenate([panel.py(upper), panel.py(lower)[::-1]]), closed=True)
+    center = _polyline(xs, panel.py(CRPWV_CENTER * np.exp(CRPWV_AGE_COEF * ages)))
+    return band, _polyline(xs, panel.py(lower)), _polyline(xs, panel.py(upper)), center
+
+
+def _draw_reference(c, rect, record, status):
+    panel = _Panel(rect, REFERENCE_AGES, REFERENCE_PWV)
+    panel.draw_axes(c, "crPWV vs edad (zona normal)",
+                    [(a, str(a)) for a in range(20, 101, 20)], [(v, str(v)) for v in range(4, 19, 4)],
+                    "Edad (años)", "crPWV (m/s)")
+    band, lower, upper, center = _reference_paths(rect)
+    c.saveState()
+    panel.clip(c)
+    c.setFillColorRGB(*BAND_COLOR)
+    c.setFillAlpha(0.18)
+    c.drawPath(band, stroke=0, fill=1)
+    c.setFillAlpha(1)
+    c.setLineWidth(0.8)
+    c.setStrokeColorRGB(*ABNORMAL_COLOR)
+    c.setDash(3, 2)
+    c.drawPath(lower, stroke=1, fill=0)
+    c.drawPath(upper, stroke=1, fill=0)
+    c.setStrokeColorRGB(*NORMAL_COLOR)
+    c.drawPath(center, stroke=1, fill=0)
+    c.setDash()
+    if record.get("edad") is not None and record.get("pwv") is not None:
+        x, y = float(panel.px(record["edad"])), float(panel.py(record["pwv"]))
+        _draw_points(c, [x], [y], [status], radius=4)
+        c.setStrokeColorRGB(0, 0, 0)
+        c.circle(x, y, 4, stroke=1, fill=0)
+    c.restoreState()
+
+
+def _draw_trend(c, rect, record, history):
+    history = [h for h in history or () if h[2] is not None] or [(record["fecha"], record.get("edad"), record.get("pwv"))]
+    epochs = parse_epochs([h[0] for h in history])
+    ok = (epochs != INVALID_EPOCH) & np.array([h[2] is not None for h in history])
+    if not ok.any():
+        panel = _Panel(rect, (0.0, 1.0), REFERENCE_PWV)
+        panel.draw_axes(c, "Tendencia de crPWV del paciente", [], [(v, str(v)) for v in range(4, 19, 4)])
+        panel.message(c, "Sin mediciones con fecha y crPWV")
+        return
+
+    epochs = epochs[ok].astype(float)
+    ages = np.array([np.nan if h[1] is None else h[1] for h, keep in zip(history, ok) if keep], dtype=float)
+    pwv = np.array([h[2] for h, keep in zip(history, ok) if keep], dtype=float)
+    lower, upper, status = classify_crpwv(ages, pwv)
+
+    day = 86400.0
+    pad = max(day, 0.04 * (epochs.max() - epochs.min()))
+    x0, x1 = epochs.min() - pad, epochs.max() + pad
+    ys = np.concatenate([pwv, lower[np.isfinite(lower)], upper[np.isfinite(upper)]])
+    y0, y1 = np.floor(ys.min() - 1), np.ceil(ys.max() + 1)
+    panel = _Panel(rect, (x0, x1), (y0, y1))
+    step = max(1, int(np.ceil((y1 - y0) / 5)))
+    tick_epochs = np.linspace(epochs.min(), epochs.max(), 3) if epochs.max() - epochs.min() > 2 * day else epochs[:1]
+    xticks = [(e, datetime.fromtimestamp(e, timezone.utc).strftime("%d/%m/%y")) for e in tick_epochs]
+    panel.draw_axes(c, f"Tendencia de crPWV del paciente ({len(pwv)} mediciones)", xticks,
+                    [(v, str(int(v))) for v in np.arange(y0, y1 + 0.5, step)], "", "crPWV (m/s)")
+
+    c.saveState()
+    panel.clip(c)
+    xs, ys = panel.px(epochs), panel.py(pwv)
+    known = np.isfinite(lower)
+    if known.sum() >= 2:
+        bx = xs[known]
+        band = _polyline(np.concatenate([bx, bx[::-1]]),
+                         np.concatenate([panel.py(upper[known]), panel.py(lower[known])[::-1]]), closed=True)
+        c.setFillColorRGB(*BAND_COLOR)
+        c.setFillAlpha(0.18)
+        c.drawPath(band, stroke=0, fill=1)
+        c.setFillAlpha(1)
+    if len(xs) >= 2:
+        c.setStrokeColorRGB(*AXIS_GRAY)
+        c.setLineWidth(0.8)
+        c.drawPath(_polyline(xs, ys), stroke=1, fill=0)
+    _draw_points(c, xs, ys, status)
+
+    # Medición del reporte resaltada
+    current = np.flatnonzero(epochs == float(parse_epochs([record["fecha"]])[0]))
+    if len(current):
+        c.setStrokeColorRGB(0, 0, 0)
+        c.setLineWidth(1)
+        c.circle(float(xs[current[-1]]), float(ys[current[-1]]), 4, stroke=1, fill=0)
+    c.restoreState()
+
+
+def _draw_graphics(c, top, record, status, history, waveform):
+    width, _ = A4
+    left, right = 70, width - 40
+    gap = 50
+    beats_height = min(160.0, (top - 60 - gap) * 0.45)
+    bottom_height = min(200.0, top - beats_height - gap - 60)
+    _draw_beats(c, (left, top - beats_height, right - left, beats_height), waveform)
+    half = (right - left - gap) / 2
+    bottom = top - beats_height - gap - bottom_height
+    _draw_reference(c, (left, bottom, half, bottom_height), record, status)
+    _draw_trend(c, (left + half + gap, bottom, half, bottom_height), record, history)
+
+
+# ==============================================================================
+# UN REPORTE
+# ==============================================================================
+# Alto mínimo para los gráficos bajo el texto; si no entran van en una segunda página
+GRAPHICS_MIN_HEIGHT = 300
+
+
+def draw_report(c, item, logo_path=None):
+    """Dibuja el reporte de item = (registro, estado, historial, señal) en el canvas c."""
+    record, status, history, waveform = item
+    width, height = A4
+
+    # ================= LOGO =================
+    if logo_path and os.path.exists(logo_path):
+        logo_width = 140
+        logo_height = 60
+        x_centered = (width - logo_width) / 2
+
+        c.drawImage(
+            _logo(logo_path, os.path.getmtime(logo_path)),
+            x=x_centered,
+            y=height - 100,
+            width=logo_width,
+            height=logo_height,
+            preserveAspectRatio=True,
+            mask='auto'
+        )
+
+    # ================= TÍTULO =================
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width / 2, height - 160, "REPORTE DE MEDICIÓN")
+
+    # ================= TEXTO =================
+    margen_izquierdo = 140
+    text_object = c.beginText(margen_izquierdo, height - 200)
+    text_object.setFont("Helvetica", 11)
+    text_object.setLeading(14)
+
+    lines = report_text(record, status).strip().split("\n")
+    for line in lines:
+        text_object.textLine(line)
+
+    c.drawText(text_object)
+
+    # ================= GRÁFICOS =================
+    top = height - 200 - 14 * len(lines) - 20
+    if top < GRAPHICS_MIN_HEIGHT:
+        c.showPage()
+        top = height - 60
+    _draw_graphics(c, top, record, status, history, waveform)
+    c.showPage()
+
+
+def write_report(path, item, logo_path=None):
+    c = canvas.Canvas(path, pagesize=A4)
+    draw_report(c, item, logo_path)
+    c.save()
+
+
+# Proceso para reportes sueltos: se reutiliza, así conserva en caché el logo y las curvas
+_report_pool = None
+
+
+def submit_report(path, item, logo_path=None):
+    """Genera un reporte en segundo plano. Devuelve un Future (la GUI lo consulta con un QTimer)."""
+    global _report_pool
+    for _ in range(2):
+        if _report_pool is None:
+            _report_pool = ProcessPoolExecutor(max_workers=1)
+        try:
+            return _report_pool.submit(write_report, path, item, logo_path)
+        except BrokenProcessPool:
+            _report_pool = None
+    raise RuntimeError("No se pudo iniciar el proceso de reportes")
+
+
+def report_filename(record):
+    """Nombre de archivo: fecha, DNI y apellido (sin caracteres inválidos en Windows)."""
+    fecha = re.sub(r"[^0-9]", "", record["fecha"])[:14]
+    name = f"{fecha[:8]}_{fecha[8:]}_{record['dni']}_{record['apellido']}".strip("_")
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", name) or "reporte"
+
+
+# ==============================================================================
+# EXPORTACIÓN POR LOTES (pool de procesos)
+# ==============================================================================
+# Estado de cada proceso del pool, recibido al crearlo (initializer)
+_worker_progress = None
+_worker_cancel = None
+
+
+def _init_worker(progress, cancel):
+    global _worker_progress, _worker_cancel
+    _worker_progress = progress
+    _worker_cancel = cancel
+
+
+def _render_files(jobs, logo_path):
+    written = 0
+    for path, item in jobs:
+        if _worker_cancel.is_set():
+            break
+        write_report(path, item, logo_path)
+        written += 1
+        _worker_progress.put(1)
+    return written
+
+
+def _render_merged(path, items, logo_path):
+    # El canvas escribe el archivo recién en save(): si se cancela no queda nada a medias
+    c = canvas.Canvas(path, pagesize=A4)
+    for item in items:
+        if _worker_cancel.is_set():
+            return 0
+        draw_report(c, item, logo_path)
+        _worker_progress.put(1)
+    c.save()
+    return len(items)
+
+
+class BatchReportExport:
+    """
+    items: [(registro, estado, historial, señal)]. Con merged=False destination es una carpeta
+    (un PDF por medición); con merged=True es la ruta del PDF único.
+    Uso desde la GUI: poll() en un QTimer hasta finished(), luego close().
+    """
+
+    def __init__(self, items, destination, merged=False, logo_path=None, workers=None):
+        self.total = len(items)
+        self.done = 0
+        self.cancelled = False
+        self._progress = multiprocessing.Queue()
+        self._cancel = multiprocessing.Event()
+
+        if merged:
+            workers = 1
+        else:
+            workers = workers or min(BATCH_MAX_WORKERS, os.cpu_count() or 1)
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(self._progress, self._cancel))
+
+        if merged:
+            self._futures = [self._pool.submit(_render_merged, destination, items, logo_path)]
+        else:
+            # Textos, gráficos y PDFs se arman en los procesos; acá solo se reparten los registros
+            jobs = list(zip(self._unique_paths(destination, items), items))
+            self._futures = [self._pool.submit(_render_files, jobs[i:i + BATCH_CHUNK], logo_path)
+                             for i in range(0, len(jobs), BATCH_CHUNK)]
+
+    @staticmethod
+    def _unique_paths(folder, items):
+        # Los PDFs que ya están en la carpeta cuentan como usados: no se pisan reportes anteriores
+        try:
+            used = {name[:-4].lower() for name in os.listdir(folder) if name.lower().endswith(".pdf")}
+        except OSError:
+            used = set()
+        paths = []
+        for item in items:
+            base = report_filename(item[0])
+            name, n = base, 1
+            while name.lower() in used:
+                n += 1
+                name = f"{base}_{n}"
+            used.add(name.lower())
+            paths.append(os.path.join(folder, name + ".pdf"))
+        return paths
+
+    def poll(self):
+        """Reportes terminados hasta ahora (no bloquea)."""
+        while True:
+            try:
+                self.done += self._progress.get_nowait()
+            except queue.Empty:
+                return self.done
+
+    def finished(self):
+        return all(f.done() for f in self._futures)
+
+    def cancel(self):
+        self.cancelled = True
+        self._cancel.set()
+        for f in self._futures:
+            f.cancel()
+
+    def close(self):
+        """Cierra el pool y devuelve la cantidad de PDFs / páginas escritas (relanza errores de los procesos)."""
+        try:
+            return sum(f.result() for f in self._futures if not f.cancelled())
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self.poll()
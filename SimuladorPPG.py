@@ -0,0 +1,227 @@
+"""
+SIMULADORPPG.PY
+Synthetic dual-site pulse waveforms (proximal / carotid and distal / radial)
+with exact ground truth, for the simulated device, benchmarks and accuracy
+tests of any PTT / PWV estimator.
+
+- Morphology per site: systolic peak, dicrotic notch and diastolic wave,
+  placed as fractions of each RR interval.
+- Heart rate with variability: respiratory sinus arrhythmia plus random
+  beat-to-beat jitter.
+- Known pulse transit time: the distal channel is the proximal beat train
+  delayed by exactly PTT = distance / PWV, with the carotid-radial distance
+  from the patient height like the firmware (altura * 0.436 / 100).
+- Baseline wander (respiration + slow drift), sensor noise, motion artifacts
+  and sensor-off segments (flat signal and contact flag s1 / s2 in False).
+
+Everything is generated with NumPy on whole arrays: an hour at 1 kHz takes
+a fraction of a second. The same seed gives the same recording.
+"""
+
+import math
+
+import numpy as np
+
+
+# ==============================================================================
+# PARÁMETROS
+# ==============================================================================
+# Fracción del latido (fase 0..1 desde el pie de la onda): centro, ancho y amplitud relativa
+PROXIMAL_MORPHOLOGY = {
+    "systolic": (0.20, 0.065, 1.00),
+    "notch": (0.40, 0.025, -0.18),
+    "diastolic": (0.48, 0.090, 0.42),
+}
+# Radial: sístole más angosta y onda reflejada más marcada; el pico sistólico queda en la
+# misma fase que en la carótida, así el PTT pico a pico también es exacto
+DISTAL_MORPHOLOGY = {
+    "systolic": (0.20, 0.055, 1.00),
+    "notch": (0.38, 0.020, -0.22),
+    "diastolic": (0.46, 0.080, 0.55),
+}
+
+# Nivel de continua y amplitud del pulso en cuentas del ADC (MAX3010x)
+PROXIMAL_LEVEL = (52000.0, 3000.0)
+DISTAL_LEVEL = (48000.0, 2500.0)
+# Sensor sin contacto: luz ambiente, casi plana
+SENSOR_OFF_LEVEL = 300.0
+
+DISTANCE_FACTOR = 0.436  # Distancia carótida-radial = altura * 0.436 (igual que el firmware)
+RESPIRATION_HZ = 0.25
+
+
+def carotid_radial_distance(height_cm):
+    """Distancia de tránsito en metros para una altura en cm, con el factor del firmware."""
+    return float(height_cm) * DISTANCE_FACTOR / 100.0
+
+
+# ==============================================================================
+# LATIDOS
+# ==============================================================================
+def beat_onsets(duration, hr=72.0, hrv=0.04, rsa=0.03, rng=None, start=-2.0):
+    """Instantes (s) del pie de cada latido desde start hasta pasado duration.
+
+    hrv: desvío relativo aleatorio de cada RR; rsa: modulación respiratoria relativa.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    rr0 = 60.0 / float(hr)
+    # Con RR >= 0.3 s alcanza para cubrir todo el intervalo
+    count = int(math.ceil((duration - start) / 0.3)) + 2
+    nominal = start + rr0 * np.arange(count)
+    rr = rr0 * (1.0 + rsa * np.sin(2.0 * np.pi * RESPIRATION_HZ * nominal) + hrv * rng.standard_normal(count))
+    rr = np.clip(rr, 0.3, 2.0)
+    onsets = start + np.concatenate(([0.0], np.cumsum(rr)))
+    return onsets[: int(np.searchsorted(onsets, duration)) + 1]
+
+
+def pulse_shape(phase, morphology):
+    """Onda de un latido evaluada en fase 0..1 (array); pico sistólico ~1."""
+    wave = np.zeros_like(phase)
+    for center, width, amplitude in morphology.values():
+        term = phase - center
+        term *= 1.0 / width
+        np.square(term, out=term)
+        term *= -0.5
+        np.exp(term, out=term)
+        term *= amplitude
+        wave += term
+    return wave
+
+
+def _beat_phase(n, fs, onsets, delay=0.0):
+    # Fase de cada muestra (t = i / fs - delay) dentro de su latido (pie = 0). Los latidos
+    # cubren todo el registro, así que alcanza con repetir cada índice por sus muestras
+    bounds = np.clip(np.ceil((onsets + delay) * fs), 0, n).astype(np.intp)
+    index = np.repeat(np.arange(len(onsets) - 1), np.diff(bounds))
+    phase = np.arange(n) / float(fs)
+    phase -= delay
+    phase -= onsets[index]
+    phase *= (1.0 / np.diff(onsets))[index]
+    return phase
+
+
+# ==============================================================================
+# PERTURBACIONES
+# ==============================================================================
+def _wander(n, fs, rng, amplitude):
+    # Respiración + deriva lenta, con fases aleatorias; varía lento, se calcula a 10 Hz e interpola
+    phases = rng.uniform(0.0, 2.0 * np.pi, 2)
+    coarse = np.arange(int(n / fs * 10.0) + 2) / 10.0
+    slow = amplitude * (np.sin(2.0 * np.pi * RESPIRATION_HZ * coarse + phases[0])
+                        + 0.6 * np.sin(2.0 * np.pi * 0.03 * coarse + phases[1]))
+    return np.interp(np.arange(n) / float(fs), coarse, slow)
+
+
+def _random_segments(duration, per_minute, seconds, rng):
+    count = rng.poisson(per_minute * duration / 60.0) if per_minute > 0 else 0
+    starts = np.sort(rng.uniform(0.0, duration, count))
+    lengths = rng.uniform(seconds[0], seconds[1], count)
+    return [(float(s), float(s + n)) for s, n in zip(starts, lengths)]
+
+
+def _add_artifact(p, d, fs, begin, end, amplitude, rng):
+    # Movimiento: oscilación lenta (1-4 Hz) con escalón, bajo una ventana de Hann
+    i0, i1 = int(begin * fs), min(len(p), int(end * fs))
+    if i1 - i0 < 2:
+        return
+    local = np.arange(i1 - i0) / fs
+    freq = rng.uniform(1.0, 4.0)
+    burst = np.sin(2.0 * np.pi * freq * local + rng.uniform(0.0, 2.0 * np.pi)) + rng.uniform(-1.0, 1.0)
+    burst *= np.hanning(i1 - i0)
+    p[i0:i1] += amplitude * rng.uniform(0.5, 1.5) * burst
+    d[i0:i1] += amplitude * rng.uniform(0.5, 1.5) * burst
+
+
+# ==============================================================================
+# GENERADOR
+# ==============================================================================
+def generate(duration, fs=50, hr=72.0, pwv=8.5, height_cm=170, ptt=None, hrv=0.04, rsa=0.03,
+             wander=0.15, noise=0.01, artifacts_per_min=0.0, artifacts=(), artifact_amplitude=1.5,
+             sensor_off_per_min=0.0, sensor_off=(), seed=0,
+             proximal=PROXIMAL_MORPHOLOGY, distal=DISTAL_MORPHOLOGY):
+    """Registro sintético de duration segundos a fs Hz.
+
+    ptt (s) tiene prioridad sobre pwv; wander, noise y artifact_amplitude son relativos a la
+    amplitud del pulso. artifacts: [(inicio, fin)] en s; sensor_off: [(inicio, fin, "p"|"d"|"pd")].
+    Los *_per_min agregan segmentos aleatorios además de los explícitos.
+
+    Devuelve un dict con los arrays t, p, d, s1, s2 y la verdad de referencia: beats (pies
+    proximales en s), rr, hr, ptt, pwv y distance_m.
+    """
+    rng = np.random.default_rng(seed)
+    distance = carotid_radial_distance(height_cm)
+    if ptt is None:
+        ptt = distance / float(pwv)
+    pwv = distance / float(ptt)
+
+    n = int(round(duration * fs))
+    # Latidos desde antes de t=0 para que la señal distal (demorada) también empiece con pulso
+    onsets = beat_onsets(duration, hr, hrv, rsa, rng, start=-(2.0 + ptt))
+
+    p_dc, p_amp = PROXIMAL_LEVEL
+    d_dc, d_amp = DISTAL_LEVEL
+    p = pulse_shape(_beat_phase(n, fs, onsets), proximal)
+    d = pulse_shape(_beat_phase(n, fs, onsets, delay=ptt), distal)
+    if wander:
+        # Misma respiración en los dos sitios
+        baseline = _wander(n, fs, rng, wander)
+        p += baseline
+        d += baseline
+    if noise:
+        p += noise * rng.standard_normal(n, dtype=np.float32)
+        d += noise * rng.standard_normal(n, dtype=np.float32)
+    p *= p_amp
+    p += p_dc
+    d *= d_amp
+    d += d_dc
+
+    artifact_spans = list(artifacts) + _random_segments(duration, artifacts_per_min, (0.5, 3.0), rng)
+    for begin, end in artifact_spans:
+        _add_artifact(p, d, fs, begin, end, artifact_amplitude * p_amp, rng)
+
+    s1 = np.ones(n, dtype=bool)
+    s2 = np.ones(n, dtype=bool)
+    off_spans = list(sensor_off) + [
+        (begin, end, "pd"[int(rng.integers(2))])
+        for begin, end in _random_segments(duration, sensor_off_per_min, (1.0, 5.0), rng)
+    ]
+    for begin, end, site in off_spans:
+        i0, i1 = int(begin * fs), min(n, int(end * fs))
+        if "p" in site:
+            s1[i0:i1] = False
+            p[i0:i1] = SENSOR_OFF_LEVEL + 5.0 * rng.standard_normal(max(0, i1 - i0))
+        if "d" in site:
+            s2[i0:i1] = False
+            d[i0:i1] = SENSOR_OFF_LEVEL + 5.0 * rng.standard_normal(max(0, i1 - i0))
+
+    inside = (onsets[:-1] >= 0.0) & (onsets[:-1] < duration)
+    rr = np.diff(onsets)[inside]
+    return {
+        "fs": fs,
+        "t": np.arange(n) / float(fs),
+        "p": p,
+        "d": d,
+        "s1": s1,
+        "s2": s2,
+        "beats": onsets[:-1][inside],
+        "rr": rr,
+        "hr": 60.0 / float(np.mean(rr)),
+        "ptt": float(ptt),
+        "pwv": float(pwv),
+        "distance_m": distance,
+        "artifacts": [(float(b), float(e)) for b, e in artifact_spans],
+        "sensor_off": [(float(b), float(e), site) for b, e, site in off_spans],
+    }
+
+
+def packets(recording, metrics=True):
+    """Paquetes JSON (dicts) como los que envía el ESP32, uno por muestra del registro."""
+    hr = int(round(recording["hr"])) if metrics else None
+    pwv = round(recording["pwv"], 2) if metrics else None
+    p = np.round(recording["p"], 1).tolist()
+    d = np.round(recording["d"], 1).tolist()
+    s1 = recording["s1"].tolist()
+    s2 = recording["s2"].tolist()
+    for i in range(len(p)):
+        yield {"c1": True, "c2": True, "s1": s1[i], "s2": s2[i],
+               "p": p[i], "d": d[i], "hr": hr, "pwv": pwv}
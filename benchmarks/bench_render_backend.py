@@ -0,0 +1,125 @@
+"""
+BENCH_RENDER_BACKEND.PY
+Frame time of the signal graphs per rendering backend (QPainter vs OpenGL).
+
+Each backend runs in its own process, because the OpenGL options must be
+set before the QApplication is created. A worker builds a PlotWidget set up
+like graph1 (6 s window, fixed [-100, 100] range), feeds it simulated input
+at the given rate in 20 ms frames, and times setData + a synchronous
+repaint of the viewport.
+
+Uso:
+    python benchmarks/bench_render_backend.py [--frames 300] [--rates 50 250 1000]
+
+Para OpenGL sin placa de video (CI), correr bajo un servidor X con Mesa:
+    xvfb-run -a python benchmarks/bench_render_backend.py
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VIEW_SECONDS = 6.0
+FRAME_SECONDS = 0.020
+
+
+def _worker(backend, rates, frames):
+    if backend == "qpainter":
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    sys.path.insert(0, ROOT)
+
+    from PyQt6.QtWidgets import QApplication
+    import numpy as np
+    import pyqtgraph as pg
+    import FrontEnd
+
+    active = FrontEnd.configure_render_backend(backend)
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    graph = pg.PlotWidget()
+    graph.resize(1200, 350)
+    graph.setBackground('k')
+    graph.showGrid(x=True, y=True)
+    graph.enableAutoRange(axis='y', enable=False)
+    graph.setYRange(-100.0, 100.0, padding=0)
+    curve = graph.plot([], [], pen=pg.mkPen('red', width=2))
+    curve.setClipToView(True)
+    curve.setDownsampling(auto=False)
+    graph.show()
+    app.processEvents()
+
+    viewport = graph.viewport()
+    if active != "qpainter" and hasattr(viewport, "isValid") and not viewport.isValid():
+        return {"backend": backend, "available": False, "reason": "sin contexto OpenGL"}
+
+    results = {"backend": backend, "available": True, "rates": {}}
+    for fs in rates:
+        window = int(round(VIEW_SECONDS * fs))
+        per_frame = max(1, int(round(FRAME_SECONDS * fs)))
+        t = np.arange(window, dtype=float) / fs
+        y = 80.0 * np.sin(2.0 * math.pi * 1.2 * t)
+        samples = []
+        for i in range(frames):
+            t = t + per_frame / fs
+            y = np.roll(y, -per_frame)
+            t0 = time.perf_counter()
+            curve.setData(t, y)
+            graph.setXRange(t[0], t[-1], padding=0)
+            viewport.repaint()
+            app.processEvents()
+            if i >= 10:  # Descartar el calentamiento
+                samples.append(time.perf_counter() - t0)
+        ordered = sorted(samples)
+        results["rates"][str(fs)] = {
+            "points": window,
+            "mean_ms": statistics.fmean(samples) * 1e3,
+            "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1e3,
+        }
+    graph.close()
+    return results
+
+
+def run(backends=("qpainter", "opengl", "opengl-software"), rates=(50, 250, 1000), frames=300):
+    out = []
+    for backend in backends:
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", backend,
+               "--frames", str(frames), "--rates", *[str(r) for r in rates]]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        line = proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else ""
+        try:
+            out.append(json.loads(line))
+        except json.JSONDecodeError:
+            reason = (proc.stderr.strip().splitlines() or ["sin salida"])[-1]
+            out.append({"backend": backend, "available": False, "reason": reason})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--rates", type=int, nargs="+", default=[50, 250, 1000])
+    parser.add_argument("--backends", nargs="+", default=["qpainter", "opengl", "opengl-software"])
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(args.worker, args.rates, args.frames)))
+        return
+
+    print(f"{'backend':<18}{'fs (Hz)':>8}{'puntos':>8}{'media (ms)':>12}{'p95 (ms)':>10}")
+    for res in run(args.backends, args.rates, args.frames):
+        if not res.get("available"):
+            print(f"{res['backend']:<18}  no disponible: {res.get('reason', '')}")
+            continue
+        for fs, r in res["rates"].items():
+            print(f"{res['backend']:<18}{fs:>8}{r['points']:>8}{r['mean_ms']:>12.2f}{r['p95_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
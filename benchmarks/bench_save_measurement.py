@@ -0,0 +1,114 @@
+"""
+BENCH_SAVE_MEASUREMENT.PY
+Latency of one save_measurement write on each measurement store.
+
+Times what MainScreen does when a measurement is saved: one record through
+the history repository (store write + in-memory update), on top of a history
+of --history records. For the journal this includes the advisory lock, the
+single append, fsync and reading back the tail. With --writers N, N processes
+save at the same time on the same file (lock contention between stations).
+
+Exits with status 1 if the p95 of the journal exceeds --limit-ms (10 ms).
+
+Uso:
+    python benchmarks/bench_save_measurement.py [--saves 200] [--history 10000]
+        [--writers 1] [--dir CARPETA_COMPARTIDA] [--limit-ms 10]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Historial import MeasurementRepository
+from Mediciones import make_record, open_store
+
+
+def _record(i, writer=0):
+    return make_record(
+        f"2026-01-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{i % 60:02d}",
+        str(30000000 + i), f"Nombre{writer}", f"Apellido{i % 500}",
+        20 + i % 60, 150 + i % 40, "Femenino" if i % 2 else "Masculino",
+        60 + i % 40, 5.0 + (i % 70) / 10, "",
+    )
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "saves": len(samples),
+        "p50_ms": statistics.median(samples) * 1e3,
+        "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1e3,
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+def _time_saves(path, saves, writer=0, results=None):
+    repository = MeasurementRepository(open_store(path))
+    repository.count()  # Historial ya cargado, como después de abrir la pantalla
+    samples = []
+    for i in range(saves):
+        record = _record(i, writer)
+        t0 = time.perf_counter()
+        repository.add(record)
+        samples.append(time.perf_counter() - t0)
+    repository.store.close()
+    if results is not None:
+        results.put(samples)
+    return samples
+
+
+def run(saves=200, history=10000, writers=1, directory=None, stores=("journal", "sqlite")):
+    workdir = tempfile.mkdtemp(prefix="stiffio-bench-", dir=directory)
+    out = {}
+    try:
+        for kind in stores:
+            path = os.path.join(workdir, "mediciones.jsonl" if kind == "journal" else "mediciones.db")
+            seed = open_store(path)
+            seed.add_many([_record(i) for i in range(history)])
+            seed.close()
+
+            if writers <= 1:
+                samples = _time_saves(path, saves)
+            else:
+                queue = multiprocessing.Queue()
+                procs = [multiprocessing.Process(target=_time_saves, args=(path, saves, w, queue))
+                         for w in range(writers)]
+                for p in procs:
+                    p.start()
+                samples = [s for _ in procs for s in queue.get()]
+                for p in procs:
+                    p.join()
+            out[kind] = _summary(samples)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saves", type=int, default=200)
+    parser.add_argument("--history", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--dir", default=None, help="carpeta donde probar (p. ej. la unidad de red)")
+    parser.add_argument("--limit-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    results = run(args.saves, args.history, args.writers, args.dir)
+    print(f"{'store':<10}{'guardados':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'max (ms)':>10}")
+    for kind, r in results.items():
+        print(f"{kind:<10}{r['saves']:>10}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+    if results["journal"]["p95_ms"] > args.limit_ms:
+        print(f"FALLA: p95 del diario por encima de {args.limit_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+BENCH_SOAK.PY
+Long-running soak test: memory growth, queue drops and latency drift over
+many patient cycles, headless.
+
+A simulated device thread feeds ComunicacionMax exactly like the WebSocket
+thread does (on_open, then one on_message JSON packet per sample at --rate
+Hz, with sensor flags, HR and crPWV; the waveform is a SimuladorPPG
+recording played in a loop). The main thread runs patient cycles
+of --cycle seconds, alternating (--mode both) or only one of:
+- processor: SignalProcessor start_session / process_all + get_signals
+  every 20 ms / stop_session + clear_buffers
+- qt: offscreen MainScreen in the app window: show_screen(MainScreen),
+  toggle_measurement, update_plot every 20 ms, end of session and back to
+  the patient data screen
+
+Per cycle it records:
+- RSS (psutil, or /proc/self/statm) and tracemalloc traced memory
+- samples dropped by the full pending queue of ComunicacionMax during the session
+- playback lag: seconds of received samples not yet drawn (pending queue +
+  processor input queue), averaged over the second half of the cycle
+- frame time of the 20 ms tick (mean and p95)
+
+After --warmup cycles each series gets a least-squares line. The run fails
+(exit status 1) if the line rises over the run by more than the absolute
+floor of the metric and --tolerance of its median. The top tracemalloc
+growth between the end of warm-up and the end of the run is reported.
+
+Uso:
+    python benchmarks/bench_soak.py [--hours 4] [--cycle 60] [--mode both] [--json soak.json]
+    python benchmarks/bench_soak.py --minutes 10 --cycle 40   # corrida corta
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import ComunicacionMax
+import SimuladorPPG
+from BackEnd import processor
+
+
+PATIENT = {
+    "nombre": "Soak",
+    "apellido": "Stiffio",
+    "dni": "00000000",
+    "edad": "45",
+    "altura": "170",
+    "sexo": "Masculino",
+    "observaciones": "",
+}
+
+TICK_SECONDS = 0.020
+
+# Suba mínima (a lo largo de la corrida) para considerar que una serie crece
+TREND_FLOORS = {
+    "rss_mb": 8.0,
+    "traced_mb": 2.0,
+    "dropped": 0.5,
+    "lag_s": 0.25,
+    "frame_ms": 1.0,
+    "frame_p95_ms": 2.0,
+}
+
+
+# ==============================================================================
+# DISPOSITIVO SIMULADO
+# ==============================================================================
+class SimulatedDevice(threading.Thread):
+    """Envía paquetes como el ESP32, llamando a ComunicacionMax.on_message desde su propio hilo."""
+
+    def __init__(self, rate=50, hr=72, pwv=8.5, seed=0, loop_seconds=300):
+        super().__init__(daemon=True)
+        self.rate = rate
+        self.hr = hr
+        self.pwv = pwv
+        self.sent = 0
+        # Registro sintético que se repite en forma circular durante toda la corrida
+        recording = SimuladorPPG.generate(loop_seconds, fs=rate, hr=hr, pwv=pwv, seed=seed)
+        self._packets = [json.dumps(packet) for packet in SimuladorPPG.packets(recording)]
+        self._stop_event = threading.Event()
+
+    def run(self):
+        ComunicacionMax.on_open(None)
+        period = 1.0 / self.rate
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            ComunicacionMax.on_message(None, self._packets[self.sent % len(self._packets)])
+            self.sent += 1
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            elif delay < -1.0:
+                next_time = time.monotonic()  # Muy atrasado: seguir sin ráfaga de recuperación
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# ==============================================================================
+# MEDICIONES DEL PROCESO
+# ==============================================================================
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return float("nan")
+
+
+def playback_lag_seconds():
+    pending = min(len(ComunicacionMax.pending_proximal), len(ComunicacionMax.pending_distal))
+    queued = min(len(processor._input_prox), len(processor._input_dist))
+    return (pending + queued) / processor.fs
+
+
+def dropped_samples():
+    return ComunicacionMax.get_snapshot(include_stream=False)["dropped"]
+
+
+# ==============================================================================
+# CICLOS DE PACIENTE
+# ==============================================================================
+def _run_ticks(seconds, tick):
+    frames = []
+    lags = []
+    start = time.monotonic()
+    deadline = start + seconds
+    next_tick = start
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        t0 = time.perf_counter()
+        tick()
+        frames.append(time.perf_counter() - t0)
+        if now - start >= seconds / 2:
+            lags.append(playback_lag_seconds())
+        next_tick += TICK_SECONDS
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.monotonic()
+    return frames, lags
+
+
+def processor_cycle(seconds):
+    ComunicacionMax.reset_stream_buffers()
+    processor.start_session()
+    dropped = dropped_samples()
+
+    def tick():
+        processor.process_all()
+        processor.get_signals()
+
+    frames, lags = _run_ticks(seconds, tick)
+    dropped = dropped_samples() - dropped
+    processor.stop_session()
+    processor.clear_buffers()
+    return frames, lags, dropped
+
+
+class QtCycles:
+    def __init__(self):
+        from PyQt6.QtWidgets import QApplication
+        import FrontEnd
+
+        # Sin hilo de WebSocket real ni envíos: el dispositivo simulado alimenta ComunicacionMax
+        ComunicacionMax.start_connection = lambda: None
+        FrontEnd.configure_render_backend()
+        self.frontend = FrontEnd
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        self.window = FrontEnd.app_window()
+        self.window.show_screen(FrontEnd.WelcomeScreen)
+        self.window.show()
+        self.app.processEvents()
+
+    def cycle(self, seconds):
+        FrontEnd = self.frontend
+        self.window.show_screen(FrontEnd.PatientDataScreen)
+        self.app.processEvents()
+        screen = self.window.show_screen(FrontEnd.MainScreen, dict(PATIENT))
+        self.app.processEvents()
+        screen.toggle_measurement()
+        screen.stop_graph_update()  # Los ticks los maneja el harness
+        dropped = dropped_samples()
+
+        def tick():
+            screen.update_plot()
+            self.app.processEvents()
+
+        frames, lags = _run_ticks(seconds, tick)
+        dropped = dropped_samples() - dropped
+        screen._limpiar_sesion_local()
+        self.window.show_screen(FrontEnd.PatientDataScreen)
+        self.app.processEvents()
+        return frames, lags, dropped
+
+
+# ==============================================================================
+# TENDENCIAS
+# ==============================================================================
+def rise(values):
+    """Suba de la recta de mínimos cuadrados entre el primer y el último punto."""
+    y = np.asarray([v for v in values if math.isfinite(v)], dtype=float)
+    if len(y) < 3:
+        return 0.0
+    slope = np.polyfit(np.arange(len(y)), y, 1)[0]
+    return float(slope * (len(y) - 1))
+
+
+def trends(cycles, warmup, tolerance):
+    """{(modo, métrica): (suba, límite)} de las series que crecen más que su límite."""
+    failures = {}
+    for mode in sorted({c["mode"] for c in cycles}):
+        series = [c for c in cycles if c["mode"] == mode][warmup:]
+        for metric, floor in TREND_FLOORS.items():
+            values = [c[metric] for c in series]
+            finite = [v for v in values if math.isfinite(v)]
+            if not finite:
+                continue
+            limit = max(floor, tolerance * abs(statistics.median(finite)))
+            increase = rise(values)
+            if increase > limit:
+                failures[(mode, metric)] = (increase, limit)
+    return failures
+
+
+# ==============================================================================
+# CORRIDA
+# ==============================================================================
+def run(duration, cycle_seconds, mode="both", rate=50, warmup=3, tolerance=0.10, trace=True, log=None):
+    modes = ("processor", "qt") if mode == "both" else (mode,)
+    qt = QtCycles() if "qt" in modes else None
+    if trace:
+        tracemalloc.start()
+
+    device = SimulatedDevice(rate)
+    device.start()
+    cycles = []
+    baseline_snapshot = None
+    started = time.monotonic()
+    try:
+        index = 0
+        while time.monotonic() - started < duration or len(cycles) < len(modes) * (warmup + 3):
+            cycle_mode = modes[index % len(modes)]
+            if cycle_mode == "qt":
+                frames, lags, dropped = qt.cycle(cycle_seconds)
+            else:
+                frames, lags, dropped = processor_cycle(cycle_seconds)
+            ordered = sorted(frames)
+            cycles.append({
+                "mode": cycle_mode,
+                "elapsed_s": time.monotonic() - started,
+                "rss_mb": rss_mb(),
+                "traced_mb": tracemalloc.get_traced_memory()[0] / 2 ** 20 if trace else float("nan"),
+                "dropped": dropped,
+                "lag_s": statistics.fmean(lags) if lags else float("nan"),
+                "frame_ms": statistics.fmean(frames) * 1e3,
+                "frame_p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1e3,
+            })
+            if log is not None:
+                log(cycles[-1])
+            index += 1
+            if trace and index == warmup * len(modes):
+                baseline_snapshot = tracemalloc.take_snapshot()
+    finally:
+        device.stop()
+
+    growth = []
+    if trace:
+        if baseline_snapshot is not None:
+            # Sin las asignaciones del propio tracemalloc
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            final = tracemalloc.take_snapshot().filter_traces(ignore)
+            baseline_snapshot = baseline_snapshot.filter_traces(ignore)
+            growth = [str(stat) for stat in final.compare_to(baseline_snapshot, "lineno")[:10]]
+        tracemalloc.stop()
+
+    failures = trends(cycles, warmup, tolerance)
+    return {
+        "rate": rate,
+        "cycle_s": cycle_seconds,
+        "samples_sent": device.sent,
+        "cycles": cycles,
+        "tracemalloc_growth": growth,
+        "failures": [{"mode": m, "metric": k, "rise": r, "limit": l} for (m, k), (r, l) in failures.items()],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=None)
+    parser.add_argument("--minutes", type=float, default=None)
+    parser.add_argument("--cycle", type=float, default=60.0, help="segundos de medición por paciente")
+    parser.add_argument("--mode", choices=("both", "processor", "qt"), default="both")
+    parser.add_argument("--rate", type=int, default=50, help="muestras por segundo del dispositivo")
+    parser.add_argument("--warmup", type=int, default=3, help="ciclos por modo que no cuentan para la tendencia")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="suba permitida relativa a la mediana")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="sin tracemalloc (menos sobrecarga)")
+    parser.add_argument("--json", default=None, help="guardar las series por ciclo en este archivo")
+    args = parser.parse_args()
+
+    duration = 4 * 3600.0
+    if args.hours is not None:
+        duration = args.hours * 3600.0
+    elif args.minutes is not None:
+        duration = args.minutes * 60.0
+
+    def log(c):
+        print(f"{c['elapsed_s']:8.0f} s  {c['mode']:<9}  RSS {c['rss_mb']:7.1f} MB  traced {c['traced_mb']:6.2f} MB  "
+              f"descartes {c['dropped']:4d}  demora {c['lag_s']:5.2f} s  "
+              f"frame {c['frame_ms']:6.2f} / p95 {c['frame_p95_ms']:6.2f} ms", file=sys.stderr)
+
+    result = run(duration, args.cycle, args.mode, args.rate, args.warmup, args.tolerance,
+                 trace=not args.no_tracemalloc, log=log)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+
+    if result["tracemalloc_growth"]:
+        print("Mayor crecimiento de tracemalloc desde el fin del calentamiento:")
+        for line in result["tracemalloc_growth"]:
+            print(f"  {line}")
+    print(f"{len(result['cycles'])} ciclos, {result['samples_sent']} muestras enviadas")
+    for failure in result["failures"]:
+        print(f"TENDENCIA EN SUBA: {failure['mode']} {failure['metric']}: "
+              f"+{failure['rise']:.3f} (límite {failure['limit']:.3f})")
+    if result["failures"]:
+        sys.exit(1)
+    print("Sin tendencias en suba")
+
+
+if __name__ == "__main__":
+    main()
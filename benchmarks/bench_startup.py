@@ -0,0 +1,174 @@
+"""
+BENCH_STARTUP.PY
+Startup cost of the application: import-time breakdown and time to first window.
+
+- Import time: `python -X importtime -c "import FrontEnd"` in a fresh
+  process; reports the cumulative time of FrontEnd and of each module it
+  imports directly (the heaviest first).
+- Time to first window: a fresh process imports FrontEnd, creates the
+  QApplication and shows the app window on the WelcomeScreen; measured
+  from before the process is launched until the first processEvents()
+  after show(), so it includes interpreter startup. Median of --runs
+  processes.
+- Deferred modules: pyqtgraph, ReportLab, QtPrintSupport and websocket must
+  not be loaded when the first window appears (they are imported by the
+  screens / actions that use them).
+
+Exits with status 1 when it regresses: a deferred module is loaded at
+startup, the median time to first window exceeds --limit-ms, or a metric
+exceeds the --baseline JSON by more than --tolerance.
+
+Uso:
+    python benchmarks/bench_startup.py [--runs 5] [--limit-ms 1500]
+    python benchmarks/bench_startup.py --save-baseline benchmarks/startup_baseline.json
+    python benchmarks/bench_startup.py --baseline benchmarks/startup_baseline.json [--tolerance 0.25]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deben estar cargados cuando aparece la ventana de inicio
+DEFERRED_MODULES = ("pyqtgraph", "reportlab", "PyQt6.QtPrintSupport", "websocket", "Reportes")
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def _worker():
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import FrontEnd
+    from PyQt6.QtWidgets import QApplication
+
+    imported = time.perf_counter()
+    FrontEnd.configure_render_backend()
+    app = QApplication(sys.argv)
+    window = FrontEnd.app_window()
+    window.show_screen(FrontEnd.WelcomeScreen)
+    window.show()
+    app.processEvents()
+    shown_at = time.time()
+    return {
+        "shown_at": shown_at,
+        "import_ms": (imported - started) * 1e3,
+        "window_ms": (time.perf_counter() - imported) * 1e3,
+        "loaded_deferred": [name for name in DEFERRED_MODULES if name in sys.modules],
+    }
+
+
+def import_breakdown(top=12):
+    """(ms acumulados de FrontEnd, [(módulo, ms)] de sus imports directos, de mayor a menor)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import FrontEnd"],
+                          cwd=ROOT, env=_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError((proc.stderr.strip().splitlines() or ["sin salida"])[-1])
+
+    total = 0.0
+    children = []
+    # Las líneas hijas se imprimen antes que la del módulo que las importa
+    pending = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entry = (depth, name.strip(), int(cumulative) / 1e3)
+        if entry[1] == "FrontEnd":
+            total = entry[2]
+            children = [(n, ms) for d, n, ms in pending if d == depth + 1]
+            break
+        pending = [p for p in pending if p[0] <= depth] + [entry]
+    children.sort(key=lambda item: item[1], reverse=True)
+    return total, children[:top]
+
+
+def first_window(runs=5):
+    samples = []
+    for _ in range(runs):
+        launched = time.time()
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker"],
+                              cwd=ROOT, env=_env(), capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError((proc.stderr.strip().splitlines() or ["sin salida"])[-1])
+        result = json.loads(lines[-1])
+        result["first_window_ms"] = (result.pop("shown_at") - launched) * 1e3
+        samples.append(result)
+    return {
+        "first_window_ms": statistics.median(s["first_window_ms"] for s in samples),
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "window_ms": statistics.median(s["window_ms"] for s in samples),
+        "loaded_deferred": sorted({name for s in samples for name in s["loaded_deferred"]}),
+    }
+
+
+def run(runs=5):
+    import_total, modules = import_breakdown()
+    result = first_window(runs)
+    result["importtime_ms"] = import_total
+    result["modules"] = modules
+    return result
+
+
+def regressions(result, limit_ms=None, baseline=None, tolerance=0.25):
+    problems = [f"{name} se importa al arrancar" for name in result["loaded_deferred"]]
+    if limit_ms is not None and result["first_window_ms"] > limit_ms:
+        problems.append(f"primera ventana en {result['first_window_ms']:.0f} ms (límite {limit_ms:.0f} ms)")
+    for key in ("first_window_ms", "importtime_ms"):
+        if baseline and key in baseline and result[key] > baseline[key] * (1.0 + tolerance):
+            problems.append(f"{key}: {result[key]:.0f} ms contra {baseline[key]:.0f} ms de referencia")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--limit-ms", type=float, default=None, help="máximo para la primera ventana")
+    parser.add_argument("--baseline", default=None, help="JSON de referencia de una corrida anterior")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="aumento permitido sobre la referencia")
+    parser.add_argument("--save-baseline", default=None, help="guardar esta corrida como referencia")
+    parser.add_argument("--json", action="store_true", help="imprimir el resultado como JSON")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker()))
+        return
+
+    result = run(args.runs)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    problems = regressions(result, args.limit_ms, baseline, args.tolerance)
+
+    if args.json:
+        print(json.dumps(dict(result, regressions=problems)))
+    else:
+        print(f"import FrontEnd (-X importtime): {result['importtime_ms']:8.1f} ms")
+        for name, ms in result["modules"]:
+            print(f"  {name:<32}{ms:8.1f} ms")
+        print(f"primera ventana:                 {result['first_window_ms']:8.1f} ms "
+              f"(imports {result['import_ms']:.1f} ms, ventana {result['window_ms']:.1f} ms)")
+        for problem in problems:
+            print(f"REGRESIÓN: {problem}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump({key: result[key] for key in ("first_window_ms", "importtime_ms")}, file, indent=2)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
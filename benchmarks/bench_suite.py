@@ -0,0 +1,474 @@
+"""
+BENCH_SUITE.PY
+Benchmarks of the ingestion, processing and history hot paths, written to a
+JSON file (benchmarks/bench_results.json unless --output says otherwise) so
+runs can be compared across commits on the same machine.
+
+Cases (--only to pick some):
+- on_message: decode + ingest throughput of ESP32 JSON packets
+- consume_pending: ComunicacionMax.consume_pending_samples drain cost at
+  several queue depths
+- process_tick: SignalProcessor.process_all (ingest + _advance_playback) per
+  20 ms tick, and _advance_playback alone, at 50 / 250 / 1000 Hz, after
+  calibration and with playback running. The processor runs on a
+  ComunicacionMax.VirtualClock, so a tick is not limited by the wall clock.
+- get_signals: scaling of the displayed window (6 s at each rate)
+- session: a 10-minute session (on_message at 50 Hz + process_all every
+  20 ms) fast-forwarded on a virtual clock: wall time and final playback lag
+- generator: SimuladorPPG.generate of one hour of dual-site signal at each
+  rate (with motion artifacts and sensor-off segments)
+- history: synthetic SQLite histories of 1k / 100k / 1M records: first
+  table page served by the store, in-memory repository load, search index
+  build and queries, date index build and month / year range filters. The
+  run fails (exit status 1) if the median of a query kind exceeds 1 ms on a
+  history of up to 100k records
+
+Every result carries the median and p95 per call (us or ms) plus enough
+metadata (commit, Python, NumPy, platform) to tell runs apart. --compare
+prints the ratio against a previous JSON.
+
+Uso:
+    python benchmarks/bench_suite.py [--output bench.json] [--only on_message history]
+        [--sizes 1000 100000 1000000] [--rates 50 250 1000] [--compare anterior.json]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import BackEnd
+import ComunicacionMax
+import SimuladorPPG
+from Historial import MeasurementRepository, date_epoch, intersect_rows
+from Mediciones import COLUMNAR_BATCH, batched, make_record, open_store
+
+
+TICK_SECONDS = 0.020
+# Junto a los benchmarks (ignorado por git), no en el directorio desde donde se corre
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "bench_results.json")
+# Objetivo del índice de búsqueda: mediana por consulta hasta este tamaño de historial
+SEARCH_TARGET_MS = 1.0
+SEARCH_TARGET_RECORDS = 100000
+
+
+def _summary(samples, scale=1e6):
+    """Mediana, p95 y media de tiempos en segundos (scale=1e6 -> us, 1e3 -> ms)."""
+    ordered = sorted(samples)
+    return {
+        "n": len(samples),
+        "median": statistics.median(ordered) * scale,
+        "p95": ordered[int(0.95 * (len(ordered) - 1))] * scale,
+        "mean": statistics.fmean(ordered) * scale,
+    }
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def _set_sensors(ok=True):
+    with ComunicacionMax._state_lock:
+        ComunicacionMax.connected = ok
+        ComunicacionMax.sensor1_connected = ok
+        ComunicacionMax.sensor2_connected = ok
+        ComunicacionMax.sensor1_ok = ok
+        ComunicacionMax.sensor2_ok = ok
+
+
+_signals = {}
+
+
+def _signal(fs, seconds=60):
+    """Registro sintético de 72 lpm a fs Hz (listas p, d), reutilizado en forma circular."""
+    if fs not in _signals:
+        recording = SimuladorPPG.generate(seconds, fs=fs, hr=72, seed=fs)
+        _signals[fs] = (recording["p"].tolist(), recording["d"].tolist())
+    return _signals[fs]
+
+
+# ==============================================================================
+# COMUNICACIÓN
+# ==============================================================================
+def bench_on_message(packets=20000):
+    recording = SimuladorPPG.generate(packets / 50.0, fs=50, hr=72, pwv=8.4)
+    messages = [json.dumps(packet) for packet in SimuladorPPG.packets(recording)]
+    ComunicacionMax.reset_stream_buffers()
+    samples = []
+    for start in range(0, packets, 1000):
+        chunk = messages[start:start + 1000]
+        elapsed, _ = _timed(lambda: [ComunicacionMax.on_message(None, m) for m in chunk])
+        samples.append(elapsed / len(chunk))
+    ComunicacionMax.reset_stream_buffers()
+    result = {"per_message_us": _summary(samples)}
+    result["messages_per_s"] = 1e6 / result["per_message_us"]["median"]
+    return result
+
+
+def bench_consume_pending(depths=(1, 10, 100, 1000, ComunicacionMax.PENDING_MAX_POINTS), repeat=200):
+    result = {}
+    for depth in depths:
+        samples = []
+        for _ in range(repeat):
+            ComunicacionMax.reset_stream_buffers()
+            ComunicacionMax.pending_proximal.extend(range(depth))
+            ComunicacionMax.pending_distal.extend(range(depth))
+            elapsed, drained = _timed(ComunicacionMax.consume_pending_samples)
+            assert drained["count"] == depth
+            samples.append(elapsed)
+        result[str(depth)] = _summary(samples)
+    ComunicacionMax.reset_stream_buffers()
+    return result
+
+
+# ==============================================================================
+# PROCESAMIENTO
+# ==============================================================================
+def _running_processor(fs, clock):
+    """SignalProcessor a fs Hz, con reloj virtual, ya calibrado y con la reproducción en marcha."""
+    processor = BackEnd.SignalProcessor(fs=fs, clock=clock)
+    ComunicacionMax.reset_stream_buffers()
+    _set_sensors(True)
+    processor.start_session()
+    per_tick = max(1, int(round(fs * TICK_SECONDS)))
+    index = 0
+    # Calibración (10 s) + demora y llenado inicial (15 s) + una ventana completa
+    warmup_ticks = int((processor.CALIB_SECONDS + processor.PLAYBACK_DELAY_SECONDS
+                        + processor.STARTUP_FILL_SECONDS + processor.VIEW_SECONDS + 2) / TICK_SECONDS)
+    for _ in range(warmup_ticks):
+        index = _feed(index, per_tick, fs)
+        clock.advance(TICK_SECONDS)
+        processor.process_all()
+    assert processor._playback_started
+    return processor, index, per_tick
+
+
+def _feed(index, count, fs):
+    p, d = _signal(fs)
+    for i in range(index, index + count):
+        ComunicacionMax.pending_proximal.append(p[i % len(p)])
+        ComunicacionMax.pending_distal.append(d[i % len(d)])
+    return index + count
+
+
+def bench_process_tick(rates=(50, 250, 1000), ticks=2000):
+    result = {}
+    clock = ComunicacionMax.VirtualClock()
+    try:
+        for fs in rates:
+            processor, index, per_tick = _running_processor(fs, clock)
+            process_samples = []
+            advance_samples = []
+            for _ in range(ticks):
+                index = _feed(index, per_tick, fs)
+                clock.advance(TICK_SECONDS)
+                elapsed, _ = _timed(processor.process_all)
+                process_samples.append(elapsed)
+            # _advance_playback solo: la cola de entrada ya tiene datos, sin ingesta
+            for _ in range(ticks):
+                for _ in range(per_tick):
+                    processor._input_prox.append(0.0)
+                    processor._input_dist.append(0.0)
+                now = clock.advance(TICK_SECONDS)
+                elapsed, _ = _timed(lambda: processor._advance_playback(now))
+                advance_samples.append(elapsed)
+            result[str(fs)] = {
+                "samples_per_tick": per_tick,
+                "process_all_us": _summary(process_samples),
+                "advance_playback_us": _summary(advance_samples),
+            }
+    finally:
+        ComunicacionMax.reset_stream_buffers()
+    return result
+
+
+def bench_get_signals(rates=(50, 250, 1000), calls=500):
+    result = {}
+    clock = ComunicacionMax.VirtualClock()
+    try:
+        for fs in rates:
+            processor, _, _ = _running_processor(fs, clock)
+            samples = []
+            for _ in range(calls):
+                elapsed, signals = _timed(processor.get_signals)
+                samples.append(elapsed)
+            result[str(fs)] = {"points": len(signals[0]), "get_signals_us": _summary(samples)}
+    finally:
+        ComunicacionMax.reset_stream_buffers()
+    return result
+
+
+def simulate_session(seconds=600, fs=50, seed=0, sensor_off=()):
+    """Sesión completa con reloj virtual: paquetes de SimuladorPPG por on_message y un
+    process_all cada 20 ms, como MainScreen. Devuelve el procesador al final."""
+    clock = ComunicacionMax.VirtualClock()
+    recording = SimuladorPPG.generate(seconds, fs=fs, seed=seed, sensor_off=sensor_off)
+    messages = [json.dumps(packet) for packet in SimuladorPPG.packets(recording)]
+    processor = BackEnd.SignalProcessor(fs=fs)
+    ComunicacionMax.set_clock(clock)
+    try:
+        ComunicacionMax.reset_stream_buffers()
+        ComunicacionMax.on_open(None)
+        processor.start_session()
+        sent = 0
+        for tick in range(1, int(seconds / TICK_SECONDS) + 1):
+            due = min(len(messages), int(round(tick * TICK_SECONDS * fs)))
+            while sent < due:
+                # Cada paquete llega en su instante, no todos juntos al tick
+                clock.time = 1000.0 + sent / fs
+                ComunicacionMax.on_message(None, messages[sent])
+                sent += 1
+            clock.time = 1000.0 + tick * TICK_SECONDS
+            processor.process_all()
+    finally:
+        ComunicacionMax.set_clock(None)
+        ComunicacionMax.reset_stream_buffers()
+        _set_sensors(False)
+    return processor
+
+
+def bench_session(seconds=600):
+    # Una sesión de 10 min (calibración, llenado inicial, control de velocidad) sin esperar
+    elapsed, processor = _timed(lambda: simulate_session(seconds))
+    queued = min(len(processor._input_prox), len(processor._input_dist))
+    return {
+        "session_s": seconds,
+        "wall_ms": elapsed * 1e3,
+        "speedup": seconds / elapsed,
+        "drawn_samples": processor._sample_index,
+        "queued_s": queued / processor.fs,
+    }
+
+
+# ==============================================================================
+# SEÑAL SINTÉTICA
+# ==============================================================================
+def bench_generator(rates=(50, 250, 1000), seconds=3600, repeat=3):
+    result = {}
+    for fs in rates:
+        samples = [_timed(lambda: SimuladorPPG.generate(seconds, fs=fs, artifacts_per_min=0.5,
+                                                         sensor_off_per_min=0.2))[0]
+                   for _ in range(repeat)]
+        result[str(fs)] = {"seconds": seconds, "generate_ms": _summary(samples, scale=1e3)}
+    return result
+
+
+# ==============================================================================
+# HISTORIAL
+# ==============================================================================
+NAMES = ("Ana", "Juan", "María", "José", "Lucía", "Carlos", "Sofía", "Martín", "Valentina", "Diego",
+         "Camila", "Pablo", "Julieta", "Tomás", "Florencia", "Nicolás")
+SURNAMES = ("González", "Rodríguez", "Gómez", "Fernández", "López", "Díaz", "Martínez", "Pérez",
+            "García", "Sánchez", "Romero", "Sosa", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores",
+            "Benítez", "Acosta", "Medina")
+HISTORY_START = datetime(2021, 1, 1)
+HISTORY_DAYS = 5 * 365
+
+
+def synthetic_records(count, seed=0):
+    """Mediciones sintéticas: ~4 por paciente, fechas repartidas en 5 años."""
+    rng = random.Random(seed)
+    patients = max(1, count // 4)
+    for _ in range(count):
+        patient = rng.randrange(patients)
+        when = HISTORY_START + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        edad = 20 + patient % 65
+        yield make_record(
+            when.strftime("%Y-%m-%d %H:%M:%S"), str(20000000 + patient),
+            NAMES[patient % len(NAMES)], f"{SURNAMES[patient % len(SURNAMES)]}{patient % 97}",
+            edad, 150 + patient % 40, "Femenino" if patient % 2 else "Masculino",
+            rng.randint(55, 95), round(rng.uniform(5.0, 14.0), 1), "",
+        )
+
+
+def bench_history(sizes=(1000, 100000, 1000000), queries=50):
+    result = {}
+    folder = tempfile.mkdtemp(prefix="stiffio_bench_")
+    try:
+        for size in sizes:
+            path = os.path.join(folder, f"historial_{size}.db")
+            store = open_store(path)
+            for batch in batched(synthetic_records(size), COLUMNAR_BATCH):
+                store.add_many(batch)
+            store.close()
+
+            store = open_store(path)
+            repository = MeasurementRepository(store)
+            # Primera página de la tabla, servida por la base antes de cargar la copia
+            first_page_s, count = _timed(lambda: (repository.fetch_page(0, 200), repository.crpwv_status(0, 200),
+                                                  repository.count())[-1])
+            load_s, _ = _timed(repository.records)
+            search_build_s, search_index = _timed(repository.search_index)
+            date_build_s, date_index = _timed(repository.date_index)
+
+            rng = random.Random(1)
+            search = {}
+            for kind, make_query in (
+                ("dni_prefix", lambda: str(20000000 + rng.randrange(max(1, size // 4)))[:5]),
+                ("dni_exact", lambda: str(20000000 + rng.randrange(max(1, size // 4)))),
+                ("surname_substring", lambda: SURNAMES[rng.randrange(len(SURNAMES))][1:5].lower()),
+                ("name_and_surname", lambda: f"{NAMES[rng.randrange(len(NAMES))]} {SURNAMES[rng.randrange(len(SURNAMES))][:3]}"),
+            ):
+                samples = [_timed(lambda: search_index.search(make_query()))[0] for _ in range(queries)]
+                search[kind] = _summary(samples, scale=1e3)
+
+            dates = {}
+            matches = search_index.search("a")  # Búsqueda amplia para combinar con las fechas
+            for kind, days in (("month", 30), ("year", 365)):
+                samples = []
+                combined = []
+                for _ in range(queries):
+                    first = HISTORY_START + timedelta(days=rng.randrange(HISTORY_DAYS - days))
+                    last = first + timedelta(days=days)
+                    start = date_epoch(first.year, first.month, first.day)
+                    end = date_epoch(last.year, last.month, last.day)
+                    elapsed, rows = _timed(lambda: date_index.rows_between(start, end))
+                    samples.append(elapsed)
+                    combined.append(_timed(lambda: intersect_rows(matches, rows))[0])
+                dates[kind] = _summary(samples, scale=1e3)
+                dates[kind + "_and_search"] = _summary(combined, scale=1e3)
+
+            result[str(size)] = {
+                "records": count,
+                "first_page_ms": first_page_s * 1e3,
+                "load_ms": load_s * 1e3,
+                "search_index_build_ms": search_build_s * 1e3,
+                "date_index_build_ms": date_build_s * 1e3,
+                "search_ms": search,
+                "date_filter_ms": dates,
+            }
+            store.close()
+            del repository, search_index, date_index
+            os.remove(path)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return result
+
+
+# ==============================================================================
+# CORRIDA
+# ==============================================================================
+CASES = ("on_message", "consume_pending", "process_tick", "get_signals", "session", "generator", "history")
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(only=CASES, sizes=(1000, 100000, 1000000), rates=(50, 250, 1000), log=None):
+    cases = {
+        "on_message": bench_on_message,
+        "consume_pending": bench_consume_pending,
+        "process_tick": lambda: bench_process_tick(rates),
+        "get_signals": lambda: bench_get_signals(rates),
+        "session": bench_session,
+        "generator": lambda: bench_generator(rates),
+        "history": lambda: bench_history(sizes),
+    }
+    results = {}
+    for name in CASES:
+        if name not in only:
+            continue
+        if log is not None:
+            log(name)
+        results[name] = cases[name]()
+    return {"meta": metadata(), "results": results}
+
+
+def search_target_failures(result):
+    """(tamaño, tipo de consulta, mediana ms) de las búsquedas que no cumplen SEARCH_TARGET_MS."""
+    failures = []
+    for size, history in result["results"].get("history", {}).items():
+        if int(size) > SEARCH_TARGET_RECORDS:
+            continue
+        for kind, summary in history["search_ms"].items():
+            if summary["median"] > SEARCH_TARGET_MS:
+                failures.append((int(size), kind, summary["median"]))
+    return failures
+
+
+def _flatten(tree, prefix=""):
+    # {"a": {"b": 1}} -> {"a.b": 1}: solo los números, para comparar corridas
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, previous):
+    """Filas (métrica, anterior, actual, actual / anterior) de los tiempos presentes en ambas corridas."""
+    now = _flatten(current["results"])
+    before = _flatten(previous["results"])
+    rows = []
+    for name, value in now.items():
+        old = before.get(name)
+        # Solo tiempos: medianas, p95 y totales en ms
+        if old is None or not (name.endswith((".median", ".p95")) or name.endswith("_ms")):
+            continue
+        rows.append((name, old, value, value / old if old else float("inf")))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="archivo JSON de resultados")
+    parser.add_argument("--only", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--rates", type=int, nargs="+", default=[50, 250, 1000])
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    result = run(args.only, args.sizes, args.rates, log=lambda name: print(f"{name}...", file=sys.stderr))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2)
+    print(f"Resultados en {args.output} (commit {result['meta']['commit'] or '?'})")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+        print(f"{'métrica':<70}{'antes':>12}{'ahora':>12}{'razón':>8}")
+        for name, old, value, ratio in compare(result, previous):
+            print(f"{name:<70}{old:>12.3f}{value:>12.3f}{ratio:>8.2f}")
+
+    failures = search_target_failures(result)
+    for size, kind, median in failures:
+        print(f"BÚSQUEDA LENTA: {kind} en {size} registros: mediana {median:.3f} ms "
+              f"(objetivo {SEARCH_TARGET_MS:.1f} ms)")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+BENCH_UPDATE_PLOT.PY
+Per-tick cost of MainScreen.update_plot on the alert-label path.
+
+Compares the alert state machine (widgets touched only on transitions) with
+the previous behaviour, where every tick re-applied text and stylesheet to
+both alert labels. The old behaviour is emulated by forgetting the last
+applied alert state before each tick.
+
+Uso:
+    python benchmarks/bench_update_plot.py [--ticks 2000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+
+import ComunicacionMax
+import FrontEnd
+
+
+PATIENT = {
+    "nombre": "Bench",
+    "apellido": "Stiffio",
+    "dni": "00000000",
+    "edad": "40",
+    "altura": "170",
+    "sexo": "Femenino",
+    "observaciones": "",
+}
+
+# Estados de sensores que mantienen una alerta visible en ambos gráficos
+SCENARIOS = {
+    "sin_conexion": dict(connected=False, c1=False, c2=False, s1=False, s2=False),
+    "calibrando": dict(connected=True, c1=True, c2=True, s1=True, s2=True),
+    "sensor_desconectado": dict(connected=True, c1=False, c2=False, s1=False, s2=False),
+    "revisar_sensor": dict(connected=True, c1=True, c2=True, s1=False, s2=False),
+}
+
+
+def _apply_scenario(flags):
+    with ComunicacionMax._state_lock:
+        ComunicacionMax.connected = flags["connected"]
+        ComunicacionMax.sensor1_connected = flags["c1"]
+        ComunicacionMax.sensor2_connected = flags["c2"]
+        ComunicacionMax.sensor1_ok = flags["s1"]
+        ComunicacionMax.sensor2_ok = flags["s2"]
+
+
+def _time_ticks(app, screen, ticks, legacy):
+    samples = []
+    for _ in range(ticks):
+        if legacy:
+            screen._alert_states.clear()
+        t0 = time.perf_counter()
+        screen.update_plot()
+        app.processEvents()  # Incluye el re-polish / repintado que dispara setStyleSheet
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "median_us": statistics.median(samples) * 1e6,
+        "p95_us": ordered[int(0.95 * (len(ordered) - 1))] * 1e6,
+    }
+
+
+def run(ticks=2000):
+    # Sin hilo de WebSocket: los estados de los sensores los fija el benchmark
+    ComunicacionMax.start_connection = lambda: None
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    screen = FrontEnd.MainScreen(PATIENT)
+    screen.show()
+    app.processEvents()
+    screen.toggle_measurement()
+    screen.stop_graph_update()  # Los ticks los maneja el benchmark
+
+    results = {}
+    for name, flags in SCENARIOS.items():
+        _apply_scenario(flags)
+        screen._show_calibrating_until_ready = (name == "calibrando")
+        _time_ticks(app, screen, 50, legacy=False)  # Calentamiento
+
+        legacy = _summary(_time_ticks(app, screen, ticks, legacy=True))
+        current = _summary(_time_ticks(app, screen, ticks, legacy=False))
+        results[name] = {"every_tick": legacy, "on_transition": current}
+
+    screen.measuring = False
+    screen.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = run(args.ticks)
+    print(f"{'escenario':<22}{'cada tick (us)':>18}{'transiciones (us)':>20}{'mejora':>10}")
+    for name, r in results.items():
+        before = r["every_tick"]["mean_us"]
+        after = r["on_transition"]["mean_us"]
+        print(f"{name:<22}{before:>18.1f}{after:>20.1f}{before / max(after, 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()